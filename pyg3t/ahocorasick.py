@@ -0,0 +1,76 @@
+from __future__ import print_function, unicode_literals
+from collections import deque
+
+
+class Automaton(object):
+    """Aho-Corasick automaton finding many patterns in one pass.
+
+    The time to search a text is linear in its length plus the number
+    of matches, however many patterns there are.
+
+    Args:
+        patterns (list): The strings to search for.  Empty strings are
+            never found.
+
+    Attributes:
+        patterns (list): The strings to search for
+    """
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        # For each state, the transitions, the fallback state when no
+        # transition matches, and the indices of the patterns ending here
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = next_state
+                state = next_state
+            self.output[state].append(index)
+
+        # The fallback of a state is the state of its longest proper
+        # suffix, found breadth first
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(char, 0)
+                self.output[next_state].extend(
+                    self.output[self.fail[next_state]])
+
+    def finditer(self, text, pos=0, endpos=None):
+        """Yield (start, end, index) for each match of a pattern in text.
+
+        index is the index of the pattern in patterns.  Overlapping
+        matches are all found, in the order of their ends.  Like for
+        regexes, only text[pos:endpos] is searched."""
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        if endpos is None:
+            endpos = len(text)
+        state = 0
+        for pos in range(pos, endpos):
+            char = text[pos]
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                yield pos + 1 - len(self.patterns[index]), pos + 1, index
+
+    def findall(self, text):
+        """Return set of indices of the patterns found in text."""
+        return set(index for _, _, index in self.finditer(text))
@@ -0,0 +1,235 @@
+from __future__ import print_function, unicode_literals
+from optparse import OptionParser
+import xml.sax
+
+from pyg3t.gtparse import iparse
+from pyg3t.gtxml import GTXMLChecker
+from pyg3t.gtcheckargs import OptionChecker, BadOption
+from pyg3t.poabc import (POABC, Trouble, PartiallyTranslatedPluralTest,
+                         TrailingCharTest, WordRepeatTest, FormatTest,
+                         is_translatorcredits, format_context, headerwidth)
+from pyg3t.util import pyg3tmain, get_bytes_input, get_encoded_output, ansi
+from pyg3t import __version__
+
+
+class Check:
+    """Base class of the checks run by gtcheck.
+
+    A check has a name, a cost which is used to run cheap checks
+    before expensive ones, and the states of the messages it applies
+    to, out of 'translated' and 'fuzzy'.  Subclasses define a check()
+    method which returns a list of Troubles for a message.  Checks
+    which set rewrites may change the strings of the message, and are
+    given a copy of it."""
+    name = None
+    cost = 1
+    states = ('translated',)
+    rewrites = False
+
+
+class POABCCheck(Check):
+    """Check using one of the tests of poabc."""
+    states = ('translated', 'fuzzy')
+    rewrites = True
+
+    def __init__(self, name, test, cost):
+        self.name = name
+        self.cost = cost
+        self.poabc = POABC([test])
+
+    def check(self, msg):
+        if is_translatorcredits(msg.msgid):
+            return []
+        return self.poabc.check_msg(msg)
+
+
+class XMLCheck(Check):
+    """Check xml like gtxml."""
+    name = 'xml'
+    cost = 10
+    states = ('translated', 'fuzzy')
+
+    def __init__(self):
+        self.checker = GTXMLChecker()
+
+    def check(self, msg):
+        try:
+            self.checker.check_msg(msg)
+        except xml.sax.SAXParseException as err:
+            # The error is that of the first msgstr which fails to parse,
+            # which is where the context must come from
+            msgstr, error = msg.msgstr, err
+            for string in msg.msgstrs:
+                try:
+                    self.checker.parse_xml_elements(string)
+                except xml.sax.SAXParseException as stringerr:
+                    msgstr, error = string, stringerr
+                    break
+            col = error.getColumnNumber() - len('<xml>')
+            return [Trouble('Invalid xml: ' + str(error),
+                            msgstr, col - 3, col + 3)]
+        return []
+
+
+class OptionCheck(Check):
+    """Check command-line options like gtcheckargs."""
+    name = 'options'
+    cost = 5
+
+    def __init__(self):
+        self.checker = OptionChecker()
+
+    def check(self, msg):
+        try:
+            self.checker.checkoptions(msg)
+        except BadOption as err:
+            return [Trouble(err.args[0])]
+        return []
+
+
+def get_checks():
+    """Return list of all checks, cheapest first."""
+    checks = [POABCCheck('plurals', PartiallyTranslatedPluralTest(), 1),
+              POABCCheck('trailing', TrailingCharTest(), 2),
+              POABCCheck('repeat', WordRepeatTest(), 3),
+              POABCCheck('format', FormatTest(), 3),
+              OptionCheck(),
+              XMLCheck()]
+    return sorted(checks, key=lambda check: check.cost)
+
+
+class CheckDriver:
+    """Run several checks on each message of a catalog in one pass."""
+    def __init__(self, checks, fuzzy=False, first=False):
+        self.checks = sorted(checks, key=lambda check: check.cost)
+        self.fuzzy = fuzzy
+        self.first = first
+        self.warncounts = dict((check.name, 0) for check in self.checks)
+        self.msgcount = 0
+
+    def get_state(self, msg):
+        if msg.istranslated:
+            return 'translated'
+        if msg.isfuzzy and self.fuzzy:
+            return 'fuzzy'
+        return None
+
+    def check_msg(self, msg):
+        """Return list of (checkname, trouble) for msg."""
+        warnings = []
+        state = self.get_state(msg)
+        if state is None:
+            return warnings
+        copy = None  # Made once for all checks which rewrite strings
+        for check in self.checks:
+            if state not in check.states:
+                continue
+            if check.rewrites:
+                if copy is None:
+                    copy = msg.copy()
+                troubles = check.check(copy)
+            else:
+                troubles = check.check(msg)
+            if troubles:
+                self.warncounts[check.name] += 1
+                warnings.extend((check.name, trouble) for trouble in troubles)
+                if self.first:
+                    break
+        return warnings
+
+    def check_msgs(self, msgs):
+        """Yield (msg, warnings) for msgs with warnings."""
+        for msg in msgs:
+            if not msg.msgid:
+                continue
+            self.msgcount += 1
+            warnings = self.check_msg(msg)
+            if warnings:
+                yield msg, warnings
+
+
+def build_parser():
+    usage = '%prog [OPTION...] FILE...'
+    description = ('Check each po-FILE with the checks of poabc, gtxml and '
+                   'gtcheckargs, reading each FILE only once.  '
+                   'Cheap checks are run before expensive ones, and all '
+                   'warnings for a message are written together.')
+    parser = OptionParser(usage=usage, description=description,
+                          version=__version__)
+    parser.add_option('--checks', metavar='LIST',
+                      help='comma-separated list of checks to run.  '
+                      'Default: all of %s' % ', '.join(
+                          check.name for check in get_checks()))
+    parser.add_option('-f', '--fuzzy', action='store_true',
+                      help='also check fuzzy messages with the checks that '
+                      'apply to them')
+    parser.add_option('--first', action='store_true',
+                      help='write only the warnings of the cheapest check '
+                      'that fails for each message')
+    parser.add_option('-c', '--color', action='store_true',
+                      help='use colors to highlight output')
+    parser.add_option('--quiet', action='store_true',
+                      help='do not print full message')
+    return parser
+
+
+@pyg3tmain(build_parser)
+def main(parser):
+    opts, args = parser.parse_args()
+    if len(args) == 0:
+        parser.print_help()
+        parser.exit()
+
+    checks = get_checks()
+    if opts.checks:
+        names = opts.checks.split(',')
+        known = set(check.name for check in checks)
+        for name in names:
+            if name not in known:
+                parser.error('Unknown check: %s' % name)
+        checks = [check for check in checks if check.name in names]
+
+    driver = CheckDriver(checks, fuzzy=opts.fuzzy, first=opts.first)
+    out = get_encoded_output('utf-8')
+
+    headerfmt = 'Line %(lineno)d'
+    if len(args) > 1:
+        headerfmt = '%(fname)s line %(lineno)d'
+
+    msgwarncount = 0
+    for arg in args:
+        fd = get_bytes_input(arg)
+        cat = iparse(fd, obsolete=False, trailing=False)
+        next(cat)  # The header is not checked
+        for msg, warnings in driver.check_msgs(cat):
+            msgwarncount += 1
+            header = headerfmt % dict(fname=fd.name,
+                                      lineno=msg.meta['lineno'])
+            if not opts.quiet:
+                header = ('--- %s ' % header).ljust(headerwidth, '-')
+            if opts.color:
+                header = ansi.cyan(header)
+            print(header, file=out)
+            for name, warning in warnings:
+                wstring = '[%s] %s' % (name, warning.tostring())
+                if opts.color:
+                    wstring = ansi.red(wstring)
+                print(wstring, file=out)
+                if warning.string:
+                    print(format_context(warning, use_color=opts.color),
+                          file=out)
+            if opts.quiet:
+                print(file=out)
+            else:
+                print(''.join(msg.meta['rawlines']), file=out)
+
+    print(' Summary '.center(headerwidth, '='), file=out)
+    if len(args) > 1:
+        print('Number of files: %d' % len(args), file=out)
+    print('Number of messages: %d' % driver.msgcount, file=out)
+    print('Messages with warnings: %d' % msgwarncount, file=out)
+    for check in driver.checks:
+        print('  %s: %d' % (check.name, driver.warncounts[check.name]),
+              file=out)
+    print('=' * headerwidth, file=out)
+    raise SystemExit(int(msgwarncount > 0))
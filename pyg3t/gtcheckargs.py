@@ -3,7 +3,8 @@ import sys
 from optparse import OptionParser
 
 from pyg3t.gtparse import parse
-from pyg3t.util import NullDevice, pyg3tmain, get_encoded_output, regex
+from pyg3t.util import (NullDevice, pyg3tmain, get_encoded_output, regex,
+                        msgid_cache)
 
 
 description = """Check translations of command-line options in po-files."""
@@ -150,7 +151,14 @@ class OptionChecker:
         if not msg.istranslated:
             return
 
-        msgid_options = self.get_options(msg.msgid)
+        if isinstance(self.debug, NullDevice):
+            # Options are not JSON serializable, so keep them in memory
+            msgid_options = msgid_cache.get('options', msg.msgid,
+                                            self.get_options,
+                                            persistent=False)
+        else:
+            # Diagnostics are written while parsing
+            msgid_options = self.get_options(msg.msgid)
         msgstr_options = self.get_options(msg.msgstr)
 
         if len(msgid_options) == 0:
@@ -0,0 +1,223 @@
+from __future__ import print_function, unicode_literals
+from optparse import OptionParser
+import os
+import random
+import zlib
+
+from pyg3t.gtparse import iparse
+from pyg3t.podiff import find_catalogs
+from pyg3t.poabc import normalize_string, get_language
+from pyg3t.util import (pyg3tmain, get_bytes_input, get_encoded_output,
+                        pool_imap, regex)
+
+
+# Length of the character shingles of msgids
+shingle_length = 3
+
+whitespace_pattern = regex(r'\s+')
+
+# Hash functions h(x) = (a * x + b) % prime of the MinHash signatures
+_prime = 2**61 - 1
+
+
+def get_shingles(string):
+    """Return set of character shingles of the normalized string."""
+    string = whitespace_pattern.sub(' ', normalize_string(string)).strip()
+    return set(string[i:i + shingle_length]
+               for i in range(len(string) - shingle_length + 1))
+
+
+def jaccard(set1, set2):
+    return len(set1 & set2) / float(len(set1 | set2))
+
+
+class MinHasher:
+    """Compute MinHash signatures of sets of shingles.
+
+    The hash values of each shingle under all the hash functions are
+    cached, so the signature of a set is the elementwise minimum of
+    the cached values of its shingles."""
+    def __init__(self, nhashes, seed=42):
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, _prime), rng.randrange(_prime))
+                       for i in range(nhashes)]
+        self.cache = {}
+
+    def get_hashes(self, shingle):
+        hashes = self.cache.get(shingle)
+        if hashes is None:
+            x = zlib.crc32(shingle.encode('utf-8')) & 0xffffffff
+            hashes = self.cache[shingle] = [(a * x + b) % _prime
+                                            for a, b in self.params]
+        return hashes
+
+    def signature(self, shingles):
+        return list(map(min, zip(*[self.get_hashes(shingle)
+                                   for shingle in shingles])))
+
+
+class UnionFind:
+    def __init__(self, n):
+        self.parents = list(range(n))
+
+    def find(self, i):
+        root = i
+        while self.parents[root] != root:
+            root = self.parents[root]
+        while self.parents[i] != root:
+            self.parents[i], i = root, self.parents[i]
+        return root
+
+    def union(self, i, j):
+        self.parents[self.find(i)] = self.find(j)
+
+
+def find_clusters(strings, threshold=0.6, bands=16, rows=4):
+    """Return list of clusters of similar strings.
+
+    Strings are similar if the Jaccard similarity of their shingles is
+    at least threshold.  Candidate pairs are found by locality-sensitive
+    hashing: the MinHash signatures are cut into bands, and strings
+    with equal signatures within a band are candidates.  Each candidate
+    is only compared to the first string of its bucket, so the time is
+    linear in the number of strings.  Clusters are lists of indices
+    into strings, and only clusters of two or more strings are returned.
+    """
+    hasher = MinHasher(bands * rows)
+    shingles = [get_shingles(string) for string in strings]
+    buckets = {}
+    for index, stringshingles in enumerate(shingles):
+        if not stringshingles:
+            continue
+        signature = hasher.signature(stringshingles)
+        for band in range(bands):
+            key = (band, tuple(signature[band * rows:(band + 1) * rows]))
+            buckets.setdefault(key, []).append(index)
+
+    unionfind = UnionFind(len(strings))
+    compared = set()
+    for bucket in buckets.values():
+        first = bucket[0]
+        for index in bucket[1:]:
+            if (first, index) in compared:
+                continue
+            compared.add((first, index))
+            if unionfind.find(first) == unionfind.find(index):
+                continue  # Already in the same cluster
+            if jaccard(shingles[first], shingles[index]) >= threshold:
+                unionfind.union(index, first)
+
+    clusters = {}
+    for index in range(len(strings)):
+        clusters.setdefault(unionfind.find(index), []).append(index)
+    return [cluster for cluster in clusters.values() if len(cluster) > 1]
+
+
+def read_translations(fname):
+    """Return language of catalog and its translated messages.
+
+    The messages are a list of (msgid, msgstr, lineno)."""
+    cat = iparse(get_bytes_input(fname), obsolete=False, trailing=False)
+    header = next(cat)
+    return get_language(header), [(msg.msgid, msg.msgstr, msg.meta['lineno'])
+                                  for msg in cat
+                                  if msg.msgid and msg.istranslated]
+
+
+def quote(string):
+    """Return string in double quotes on a single line.
+
+    Strings of catalogs are escaped as in the catalog, so only line
+    breaks which were not escaped there need escaping."""
+    return '"%s"' % string.replace('\r', '\\r').replace('\n', '\\n')
+
+
+def build_parser():
+    usage = '%prog [OPTION...] FILE|DIR...'
+    description = ('Find clusters of similar msgids in the catalogs FILE, '
+                   'or the catalogs below DIR, and write the clusters where '
+                   'the msgids are translated differently.  Accelerator '
+                   'keys and case are ignored.  Catalogs of different '
+                   'languages, as given by their Language headers, are '
+                   'clustered separately.')
+    parser = OptionParser(usage=usage, description=description)
+    parser.add_option('-t', '--threshold', type='float', default=0.6,
+                      metavar='T',
+                      help='minimum similarity (Jaccard index of character '
+                      'trigrams) of msgids in a cluster.  Default: %default')
+    parser.add_option('--min-length', type='int', default=10, metavar='N',
+                      help='ignore msgids shorter than N characters.  '
+                      'Default: %default')
+    parser.add_option('-j', '--jobs', type='int', default=1, metavar='N',
+                      help='read up to N catalogs in parallel')
+    return parser
+
+
+@pyg3tmain(build_parser)
+def main(parser):
+    opts, args = parser.parse_args()
+    if len(args) == 0:
+        parser.error('No catalogs given')
+    if opts.jobs < 1:
+        parser.error('Number of jobs must be positive')
+
+    fnames = []
+    for arg in args:
+        if os.path.isdir(arg):
+            fnames.extend(os.path.join(arg, fname)
+                          for fname in find_catalogs(arg))
+        else:
+            fnames.append(arg)
+
+    # The locations and translations of each distinct msgid, for each
+    # language, since only translations into one language can differ
+    msgids = {}
+    translations = {}
+    for fname, (language, entries) in zip(fnames,
+                                          pool_imap(read_translations, fnames,
+                                                    jobs=opts.jobs)):
+        langmsgids = msgids.setdefault(language, [])
+        langtranslations = translations.setdefault(language, {})
+        for msgid, msgstr, lineno in entries:
+            if len(msgid) < opts.min_length:
+                continue
+            if msgid not in langtranslations:
+                langmsgids.append(msgid)
+                langtranslations[msgid] = []
+            langtranslations[msgid].append((fname, lineno, msgstr))
+
+    out = get_encoded_output('utf-8')
+    nclusters = 0
+    for language in sorted(msgids):
+        langmsgids = msgids[language]
+        langtranslations = translations[language]
+        clusters = find_clusters(langmsgids, threshold=opts.threshold)
+        clusters.sort(key=min)
+        for cluster in clusters:
+            cluster.sort()
+            msgstrs = set(normalize_string(msgstr)
+                          for index in cluster
+                          for _, _, msgstr
+                          in langtranslations[langmsgids[index]])
+            if len(msgstrs) < 2:
+                continue
+            nclusters += 1
+            header = ('Cluster %d: %d msgids, %d translations'
+                      % (nclusters, len(cluster), len(msgstrs)))
+            if len(msgids) > 1:
+                header += ' [%s]' % language
+            print(header, file=out)
+            for index in cluster:
+                msgid = langmsgids[index]
+                for fname, lineno, msgstr in langtranslations[msgid]:
+                    print('  %s:%d: %s -> %s'
+                          % (fname, lineno, quote(msgid), quote(msgstr)),
+                          file=out)
+            print(file=out)
+    if nclusters == 1:
+        what = '1 cluster'
+    else:
+        what = '%d clusters' % nclusters
+    print('Found %s with different translations among %d msgids.'
+          % (what, sum(len(langmsgids) for langmsgids in msgids.values())),
+          file=out)
@@ -70,3 +70,43 @@ def diff(old, new, formatter):
         elif op == 'delete':
             words.append(formatter.delete(''.join(oldwords[s1beg:s1end])))
     return ''.join(words)
+
+
+def bounded_edit_distance(old, new, bound):
+    """Return Levenshtein distance of two sequences if at most bound.
+
+    The sequences may be strings or lists of tokens.  Only the cells
+    within bound of the diagonal are computed, and None is returned as
+    soon as the distance is known to exceed bound."""
+    if abs(len(old) - len(new)) > bound:
+        return None
+    if len(old) > len(new):
+        old, new = new, old
+    toobig = bound + 1
+    previous = [j if j <= bound else toobig for j in range(len(new) + 1)]
+    for i in range(1, len(old) + 1):
+        start = max(1, i - bound)
+        stop = min(len(new), i + bound)
+        current = [toobig] * (len(new) + 1)
+        if i <= bound:
+            current[0] = i
+        item = old[i - 1]
+        best = current[0]
+        for j in range(start, stop + 1):
+            cost = previous[j - 1] + (item != new[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            if cost > toobig:
+                cost = toobig
+            current[j] = cost
+            if cost < best:
+                best = cost
+        if best > bound:
+            return None
+        previous = current
+    distance = previous[len(new)]
+    if distance > bound:
+        return None
+    return distance
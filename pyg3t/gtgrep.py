@@ -3,18 +3,34 @@
 """Perform grep-like operations on message catalogs."""
 
 from __future__ import print_function, unicode_literals
+from bisect import bisect_right
+import io
+import json
 import os
 import re
+import sqlite3
 from optparse import OptionParser, OptionGroup
 
 from pyg3t import __version__
-from pyg3t.gtparse import iparse
+from pyg3t.ahocorasick import Automaton
+from pyg3t.gtparse import iparse, parse_encoded, getfilename
+from pyg3t.podiff import find_catalogs
 from pyg3t.util import ansi, pyg3tmain, get_encoded_output,\
-    get_bytes_input, PoError, regex
+    get_bytes_input, pool_imap, PoError, regex, StringDevice
 #from pyg3t.annotate import annotate, annotate_ref
 
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
 
-illegal_accel_chars = '*+?{}()|[]'
+try:
+    unichr
+except NameError:  # Python 3
+    unichr = chr
+
+# Case folding is more like case-insensitive matching than lowering
+casefold = getattr(type(''), 'casefold', type('').lower)
 
 
 def build_parser():
@@ -35,6 +51,7 @@ def build_parser():
 
     match = OptionGroup(parser, 'Matching options')
     components = OptionGroup(parser, 'Message COMPONENTs')
+    files = OptionGroup(parser, 'File options')
     output = OptionGroup(parser, 'Output options')
 
     components.add_option('--comment', metavar='PATTERN',
@@ -53,8 +70,18 @@ def build_parser():
     match.add_option('--case', action='store_true',
                      help='use case sensitive matching')
     match.add_option('--accel', metavar='CHAR',
-                     help='character which is ignored when matching.  '
+                     help='character which is ignored when matching '
+                     'msgids, msgstrs and previous msgids, unless doubled.  '
                      'Useful for accelerator keys, typically _ or &.')
+    match.add_option('-f', '--file', metavar='FILE', dest='pattern_file',
+                     help='match any of the PATTERNs in FILE, one per line, '
+                     'and write which ones each message matches.  '
+                     'PATTERNs without special characters are searched '
+                     'for all at once.')
+    match.add_option('--index', metavar='DIR',
+                     help='keep a trigram index of the messages of FILEs in '
+                     'DIR, updated when FILEs change, and search only the '
+                     'messages which have the trigrams of PATTERNs')
 
     output.add_option('-C', '--count', action='store_true',
                       help='print only a count of matching messages')
@@ -68,8 +95,33 @@ def build_parser():
     output.add_option('--annotate', action='store_true',
                       help='write annotations for back-merging')
 
+    files.add_option('-r', '--recursive', action='store_true',
+                     help='search the catalogs (*.po and *.pot) in '
+                     'directory FILEs and their subdirectories.  Without '
+                     'FILEs, search the current directory.  With --count, '
+                     'also write the total count')
+    files.add_option('--exclude', metavar='GLOB', action='append',
+                     default=[],
+                     help='with -r, skip files and directories whose name '
+                     'matches GLOB, or whose path does if GLOB contains /.  '
+                     'Like in .gitignore files, * does not match / but ** '
+                     'matches any number of directories.  '
+                     'Can be given multiple times')
+    files.add_option('--exclude-from', metavar='FILE', action='append',
+                     default=[],
+                     help='with -r, skip files and directories matching the '
+                     'GLOBs in FILE, written like in .gitignore files')
+    files.add_option('-j', '--jobs', type='int', default=1, metavar='N',
+                     help='search up to N files in parallel.  Output is '
+                     'still grouped by file')
+    files.add_option('--unordered', action='store_true',
+                     help='with -j, write the results of each file as soon '
+                     'as it is searched instead of in the order of the '
+                     'files')
+
     parser.add_option_group(components)
     parser.add_option_group(match)
+    parser.add_option_group(files)
     parser.add_option_group(output)
     return parser
 
@@ -77,205 +129,902 @@ def build_parser():
 grep_components = ['comment', 'msgid', 'msgstr']
 
 
+def strip_accel(string, accel):
+    """Return string without accelerator keys, and the offsets of its chars.
+
+    A doubled accelerator key stands for the character itself.  The
+    offsets are those in string of each character of the stripped
+    string, followed by the length of string, or None if string has no
+    accelerator keys."""
+    if accel not in string:
+        return string, None
+    pieces = []
+    offsets = []
+    pos = 0
+    end = len(string)
+    while pos < end:
+        found = string.find(accel, pos)
+        if found == -1:
+            found = end
+        pieces.append(string[pos:found])
+        offsets.extend(range(pos, found))
+        pos = found + 1
+        if string.startswith(accel, pos):
+            pieces.append(accel)
+            offsets.append(pos)
+            pos += 1
+    offsets.append(end)
+    return ''.join(pieces), offsets
+
+
+def get_search_strings(msg, attribute, multiple, accel=None):
+    """Return list of the strings of an attribute of msg to search.
+
+    With an accelerator key, the strings are stripped of it once per
+    message and cached in msg.meta, so that all ops can search them."""
+    strings = getattr(msg, attribute)
+    if strings is None:
+        return []
+    if not multiple:
+        strings = [strings]
+    if accel is None:
+        return strings
+    cache = msg.meta.setdefault('stripped', {})
+    key = (attribute, accel)
+    if key not in cache:
+        cache[key] = [strip_accel(string, accel)[0] for string in strings]
+    return cache[key]
+
+
 class SearchOp:
-    def __init__(self, attribute, pattern, replace, multiple=False):
+    """Match a pattern in an attribute of messages.
+
+    Calling the op only searches for the pattern.  Matches are
+    highlighted separately, and only in the messages which are
+    printed.  With an accelerator key, the pattern is searched in the
+    strings stripped of it, and matches are highlighted at the
+    corresponding positions of the original strings."""
+    def __init__(self, attribute, pattern, multiple=False, accel=None):
         self.attribute = attribute
         self.pattern = pattern
-        self.replace = replace
         self.multiple = multiple
-
-    def _process_string(self, string):
-        return self.pattern.subn(self.replace, string)
+        self.accel = accel
 
     def __call__(self, msg):
-        nhits = 0
+        return any(self.pattern.search(string) for string
+                   in get_search_strings(msg, self.attribute, self.multiple,
+                                         self.accel))
+
+    def highlight_string(self, string, replace):
+        stripped, offsets = (string, None)
+        if self.accel is not None:
+            stripped, offsets = strip_accel(string, self.accel)
+        if offsets is None:
+            return self.pattern.sub(lambda match: replace(match.group()),
+                                    string)
+        pieces = []
+        pos = 0
+        for match in self.pattern.finditer(stripped):
+            if match.start() == match.end():
+                continue
+            start = offsets[match.start()]
+            end = offsets[match.end() - 1] + 1
+            pieces.append(string[pos:start])
+            pieces.append(replace(string[start:end]))
+            pos = end
+        pieces.append(string[pos:])
+        return ''.join(pieces)
+
+    def highlight(self, msg, replace):
+        """Replace each match in msg by replace(text) of the matched text."""
         attribute = getattr(msg, self.attribute)
         if attribute is None:
-            return False
+            return
         if self.multiple:
             for i, string in enumerate(attribute):
-                attribute[i], n = self._process_string(string)
-                nhits += n
+                attribute[i] = self.highlight_string(string, replace)
         else:
-            newstring, n = self._process_string(attribute)
-            setattr(msg, self.attribute, newstring)
-            nhits += n
-        return nhits > 0
+            setattr(msg, self.attribute,
+                    self.highlight_string(attribute, replace))
 
 
-def logical_and(ops):
-    def check(msg):
-        return all([op(msg) for op in ops])
-    return check
+class AndOp:
+    """Match if all ops match, stopping at the first which does not."""
+    def __init__(self, ops):
+        self.ops = ops
 
+    def __call__(self, msg):
+        return all(op(msg) for op in self.ops)
 
-def logical_or(ops):
-    def check(msg):
-        return any([op(msg) for op in ops])
-    return check
+    def highlight(self, msg, replace):
+        for op in self.ops:
+            op.highlight(msg, replace)
 
 
-def logical_not(op):
-    def check(msg):
-        return not op(msg)
-    return check
+class OrOp(AndOp):
+    """Match if any op matches, stopping at the first which does."""
+    def __call__(self, msg):
+        return any(op(msg) for op in self.ops)
 
 
-@pyg3tmain(build_parser)
-def main(parser):
-    opts, fnames = parser.parse_args()
-    out = get_encoded_output('utf-8')
+class NotOp:
+    """Match if op does not match.  There is nothing to highlight."""
+    def __init__(self, op):
+        self.op = op
 
-    if opts.accel:
-        if len(opts.accel) > 1:
-            parser.error('Accelerator key should be one character, '
-                         'but is "%s"' % opts.accel)
-        if opts.accel in illegal_accel_chars:
-            parser.error('Illegal accelerator key: %s.  Cannot be any of '
-                         '%s' % (opts.accel, illegal_accel_chars))
+    def __call__(self, msg):
+        return not self.op(msg)
 
-    flags = 0
-    if not opts.case:
-        flags |= re.IGNORECASE
+    def highlight(self, msg, replace):
+        pass
 
-    def re_compile(pattern):
-        try:
-            return regex(pattern, flags=flags)
-        except re.error as err:
-            msg = 'bad pattern %s: %s' % (pattern, str(err))
-            raise PoError('bad-gtgrep-pattern', msg)
 
-    # Collect all the patterns for --msgid, --imsgid, etc.:
-    patterns = {}
-    optiondict = vars(opts)
-    for component in grep_components:
-        for c in [component, 'i' + component]:
-            if optiondict[c] is not None:
-                patterns[c] = optiondict[c]
+regex_special_chars = '.^$*+?{}[]\\|()'
 
-    match_strategy = logical_and
 
-    # If there were none, take PATTERN from arguments, and match "any":
-    if len(patterns) == 0:
+class PatternSet:
+    """Many patterns searched at once, telling which of them match.
+
+    Patterns without regular expression special characters are
+    literals, which are all found in one pass by an Aho-Corasick
+    automaton.  The other patterns are regexes, each of which is only
+    searched if the automaton also found the longest literal which all
+    its matches contain.
+
+    Args:
+        patterns (list): The patterns
+        flags (int): Flags of the regexes.  With re.IGNORECASE, literals
+            are found in lower-cased strings, since that is how the
+            regexes compare characters, rather than by full case
+            folding which would turn "ß" into "ss".
+    """
+    def __init__(self, patterns, flags):
+        self.patterns = list(patterns)
+        self.flags = flags
+        self.ignorecase = bool(flags & re.IGNORECASE)
+        self.regexes = []
+        keys = []
+        # For each key of the automaton, the index of the literal
+        # pattern or of the regex it is a literal of
+        self.key_patterns = []
+        self.key_regexes = []
+        for index, pattern in enumerate(self.patterns):
+            if not any(char in regex_special_chars for char in pattern):
+                keys.append(self.fold(pattern))
+                self.key_patterns.append(index)
+                self.key_regexes.append(None)
+                continue
+            try:
+                regex_obj = regex(pattern, flags=flags)
+            except re.error as err:
+                raise PoError('bad-gtgrep-pattern', 'bad pattern %s: %s'
+                              % (pattern, str(err)))
+            literals = get_required_literals(regex_obj)
+            if literals:
+                keys.append(self.fold(max(literals, key=len)))
+                self.key_patterns.append(None)
+                self.key_regexes.append(len(self.regexes))
+            self.regexes.append((index, regex_obj, bool(literals)))
+        self.automaton = Automaton(keys)
+        # Whether any match contains one of the keys
+        self.can_prefilter = all(gated for _, _, gated in self.regexes)
+        self._searched = None
+        self._folded = None
+
+    def fold(self, string):
+        if self.ignorecase:
+            return string.lower()
+        return string
+
+    def find(self, string):
+        """Return set of the indices of the patterns matching string."""
+        matches = set()
+        gates = set()
+        for key in self.automaton.findall(self.fold(string)):
+            if self.key_patterns[key] is not None:
+                matches.add(self.key_patterns[key])
+            else:
+                gates.add(self.key_regexes[key])
+        for i, (index, regex_obj, gated) in enumerate(self.regexes):
+            if (i in gates or not gated) and regex_obj.search(string):
+                matches.add(index)
+        return matches
+
+    def search(self, string, pos=0, endpos=None):
+        """Return the first match of a key in string[pos:endpos] or None.
+
+        Any match of a pattern contains a key if can_prefilter is true,
+        so this can be used like a regex to prefilter raw text.  The
+        folded string is cached for searching it again from other
+        positions."""
+        if string is not self._searched:
+            folded = self.fold(string)
+            if len(folded) != len(string):
+                # Only a few characters like "\u0130" lower to several
+                raise PoError('bad-fold', 'Lower-casing changes offsets')
+            self._searched = string
+            self._folded = folded
+        for start, end, _ in self.automaton.finditer(self._folded, pos,
+                                                     endpos):
+            return _KeyMatch(start, end)
+        return None
+
+    def get_highlight_pattern(self, indices):
+        """Return regex matching any of the patterns with given indices."""
+        alternatives = []
+        for index in indices:
+            pattern = self.patterns[index]
+            if not any(char in regex_special_chars for char in pattern):
+                pattern = re.escape(pattern)
+            alternatives.append('(?:%s)' % pattern)
+        return regex('|'.join(alternatives), flags=self.flags)
+
+
+class _KeyMatch:
+    """Match of a key of a PatternSet, like a regex match object"""
+    def __init__(self, start, end):
+        self._start = start
+        self._end = end
+
+    def start(self):
+        return self._start
+
+    def end(self):
+        return self._end
+
+
+class MultiSearchOp:
+    """Match any of the patterns of a PatternSet in any part of messages.
+
+    The indices of the matching patterns are stored as
+    msg.meta['patterns'].  The accelerator key, if any, is ignored like
+    by :py:class:`.SearchOp` in msgids, msgstrs and previous msgids."""
+    # Attributes, whether they have multiple strings, and whether the
+    # accelerator key is ignored in them
+    attributes = [('msgctxt', False, False), ('msgid', False, True),
+                  ('msgid_plural', False, True), ('msgstrs', True, True),
+                  ('comments', True, False),
+                  ('previous_msgctxt', False, False),
+                  ('previous_msgid', False, True)]
+
+    def __init__(self, patternset, accel=None):
+        self.patternset = patternset
+        self.accel = accel
+
+    def __call__(self, msg):
+        matches = set()
+        for attribute, multiple, accelerated in self.attributes:
+            accel = self.accel if accelerated else None
+            for string in get_search_strings(msg, attribute, multiple, accel):
+                matches.update(self.patternset.find(string))
+        msg.meta['patterns'] = sorted(matches)
+        return bool(matches)
+
+    def highlight(self, msg, replace):
+        if not msg.meta.get('patterns'):
+            return
+        pattern = self.patternset.get_highlight_pattern(msg.meta['patterns'])
+        for attribute, multiple, accelerated in self.attributes:
+            accel = self.accel if accelerated else None
+            SearchOp(attribute, pattern, multiple,
+                     accel).highlight(msg, replace)
+
+
+def read_patterns(fname):
+    """Return list of the non-empty lines of a UTF-8 pattern file."""
+    try:
+        with io.open(fname, encoding='utf-8') as fd:
+            lines = fd.read().splitlines()
+    except (IOError, UnicodeError) as err:
+        raise PoError('bad-pattern-file', 'Cannot read patterns from %s: %s'
+                      % (fname, err))
+    return [line for line in lines if line]
+
+
+# Joints of the lines of a string: closing quote, newline, and opening
+# quote, possibly in obsolete messages or previous msgids
+continuation_pattern = regex(r'"[ \t]*\r?\n[ \t]*(?:#[~|][ \t]*)?"')
+blank_line_pattern = regex(r'\n[ \t\r]*\n')
+# Escapes and negated character classes, which contain no anchors
+_escape_pattern = regex(r'\\[^AZ]|\[\^')
+
+
+def is_simple_pattern(pattern):
+    """Whether pattern matches fields in raw catalog text like in messages.
+
+    Anchors and lookarounds would depend on the quotes and keywords
+    around the fields."""
+    stripped = _escape_pattern.sub('', pattern)
+    return not any(token in stripped for token in ['^', '$', '\\A', '\\Z',
+                                                    '(?'])
+
+
+def split_chunks(text):
+    """Split the contents of a catalog into chunks of whole messages.
+
+    Chunks are runs of messages separated by blank lines.  Returns
+    (starts, joined, joined_starts) where joined is text with the
+    continuation lines of each string joined, and starts and
+    joined_starts are the offsets of the chunks in text and joined,
+    followed by the lengths of text and joined."""
+    joined = continuation_pattern.sub('', text)
+    separators = [match.end() for match in blank_line_pattern.finditer(text)]
+    joined_separators = [match.end() for match
+                         in blank_line_pattern.finditer(joined)]
+    if len(separators) != len(joined_separators):
+        raise PoError('bad-chunks', 'Cannot split catalog into chunks')
+
+    # Blank lines only end a chunk if it has a msgstr, so that chunks
+    # consist of whole messages.  Otherwise parsing fails
+    starts = [0]
+    joined_starts = [0]
+    for separator, joined_separator in zip(separators, joined_separators):
+        if text.find('msgstr', starts[-1], separator) != -1:
+            starts.append(separator)
+            joined_starts.append(joined_separator)
+    starts.append(len(text))
+    joined_starts.append(len(joined))
+    return starts, joined, joined_starts
+
+
+def find_candidate_chunks(text, patterns):
+    """Return list of (start, end) of the chunks of text which may match.
+
+    A chunk is a candidate if all the patterns match within it once
+    the continuation lines of each string are joined, which they must
+    if they match a field of one of its messages."""
+    starts, joined, joined_starts = split_chunks(text)
+
+    # After a match we continue from the next chunk.  Matches spanning
+    # chunks are meaningless, and must not hide matches in later chunks
+    first = patterns[0]
+    chunks = []
+    pos = 0
+    while True:
+        match = first.search(joined, pos)
+        if match is None:
+            break
+        index = bisect_right(joined_starts, match.start()) - 1
+        if index == len(starts) - 1:
+            break
+        start, end = joined_starts[index], joined_starts[index + 1]
+        if all(pattern.search(joined, start, end) for pattern in patterns[1:]):
+            chunks.append((starts[index], starts[index + 1]))
+        pos = end
+    return chunks
+
+
+def iparse_chunks(fd, get_chunks):
+    """Return list of the header and the messages in some chunks of fd.
+
+    get_chunks(text) returns the list of (start, end) of the chunks of
+    the decoded text of the catalog to parse.  If the chunks do not
+    consist of whole messages, all messages are returned."""
+    data = fd.read()
+    bytesfd = io.BytesIO(data)
+    bytesfd.name = getfilename(fd)
+    cat = iparse(bytesfd)
+    header = next(cat)
+    msgs = [header]
+    try:
+        text = data.decode(header.meta['encoding'])
+        lineno = 0
+        pos = 0
+        for start, end in get_chunks(text):
+            lineno += text.count('\n', pos, start)
+            pos = start
+            for msg in parse_encoded(io.StringIO(text[start:end])):
+                if msg.msgid == '':
+                    continue  # The header is already there
+                msg.meta['lineno'] += lineno
+                msgs.append(msg)
+    except (PoError, UnicodeError):
+        msgs = [header]
+        msgs.extend(cat)
+    return msgs
+
+
+def iparse_prefiltered(fd, patterns):
+    """Return list of the header and messages of fd which may match.
+
+    Only the chunks of the catalog where all patterns match are parsed,
+    which is much faster if few messages match."""
+    return iparse_chunks(fd, lambda text: find_candidate_chunks(text,
+                                                                patterns))
+
+
+def get_required_literals(pattern):
+    """Return list of strings which any match of compiled pattern contains.
+    """
+    literals = []
+
+    def add_literals(items):
+        run = []
+        for op, av in items:
+            if op is sre_parse.LITERAL:
+                run.append(unichr(av))
+                continue
+            literals.append(''.join(run))
+            run = []
+            if op is sre_parse.SUBPATTERN:
+                add_literals(av[-1])
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) \
+                    and av[0] >= 1:
+                add_literals(av[2])
+        literals.append(''.join(run))
+
+    add_literals(sre_parse.parse(pattern.pattern, pattern.flags))
+    return [literal for literal in literals if literal]
+
+
+def get_trigrams(string):
+    """Return set of the trigrams of case-folded string."""
+    string = casefold(string)
+    return set(string[i:i + 3] for i in range(len(string) - 2))
+
+
+def encode_indices(indices):
+    """Return string of the differences of the increasing indices."""
+    return ' '.join(str(index - previous) for previous, index
+                    in zip([0] + indices, indices))
+
+
+def decode_indices(string):
+    """Return list of indices encoded by :py:func:`.encode_indices`."""
+    indices = []
+    index = 0
+    for difference in string.split():
+        index += int(difference)
+        indices.append(index)
+    return indices
+
+
+_index_schema = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    chunks TEXT);
+CREATE TABLE IF NOT EXISTS postings (
+    trigram TEXT NOT NULL,
+    file INTEGER NOT NULL,
+    chunks TEXT NOT NULL,
+    PRIMARY KEY (trigram, file)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_file ON postings (file);
+"""
+
+
+class TrigramIndex:
+    """Persistent index of the trigrams in the messages of catalogs.
+
+    For each catalog, the index stores the offsets of its chunks of
+    messages (see :py:func:`.split_chunks`) and, for each trigram of
+    the case-folded, joined text of the chunks, which chunks have it.
+    Catalogs are reindexed when their modification time or size
+    changes.  Catalogs which cannot be split into chunks are indexed
+    with no chunks, meaning they must always be searched."""
+    def __init__(self, dirname):
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError as err:
+                raise PoError('bad-index', str(err))
+        self.db = sqlite3.connect(os.path.join(dirname, 'trigrams.sqlite'))
+        self.db.executescript(_index_schema)
+
+    def update(self, fnames):
+        """Reindex the catalogs fnames which changed since indexed."""
+        for fname in fnames:
+            path = os.path.abspath(fname)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # The error is reported when searching
+            row = self.db.execute('SELECT mtime, size FROM files '
+                                  'WHERE path = ?', (path,)).fetchone()
+            if row != (stat.st_mtime, stat.st_size):
+                self.index_file(path, stat)
+        self.db.commit()
+
+    def index_file(self, path, stat):
+        fd = get_bytes_input(path)
+        data = fd.read()
+        fd.close()
+        chunks = None
+        postings = {}
         try:
-            pattern = fnames.pop(0)
-        except IndexError:
-            parser.error('No PATTERNs given')
+            header = next(iparse(io.BytesIO(data)))
+            text = data.decode(header.meta['encoding'])
+            starts, joined, joined_starts = split_chunks(text)
+        except (PoError, UnicodeError):
+            pass
         else:
-            match_strategy = logical_or
-            patterns = {'msgctxt': pattern}  # Cannot be enabled externally
-            for key in grep_components:
-                patterns[key] = pattern
+            chunks = json.dumps(starts)
+            for index in range(len(starts) - 1):
+                chunk = joined[joined_starts[index]:joined_starts[index + 1]]
+                for trigram in get_trigrams(chunk):
+                    postings.setdefault(trigram, []).append(index)
 
-    if opts.color:
-        replace = lambda match: ansi.light_blue(match.group())
-    else:
-        replace = lambda match: match.group()
-
-    def get_accel_pattern(pattern):
-        if not opts.accel:
-            return pattern
-
-        # Yuck!!  We convert pattern into p_?a_?t_?t_?e_?r_?n.  Oh the pain
-        for char in illegal_accel_chars:
-            if char in pattern:
-                err = ('Sorry, patterns containing any of %s '
-                       'are not supported with --accel' % illegal_accel_chars)
-                parser.error(err)
-        return (opts.accel + '?').join(list(pattern))
-
-    ops = []
-
-    for key, pattern in patterns.items():
-        if key in ['comment', 'icomment']:
-            regex_obj = re_compile(pattern)
-            accel_regex_obj = re_compile(get_accel_pattern(pattern))
-            op1 = SearchOp('comments', regex_obj, replace, multiple=True)
-            op2 = SearchOp('previous_msgctxt', regex_obj, replace)
-            op3 = SearchOp('previous_msgid', accel_regex_obj, replace)
-            op = logical_or([op1, op2, op3])
-            if key == 'icomment':
-                op = logical_not(op)
-            ops.append(op)
-
-        elif key == 'msgctxt':
-            ops.append(SearchOp('msgctxt', re_compile(pattern), replace))
-
-        elif key in ['msgid', 'imsgid']:
-            regex_obj = re_compile(get_accel_pattern(pattern))
-            op1 = SearchOp('msgid', regex_obj, replace)
-            op2 = SearchOp('msgid_plural', regex_obj, replace)
-            op = logical_or([op1, op2])
-            if key == 'imsgid':
-                op = logical_not(op)
-            ops.append(op)
-
-        elif key in ['msgstr', 'imsgstr']:
-            regex_obj = re_compile(get_accel_pattern(pattern))
-            op = SearchOp('msgstrs', regex_obj, replace, multiple=True)
-            if key == 'imsgstr':
-                op = logical_not(op)
-            ops.append(op)
+        row = self.db.execute('SELECT id FROM files WHERE path = ?',
+                              (path,)).fetchone()
+        if row is None:
+            fileid = self.db.execute(
+                'INSERT INTO files (path, mtime, size, chunks) '
+                'VALUES (?, ?, ?, ?)',
+                (path, stat.st_mtime, stat.st_size, chunks)).lastrowid
+        else:
+            fileid = row[0]
+            self.db.execute('UPDATE files SET mtime = ?, size = ?, '
+                            'chunks = ? WHERE id = ?',
+                            (stat.st_mtime, stat.st_size, chunks, fileid))
+            self.db.execute('DELETE FROM postings WHERE file = ?', (fileid,))
+        self.db.executemany(
+            'INSERT INTO postings (trigram, file, chunks) VALUES (?, ?, ?)',
+            sorted((trigram, fileid, encode_indices(indices))
+                   for trigram, indices in postings.items()))
+
+    def get_chunks(self, fname, trigrams):
+        """Return list of (start, end) of the chunks having all trigrams.
+
+        None is returned if the catalog is not indexed in chunks."""
+        row = self.db.execute('SELECT id, chunks FROM files WHERE path = ?',
+                              (os.path.abspath(fname),)).fetchone()
+        if row is None or row[1] is None:
+            return None
+        fileid, starts = row[0], json.loads(row[1])
+        indices = None
+        for trigram in trigrams:
+            row = self.db.execute('SELECT chunks FROM postings '
+                                  'WHERE trigram = ? AND file = ?',
+                                  (trigram, fileid)).fetchone()
+            if row is None:
+                return []
+            chunks = set(decode_indices(row[0]))
+            if indices is None:
+                indices = chunks
+            else:
+                indices &= chunks
+            if not indices:
+                return []
+        if indices is None:
+            indices = range(len(starts) - 1)
+        return [(starts[index], starts[index + 1])
+                for index in sorted(indices)]
+
+    def close(self):
+        self.db.close()
+
+
+class Grep:
+    """Search catalogs for the messages matching the options of gtgrep.
+
+    Args:
+        opts: The parsed command-line options
+        patterns (dict): PATTERN of each of grep_components and their
+            inverses, and of msgctxt if match_any
+        match_any (bool): Whether messages match if any PATTERN
+            matches, rather than if all of them do
+        file_patterns (list): PATTERNs read from a file, or None
+        multiple_files (bool): Whether to write file names in
+            annotations and counts
+    """
+    def __init__(self, opts, patterns, match_any, file_patterns,
+                 multiple_files):
+        self.opts = opts
+        self.accel = accel = opts.accel or None
+        self.flags = 0
+        if not opts.case:
+            self.flags |= re.IGNORECASE
+        re_compile = self.re_compile
+
+        self.patternset = None
+        if file_patterns is not None:
+            self.patternset = PatternSet(file_patterns, self.flags)
+
+        ops = []
+
+        for key, pattern in patterns.items():
+            if key in ['comment', 'icomment']:
+                regex_obj = re_compile(pattern)
+                op1 = SearchOp('comments', regex_obj, multiple=True)
+                op2 = SearchOp('previous_msgctxt', regex_obj)
+                op3 = SearchOp('previous_msgid', regex_obj, accel=accel)
+                op = OrOp([op1, op2, op3])
+                if key == 'icomment':
+                    op = NotOp(op)
+                ops.append(op)
+
+            elif key == 'msgctxt':
+                ops.append(SearchOp('msgctxt', re_compile(pattern)))
+
+            elif key in ['msgid', 'imsgid']:
+                regex_obj = re_compile(pattern)
+                op1 = SearchOp('msgid', regex_obj, accel=accel)
+                op2 = SearchOp('msgid_plural', regex_obj, accel=accel)
+                op = OrOp([op1, op2])
+                if key == 'imsgid':
+                    op = NotOp(op)
+                ops.append(op)
+
+            elif key in ['msgstr', 'imsgstr']:
+                regex_obj = re_compile(pattern)
+                op = SearchOp('msgstrs', regex_obj, multiple=True,
+                              accel=accel)
+                if key == 'imsgstr':
+                    op = NotOp(op)
+                ops.append(op)
+
+            else:
+                assert False, 'Internal error: %s' % key
+
+        if self.patternset is not None:
+            ops.append(MultiSearchOp(self.patternset, accel))
+
+        # final search operation is either logical AND or logical OR of
+        # everything
+        if match_any:
+            self.op = OrOp(ops)
+        else:
+            self.op = AndOp(ops)
 
+        # Patterns which must all match in a matching message, and those of
+        # them which must also match the raw text of the message
+        required = []
+        if match_any:
+            # The same PATTERN is used for all components
+            any_pattern = re_compile(patterns['msgctxt'])
+            required.append(self.get_raw_pattern(any_pattern))
         else:
-            assert False, 'Internal error: %s' % key
+            for key, pattern in patterns.items():
+                if key in grep_components:
+                    required.append(self.get_raw_pattern(re_compile(pattern)))
+        required = [regex_obj for regex_obj in required
+                    if regex_obj is not None]
+        self.prefilter = [regex_obj for regex_obj in required
+                          if is_simple_pattern(regex_obj.pattern)]
+        # Keys of the automaton may be split by accelerator keys in raw text
+        if self.patternset is not None and self.patternset.can_prefilter \
+                and accel is None:
+            self.prefilter.append(self.patternset)
 
-    # final search operation is either logical AND or logical OR of everything
-    op = match_strategy(ops)
+        self.index = None
+        if opts.index:
+            self.index = TrigramIndex(opts.index)
+            self.trigrams = set()
+            for regex_obj in required:
+                for literal in get_required_literals(regex_obj):
+                    self.trigrams.update(get_trigrams(literal))
 
-    if not fnames:
-        fnames = ['-']
+        if opts.annotate:
+            from pyg3t.annotate import ref_template
+            annotation = ref_template  # XXX
+        elif multiple_files:
+            annotation = '%(fname)s:%(lineno)d'
+        else:
+            annotation = 'Line %(lineno)d'
 
-    if opts.annotate:
-        from pyg3t.annotate import ref_template
-        annotation = ref_template  # XXX
-    elif len(fnames) > 1:
-        annotation = '%(fname)s:%(lineno)d'
-    else:
-        annotation = 'Line %(lineno)d'
+        patterns_annotation = 'Patterns: %s'
 
-    if opts.gettext:
-        annotation = '# pyg3t: %s' % annotation
-    if opts.color:
-        annotation = ansi.red(annotation)
+        if opts.gettext:
+            annotation = '# pyg3t: %s' % annotation
+            patterns_annotation = '# pyg3t: %s' % patterns_annotation
+        if opts.color:
+            annotation = ansi.red(annotation)
+            patterns_annotation = ansi.red(patterns_annotation)
+        self.annotation = annotation
+        self.patterns_annotation = patterns_annotation
+
+    def re_compile(self, pattern):
+        try:
+            return regex(pattern, flags=self.flags)
+        except re.error as err:
+            msg = 'bad pattern %s: %s' % (pattern, str(err))
+            raise PoError('bad-gtgrep-pattern', msg)
+
+    def get_raw_pattern(self, regex_obj):
+        """Return regex matching raw text where regex_obj matches a field.
+
+        Fields stripped of accelerator keys only contain the longest
+        literal of regex_obj with accelerator keys inserted.  None is
+        returned if there is no such literal."""
+        if self.accel is None:
+            return regex_obj
+        literals = get_required_literals(regex_obj)
+        if not literals:
+            return None
+        literal = max(literals, key=len)
+        return self.re_compile((re.escape(self.accel) + '?').join(
+            re.escape(char) for char in literal))
 
-    def print_message(msg):
+    def print_message(self, msg, fname, out):
+        opts = self.opts
+        if opts.color:
+            self.op.highlight(msg, ansi.light_blue)
         if opts.line_numbers or opts.annotate:
             tmpfname = os.path.abspath(fname) if opts.annotate else fname
-            print(annotation % dict(fname=tmpfname, lineno=msg.meta['lineno']),
+            print(self.annotation % dict(fname=tmpfname,
+                                         lineno=msg.meta['lineno']),
                   file=out)
+        if self.patternset is not None and msg.meta.get('patterns'):
+            print(self.patterns_annotation % ', '.join(
+                self.patternset.patterns[index]
+                for index in msg.meta['patterns']), file=out)
         print(msg.tostring(), file=out)
 
-    if opts.gettext and opts.annotate:
-        parser.error('Conflicting options: --gettext and --annotate')
+    def grep_file(self, fname, out):
+        """Write the matching messages of catalog fname to out.
 
-    for fname in fnames:
-        fd = get_bytes_input(fname)
-        cat = iparse(fd)
+        Returns the number of matching messages.  With --count, nothing
+        is written."""
+        opts = self.opts
+        chunks = None
+        if self.index is not None and fname != '-':
+            chunks = self.index.get_chunks(fname, self.trigrams)
+
+        if chunks is not None:
+            if chunks or opts.gettext or opts.annotate:
+                cat = iter(iparse_chunks(get_bytes_input(fname),
+                                         lambda text: chunks))
+            else:
+                cat = iter([])  # Nothing can match, not even the header
+        elif self.prefilter:
+            cat = iter(iparse_prefiltered(get_bytes_input(fname),
+                                          self.prefilter))
+        else:
+            cat = iparse(get_bytes_input(fname))
 
         hits = 0
         if opts.gettext or opts.annotate:
             # Make sure to print header whether it matches or not
             header = next(cat)
-            if op(header):  # May add coloring
+            if self.op(header):
                 hits += 1
             if not opts.count:
-                print_message(header)
+                self.print_message(header, fname, out)
 
         for msg in cat:
-            if op(msg):
+            if self.op(msg):
                 hits += 1
                 if not opts.count:
-                    print_message(msg)
+                    self.print_message(msg, fname, out)
+        return hits
 
-        if opts.count:
-            fmt = '%(hits)d'
-            if opts.color:
-                fmt = ansi.purple(fmt)
-            if len(fnames) > 1:
-                filefmt = '%(fname)s'
-                if opts.color:
-                    filefmt = ansi.red(filefmt)
-                fmt = '%s:%s' % (filefmt, fmt)
 
+# State of worker processes, see init_worker()
+_worker = {}
+
+
+def init_worker(opts, patterns, match_any, file_patterns, multiple_files):
+    _worker['grep'] = Grep(opts, patterns, match_any, file_patterns,
+                           multiple_files)
+
+
+def grep_file_in_worker(fname):
+    """Search catalog fname with the Grep of init_worker().
+
+    Returns (fname, output, hits)."""
+    out = StringDevice()
+    hits = _worker['grep'].grep_file(fname, out)
+    return fname, out.getvalue(), hits
+
+
+def read_excludes(fname):
+    """Return list of the exclude patterns in a gitignore-style file."""
+    try:
+        with io.open(fname, encoding='utf-8') as fd:
+            lines = fd.read().splitlines()
+    except (IOError, UnicodeError) as err:
+        raise PoError('bad-exclude-file', 'Cannot read excludes from %s: %s'
+                      % (fname, err))
+    excludes = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('!'):
+            raise PoError('bad-exclude-file', 'Negated excludes are not '
+                          'supported: %s' % line)
+        excludes.append(line)
+    return excludes
+
+
+def find_files(fnames, excludes):
+    """Return list of fnames with directories replaced by their catalogs."""
+    paths = []
+    for fname in fnames:
+        if fname != '-' and os.path.isdir(fname):
+            paths.extend(os.path.normpath(os.path.join(fname,
+                                                       *path.split('/')))
+                         for path in find_catalogs(fname, excludes))
+        else:
+            paths.append(fname)
+    return paths
+
+
+@pyg3tmain(build_parser)
+def main(parser):
+    opts, fnames = parser.parse_args()
+
+    accel = opts.accel or None
+    if accel is not None and len(accel) > 1:
+        parser.error('Accelerator key should be one character, '
+                     'but is "%s"' % accel)
+    if opts.jobs < 1:
+        parser.error('Number of jobs must be positive')
+    if opts.gettext and opts.annotate:
+        parser.error('Conflicting options: --gettext and --annotate')
+
+    # Collect all the patterns for --msgid, --imsgid, etc.:
+    patterns = {}
+    optiondict = vars(opts)
+    for component in grep_components:
+        for c in [component, 'i' + component]:
+            if optiondict[c] is not None:
+                patterns[c] = optiondict[c]
+
+    match_any = False
+
+    file_patterns = None
+    if opts.pattern_file is not None:
+        if patterns:
+            parser.error('Cannot use --COMPONENT PATTERNs with -f')
+        file_patterns = read_patterns(opts.pattern_file)
+        if not file_patterns:
+            parser.error('No PATTERNs in %s' % opts.pattern_file)
+    # If there were none, take PATTERN from arguments, and match "any":
+    elif len(patterns) == 0:
+        try:
+            pattern = fnames.pop(0)
+        except IndexError:
+            parser.error('No PATTERNs given')
+        else:
+            match_any = True
+            patterns = {'msgctxt': pattern}  # Cannot be enabled externally
+            for key in grep_components:
+                patterns[key] = pattern
+
+    if opts.recursive:
+        excludes = list(opts.exclude)
+        for fname in opts.exclude_from:
+            excludes.extend(read_excludes(fname))
+        fnames = find_files(fnames or ['.'], excludes)
+    elif not fnames:
+        fnames = ['-']
+    if opts.jobs > 1 and '-' in fnames:
+        parser.error('Cannot read standard input with --jobs')
+    multiple_files = len(fnames) > 1 or opts.recursive
+
+    if opts.index:
+        index = TrigramIndex(opts.index)
+        index.update(fname for fname in fnames if fname != '-')
+        index.close()
+
+    out = get_encoded_output('utf-8')
+    results = pool_imap(grep_file_in_worker, fnames, jobs=opts.jobs,
+                        initializer=init_worker,
+                        initargs=(opts, patterns, match_any, file_patterns,
+                                  multiple_files),
+                        ordered=not opts.unordered)
+
+    fmt = '%(hits)d'
+    if opts.color:
+        fmt = ansi.purple(fmt)
+    if multiple_files:
+        filefmt = '%(fname)s'
+        if opts.color:
+            filefmt = ansi.red(filefmt)
+        fmt = '%s:%s' % (filefmt, fmt)
+
+    total = 0
+    for fname, output, hits in results:
+        print(output, end='', file=out)
+        total += hits
+        if opts.count:
             print(fmt % dict(fname=fname, hits=hits), file=out)
+
+    if opts.count and opts.recursive:
+        totalfmt = 'Total: %(hits)d'
+        if opts.color:
+            totalfmt = ansi.purple(totalfmt)
+        print(totalfmt % dict(hits=total), file=out)
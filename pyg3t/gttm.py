@@ -0,0 +1,79 @@
+from __future__ import print_function, unicode_literals
+from optparse import OptionParser
+
+from pyg3t.gtparse import iparse
+from pyg3t.poabc import get_language
+from pyg3t.tm import TranslationMemory, default_min_similarity
+from pyg3t.util import pyg3tmain, get_bytes_input, get_encoded_output
+
+
+def fill_msg(tm, msg, language, min_similarity):
+    """Set msgstrs of untranslated msg from the best suggestion in tm.
+
+    The message is marked fuzzy, and the msgid of the suggestion is
+    stored as the previous msgid.  Returns the suggestion or None."""
+    for suggestion in tm.lookup(msg.msgid, language, limit=5,
+                                min_similarity=min_similarity):
+        if len(suggestion.msgstrs) != len(msg.msgstrs):
+            continue
+        msg.msgstrs = list(suggestion.msgstrs)
+        msg.flags.add('fuzzy')
+        if suggestion.msgid != msg.msgid:
+            msg.previous_msgctxt = suggestion.msgctxt
+            msg.previous_msgid = suggestion.msgid
+        return suggestion
+    return None
+
+
+def build_parser():
+    usage = '%prog [OPTION...] DATABASE FILE...'
+    description = ('Suggest translations of the untranslated messages in '
+                   'po-FILE from the translation memory DATABASE, and write '
+                   'FILE with the suggestions as fuzzy messages.  With --add, '
+                   'instead add the translations in FILEs to DATABASE, '
+                   'creating it if necessary.')
+    parser = OptionParser(usage=usage, description=description)
+    parser.add_option('-a', '--add', action='store_true',
+                      help='add translated messages of FILEs to DATABASE')
+    parser.add_option('-l', '--language', metavar='LANG',
+                      help='language of FILEs.  Default: the Language '
+                      'header of each FILE')
+    parser.add_option('-s', '--min-similarity', type='float', metavar='S',
+                      default=default_min_similarity,
+                      help='only suggest translations of msgids whose edit '
+                      'distance is at most 1 - S times their length.  '
+                      'Default: %default')
+    return parser
+
+
+@pyg3tmain(build_parser)
+def main(parser):
+    opts, args = parser.parse_args()
+    if len(args) < 2:
+        parser.error('Expected a database and at least one FILE')
+    if not 0.0 < opts.min_similarity <= 1.0:
+        parser.error('Minimum similarity must be between 0 and 1')
+
+    tm = TranslationMemory(args[0])
+    fnames = args[1:]
+    if opts.add:
+        for fname in fnames:
+            added = tm.add_catalog(get_bytes_input(fname),
+                                   language=opts.language)
+            print('%s: added %d messages' % (fname, added))
+        tm.close()
+        return
+
+    if len(fnames) > 1:
+        parser.error('Only one FILE can be filled at a time')
+    cat = iparse(get_bytes_input(fnames[0]))
+    header = next(cat)
+    language = opts.language or get_language(header)
+    out = get_encoded_output(header.meta['encoding'])
+    print(header.tostring(), file=out)
+    for msg in cat:
+        if msg.is_proper_message and not msg.is_obsolete \
+                and msg.msgid and msg.untranslated:
+            fill_msg(tm, msg, language, opts.min_similarity)
+        print(msg.tostring(), file=out)
+    tm.close()
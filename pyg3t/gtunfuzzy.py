@@ -0,0 +1,154 @@
+from __future__ import print_function, unicode_literals
+from itertools import combinations
+from optparse import OptionParser
+import sys
+
+from pyg3t.gtdifflib import bounded_edit_distance, tokenizer
+from pyg3t.gtparse import iparse
+from pyg3t.util import (pyg3tmain, get_bytes_input, get_encoded_output,
+                        regex)
+
+
+markup_pattern = regex(r'<[^<>]*>')
+punctuation_pattern = regex(r'[^\w\s]')
+whitespace_pattern = regex(r'\s+')
+
+# Rules for trivial changes, in the order they are applied.  Markup
+# goes first, since removing punctuation would leave tags unrecognizable.
+rule_names = ['markup', 'punctuation', 'case', 'whitespace']
+default_rules = ['whitespace']
+
+_normalizers = {
+    'markup': lambda string: markup_pattern.sub('', string),
+    'punctuation': lambda string: punctuation_pattern.sub('', string),
+    'case': lambda string: string.lower(),
+    'whitespace': lambda string: whitespace_pattern.sub(' ', string).strip(),
+}
+
+
+def normalize(string, rules):
+    """Return string with the differences allowed by rules removed."""
+    for name in rule_names:
+        if name in rules:
+            string = _normalizers[name](string)
+    return string
+
+
+def classify_change(old, new, rules, max_changes):
+    """Return tuple of the rules making the change from old to new trivial.
+
+    The smallest set of rules under which old and new are equal is
+    returned, which is empty if they are identical.  If they differ in
+    more than max_changes tokens of the gtdifflib tokenization, or no
+    set of rules makes them equal, None is returned."""
+    if old == new:
+        return ()
+    if bounded_edit_distance(tokenizer.findall(old), tokenizer.findall(new),
+                             max_changes) is None:
+        return None
+    rules = [name for name in rule_names if name in rules]
+    if normalize(old, rules) != normalize(new, rules):
+        return None
+    for size in range(1, len(rules) + 1):
+        for subset in combinations(rules, size):
+            if normalize(old, subset) == normalize(new, subset):
+                return subset
+
+
+def classify_msg(msg, rules, max_changes):
+    """Return tuple of the rules making the change of a fuzzy msg trivial.
+
+    The change is that from the previous msgid, and msgid_plural if
+    any, to the current ones.  A change of msgctxt is never trivial.
+    None is returned if the change is not trivial or unknown."""
+    if not msg.isfuzzy or not msg.has_previous_msgid:
+        return None
+    if msg.previous_msgctxt != msg.msgctxt:
+        return None
+    pairs = [(msg.previous_msgid, msg.msgid)]
+    if msg.has_previous_msgid_plural or msg.isplural:
+        if msg.previous_msgid_plural is None or msg.msgid_plural is None:
+            return None
+        pairs.append((msg.previous_msgid_plural, msg.msgid_plural))
+    needed = set()
+    for old, new in pairs:
+        subset = classify_change(old, new, rules, max_changes)
+        if subset is None:
+            return None
+        needed.update(subset)
+    return tuple(name for name in rule_names if name in needed)
+
+
+def unfuzzy(msg):
+    """Remove fuzzy flag and previous msgctxt and msgids from msg."""
+    msg.flags.discard('fuzzy')
+    msg.previous_msgctxt = None
+    msg.previous_msgid = None
+    msg.previous_msgid_plural = None
+
+
+def build_parser():
+    usage = '%prog [OPTION...] FILE'
+    description = ('Remove the fuzzy flag and previous msgids of the fuzzy '
+                   'messages in po-FILE whose msgid changed only trivially '
+                   'from the previous msgid, and write the catalog.  '
+                   'The rules for trivial changes are %s.  A line for each '
+                   'changed message and a summary are written to standard '
+                   'error.' % ', '.join(rule_names))
+    parser = OptionParser(usage=usage, description=description)
+    parser.add_option('-r', '--rules', metavar='LIST',
+                      default=','.join(default_rules),
+                      help='comma-separated list of rules for trivial '
+                      'changes.  Default: %default')
+    parser.add_option('-m', '--max-changes', type='int', default=20,
+                      metavar='N',
+                      help='never consider changes of more than N words or '
+                      'separators trivial.  Default: %default')
+    parser.add_option('-o', '--output', metavar='FILE', default='-',
+                      help='write catalog to FILE instead of standard out')
+    parser.add_option('-n', '--dry-run', action='store_true',
+                      help='only report changes, do not write the catalog')
+    parser.add_option('-q', '--quiet', action='store_true',
+                      help='write only the summary of changes')
+    return parser
+
+
+@pyg3tmain(build_parser)
+def main(parser):
+    opts, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error('Expected one FILE, got %d' % len(args))
+    rules = opts.rules.split(',')
+    for name in rules:
+        if name not in rule_names:
+            parser.error('Unknown rule: %s' % name)
+    if opts.max_changes < 0:
+        parser.error('Maximum number of changes must not be negative')
+
+    cat = iparse(get_bytes_input(args[0]))
+    header = next(cat)
+    out = None
+    if not opts.dry_run:
+        out = get_encoded_output(header.meta['encoding'], opts.output)
+        print(header.tostring(), file=out)
+
+    fuzzycount = 0
+    counts = {}
+    for msg in cat:
+        if msg.is_proper_message and not msg.is_obsolete and msg.isfuzzy:
+            fuzzycount += 1
+            subset = classify_msg(msg, rules, opts.max_changes)
+            if subset is not None:
+                what = ', '.join(subset) or 'identical'
+                counts[what] = counts.get(what, 0) + 1
+                if not opts.quiet:
+                    print('Line %d: unfuzzied (%s)'
+                          % (msg.meta['lineno'], what), file=sys.stderr)
+                unfuzzy(msg)
+        if out is not None:
+            print(msg.tostring(), file=out)
+
+    print('Unfuzzied %d of %d fuzzy messages'
+          % (sum(counts.values()), fuzzycount), file=sys.stderr)
+    for what in sorted(counts):
+        print('  %s: %d' % (what, counts[what]), file=sys.stderr)
@@ -6,10 +6,11 @@ try:
 except ImportError:
     from itertools import izip_longest as zip_longest  # Py2
 
-from pyg3t.gtparse import parse
+from pyg3t.gtparse import parse, iparse
 from pyg3t.message import Message
 from pyg3t.util import (ansi, pyg3tmain, get_encoded_output, get_bytes_input,
                         regex)
+from pyg3t.podiff import align_messages, translations_differ
 from pyg3t.popatch import split_diff_as_bytes
 
 
@@ -54,6 +55,31 @@ def print_msg_diff(differ, msg1, msg2, fd):
     print(string, file=fd)
 
 
+def empty_counterpart(msg):
+    """Return an empty message to diff against msg.
+
+    Used for messages that are present in only one of two catalogs."""
+    msgid_plural = '' if msg.isplural else None
+    return Message(msgid='', msgstrs=[''] * len(msg.msgstrs),
+                   msgid_plural=msgid_plural)
+
+
+def iter_changed_pairs(oldmsgs, newmsgs):
+    """Yield pairs (oldmsg, newmsg) of messages whose translations differ.
+
+    Messages are aligned by key, see :func:`pyg3t.podiff.align_messages`.
+    Messages present only in the new catalog are paired with an empty
+    message, while messages present only in the old catalog are
+    ignored."""
+    for oldmsg, newmsg in align_messages(oldmsgs, newmsgs):
+        if newmsg is None:
+            continue
+        if oldmsg is None:
+            yield empty_counterpart(newmsg), newmsg
+        elif translations_differ(oldmsg, newmsg):
+            yield oldmsg, newmsg
+
+
 class MSGDiffer:
     def __init__(self):
         # Tokenizer splits strings over escaped newlines, whitespace,
@@ -113,8 +139,12 @@ class MSGDiffer:
 
 
 def build_parser():
-    usage = '%prog [OPTION] PODIFF'
-    description = 'Generate word-wise podiff from ordinary podiff'
+    usage = ('%prog [OPTION] PODIFF\n'
+             '       %prog [OPTION] OLD NEW')
+    description = ('Generate word-wise podiff from ordinary podiff, '
+                   'or directly from two catalogs OLD and NEW.  In the '
+                   'latter case, messages are matched by msgid and msgctxt, '
+                   'and only messages whose translations differ are written.')
     p = OptionParser(usage=usage, description=description)
     p.add_option('--previous', action='store_true',
                  help='display changes inferred from previous msgid'
@@ -123,15 +153,7 @@ def build_parser():
     return p
 
 
-@pyg3tmain(build_parser)
-def main(p):
-    opts, args = p.parse_args()
-
-    if len(args) != 1:
-        p.error('Expected exactly one file; got %d' % len(args))
-
-    fname = args[0]
-
+def iter_podiff_pairs(p, fname):
     # We will, rather laboriously (for the computer, that is)
     # reconstruct 'old' and a 'new' versions from the diff using
     # PoPatch.
@@ -143,14 +165,36 @@ def main(p):
     oldcat = parse(iter(oldbytes))
     newcat = parse(iter(newbytes))
 
-    out = get_encoded_output('utf8')
-    differ = MSGDiffer()
-
     if len(oldcat) != len(newcat): # XXX not very general
         p.error('The catalogs have different length.  Not supported '
                 'by gtwdiff as of now')
+    return zip(oldcat, newcat)
+
+
+def iter_catalog_pairs(oldfname, newfname):
+    oldmsgs = iparse(get_bytes_input(oldfname), obsolete=False,
+                     trailing=False)
+    newmsgs = iparse(get_bytes_input(newfname), obsolete=False,
+                     trailing=False)
+    return iter_changed_pairs(oldmsgs, newmsgs)
+
+
+@pyg3tmain(build_parser)
+def main(p):
+    opts, args = p.parse_args()
+
+    if len(args) == 1:
+        pairs = iter_podiff_pairs(p, args[0])
+    elif len(args) == 2:
+        pairs = iter_catalog_pairs(args[0], args[1])
+    else:
+        p.error('Expected one podiff or two catalogs; got %d files'
+                % len(args))
+
+    out = get_encoded_output('utf8')
+    differ = MSGDiffer()
 
-    for oldmsg, newmsg in zip(oldcat, newcat):
+    for oldmsg, newmsg in pairs:
         if opts.previous:
             if oldmsg.has_previous_msgid:
                 if oldmsg.msgid != newmsg.msgid:
@@ -6,7 +6,7 @@ from optparse import OptionParser
 
 from pyg3t.gtparse import parse
 from pyg3t.util import (ansi, noansi, pyg3tmain, get_encoded_output,
-                        get_bytes_input)
+                        get_bytes_input, regex, msgid_cache)
 
 
 class SuspiciousTagsError(ValueError):
@@ -22,6 +22,76 @@ class XMLElementSet(xml.sax.handler.ContentHandler):
         self.elements.append(name)
 
 
+# Markup recognized by the fast scanner: plain start, end and empty
+# element tags with simple attributes, and the predefined entity and
+# character references.  Anything else (comments, CDATA, processing
+# instructions, non-ASCII names, '<' or '&' in attribute values, ...)
+# is left to the real parser.
+_xml_name = r'[A-Za-z_:][-A-Za-z0-9_:.]*'
+_xml_markup_pattern = regex(
+    r'<(?P<end>/?)(?P<name>%(name)s)'
+    r'(?P<attrs>(?:%(s)s+%(name)s%(s)s*=%(s)s*'
+    r'(?:"[^"<&]*"|\'[^\'<&]*\'))*)'
+    r'%(s)s*(?P<empty>/?)>'
+    r'|&(?:amp|lt|gt|quot|apos|#(?P<dec>[0-9]+)|#x(?P<hex>[0-9a-fA-F]+));'
+    r'|[<&]|\]\]>' % dict(name=_xml_name, s=r'[ \t\r\n]'))
+_xml_attrname_pattern = regex(r'(%s)[ \t\r\n]*=' % _xml_name)
+# Characters which are not allowed in xml, and surrogates, which we
+# do not want to deal with here
+_xml_badchar_pattern = regex('[\x00-\x08\x0b\x0c\x0e-\x1f'
+                             '\ud800-\udfff\ufffe\uffff]')
+
+
+def _valid_xml_charref(number):
+    return (number in (0x9, 0xa, 0xd)
+            or 0x20 <= number <= 0xd7ff
+            or 0xe000 <= number <= 0xfffd
+            or 0x10000 <= number <= 0x10ffff)
+
+
+def scan_xml_elements(string):
+    """Return set of element names in string if it is surely well-formed.
+
+    This is a fast scanner which only understands the common subset of
+    xml found in translations.  It returns None whenever the string is
+    not well-formed or may not be, in which case the string should be
+    given to a real xml parser to get a proper error."""
+    if _xml_badchar_pattern.search(string):
+        return None
+    elements = set()
+    stack = []
+    for match in _xml_markup_pattern.finditer(string):
+        name = match.group('name')
+        if name is not None:
+            attrs = match.group('attrs')
+            if match.group('end'):
+                if attrs or match.group('empty'):
+                    return None
+                if not stack or stack.pop() != name:
+                    return None
+                continue
+            if attrs:
+                attrnames = _xml_attrname_pattern.findall(attrs)
+                if len(set(attrnames)) != len(attrnames):
+                    return None
+            elements.add(name)
+            if not match.group('empty'):
+                stack.append(name)
+            continue
+        dec, hexa = match.group('dec', 'hex')
+        if dec is not None or hexa is not None:
+            number = int(dec, 10) if dec is not None else int(hexa, 16)
+            if not _valid_xml_charref(number):
+                return None
+            continue
+        if match.group().startswith('&') and len(match.group()) > 1:
+            continue  # Predefined entity
+        return None  # Bare '<' or '&' or ']]>'
+    if stack:
+        return None
+    return elements
+
+
 class GTXMLChecker:
     """XML parser class for checking bad xml in gettext translations.
 
@@ -43,6 +113,11 @@ class GTXMLChecker:
         return xml.encode('utf8')
 
     def parse_xml_elements(self, string):
+        # Most strings are decided by the fast scanner.  The others
+        # go through the full parser so errors are reported by sax
+        elements = scan_xml_elements(string.replace('\\"', '"'))
+        if elements is not None:
+            return elements
         xmlstring = self._filter(string)
         elements = XMLElementSet()
         xml.sax.parseString(xmlstring, elements)
@@ -51,6 +126,13 @@ class GTXMLChecker:
         # can't (simply) be a set right away
         return set(elements.elements[1:])
 
+    def get_msgid_elements(self, msgid):
+        """Return sorted list of elements in msgid, or None if not xml."""
+        try:
+            return sorted(self.parse_xml_elements(msgid))
+        except xml.sax.SAXParseException:
+            return None
+
     def check_msg(self, msg):
         """Raise SAXParseException if msg is considered ill-formed."""
         msgid = msg.msgid
@@ -58,9 +140,7 @@ class GTXMLChecker:
             return True
         if not '<' in msgid:
             return True
-        try:
-            self.parse_xml_elements(msgid)
-        except xml.sax.SAXParseException:
+        if msgid_cache.get('xml', msgid, self.get_msgid_elements) is None:
             return True  # msgid is probably not supposed to be xml
         for msgstr in msg.msgstrs:
             self.parse_xml_elements(msgstr)
@@ -0,0 +1,110 @@
+from __future__ import print_function, unicode_literals
+import hashlib
+import json
+
+
+# Number of levels below the root.  The tree has 2**depth leaves.
+default_depth = 10
+
+
+def key_digest(key):
+    """Return a hexadecimal SHA-1 digest of a message key.
+
+    The key is the tuple (msgid, msgctxt) as given by
+    :py:attr:`.Message.key`."""
+    data = json.dumps(list(key), separators=(',', ':'))
+    return hashlib.sha1(data.encode('ascii')).hexdigest()
+
+
+def _hash(*tokens):
+    return hashlib.sha1(''.join(tokens).encode('ascii')).hexdigest()
+
+
+class MerkleTree(object):
+    """A Merkle tree of message fingerprints.
+
+    Messages are distributed over the leaves of the tree according to
+    the digest of their key.  Thus adding, removing or changing a
+    message affects only a single leaf and its ancestors, regardless of
+    where the message is located in the catalog.  Each leaf is the hash
+    of the key digests and fingerprints (see
+    :py:meth:`.Message.fingerprint`) of its messages, and each inner node
+    is the hash of its two children.
+
+    Two trees of the same depth are compared by descending only into
+    subtrees whose hashes differ.  Trees can be saved to and loaded from
+    files such that a catalog can be compared to an earlier version of
+    itself without having that version at hand.
+
+    Args:
+        leaves (list): 2**depth dicts mapping key digests to fingerprints
+        depth (int): Number of levels below the root
+
+    Attributes:
+        depth (int): Number of levels below the root
+        leaves (list): The dicts of key digests and fingerprints
+        levels (list): Lists of node hashes for each level, root first
+    """
+    def __init__(self, leaves, depth=default_depth):
+        assert len(leaves) == 2**depth
+        self.depth = depth
+        self.leaves = leaves
+
+        level = [_hash(*['%s:%s\n' % item for item in sorted(leaf.items())])
+                 for leaf in leaves]
+        levels = [level]
+        while len(level) > 1:
+            level = [_hash(level[i], level[i + 1])
+                     for i in range(0, len(level), 2)]
+            levels.append(level)
+        levels.reverse()
+        self.levels = levels
+
+    @classmethod
+    def from_messages(cls, msgs, depth=default_depth):
+        """Create tree from an iterable of messages."""
+        leaves = [{} for i in range(2**depth)]
+        for msg in msgs:
+            digest = key_digest(msg.key)
+            leaves[int(digest, 16) % len(leaves)][digest] = msg.fingerprint()
+        return cls(leaves, depth=depth)
+
+    @property
+    def root(self):
+        """The hash of the root node."""
+        return self.levels[0][0]
+
+    def diff(self, other):
+        """Return the set of key digests of messages that differ.
+
+        These are the messages present in only one of the trees, and the
+        messages present in both but with different fingerprints."""
+        if self.depth != other.depth:
+            raise ValueError('Cannot compare trees of depth %d and %d'
+                             % (self.depth, other.depth))
+        digests = set()
+        nodes = [(0, 0)]
+        while nodes:
+            level, index = nodes.pop()
+            if self.levels[level][index] == other.levels[level][index]:
+                continue
+            if level < self.depth:
+                nodes.append((level + 1, 2 * index))
+                nodes.append((level + 1, 2 * index + 1))
+                continue
+            leaf1 = self.leaves[index]
+            leaf2 = other.leaves[index]
+            for digest in set(leaf1).union(leaf2):
+                if leaf1.get(digest) != leaf2.get(digest):
+                    digests.add(digest)
+        return digests
+
+    def dump(self, fd):
+        """Write this tree to the text file fd."""
+        json.dump(dict(depth=self.depth, leaves=self.leaves), fd)
+
+    @classmethod
+    def load(cls, fd):
+        """Read a tree written by :py:meth:`.dump` from the text file fd."""
+        data = json.load(fd)
+        return cls(data['leaves'], depth=data['depth'])
@@ -1,6 +1,9 @@
 from __future__ import print_function, unicode_literals
+import hashlib
+import json
 
 from pyg3t.util import py2, PoError, noansi, ansipattern, ansi_nocolor, regex
+from pyg3t.merkle import MerkleTree, default_depth
 
 
 class DuplicateMessageError(PoError):
@@ -77,6 +80,15 @@ class Catalog(object):
             d[key] = msg
         return d
 
+    def merkle_tree(self, obsolete=False, depth=default_depth):
+        """Return a :py:class:`.MerkleTree` of the messages in this catalog.
+
+        The tree can be compared with that of another version of the
+        catalog to find the messages that differ."""
+        return MerkleTree.from_messages(self.iter(trailing=False,
+                                                  obsolete=obsolete),
+                                        depth=depth)
+
     def __iter__(self):
         """Return an iterator of the (non-obsolete) messages."""
         return iter(self.msgs)
@@ -276,6 +288,21 @@ class Message(object):
         in a dict."""
         return (self.msgid, self.msgctxt)
 
+    def fingerprint(self):
+        """Return a fingerprint of the contents of this message.
+
+        The fingerprint is a hexadecimal SHA-1 digest of the key, the
+        msgid_plural, the msgstrs, the flags, the comments and the
+        previous msgctxt/msgid.  It does not depend on metadata such as
+        line numbers, so it can be stored and compared with fingerprints
+        of other versions of the catalog."""
+        contents = [self.msgctxt, self.msgid, self.msgid_plural,
+                    self.msgstrs, sorted(self.flags), self.comments,
+                    self.previous_msgctxt, self.previous_msgid,
+                    self.previous_msgid_plural]
+        data = json.dumps(contents, separators=(',', ':'))
+        return hashlib.sha1(data.encode('ascii')).hexdigest()
+
     def get_comments(self, pattern='', strip=False):
         """Return comments, optionally starting with a particular pattern.
 
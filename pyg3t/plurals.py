@@ -0,0 +1,243 @@
+from __future__ import print_function, unicode_literals
+
+from pyg3t.util import PoError, regex
+
+
+# Largest n for which plural expressions are checked by default
+default_nmax = 10**6
+
+plural_forms_pattern = regex(r'\s*nplurals\s*=\s*(?P<nplurals>[0-9]+)\s*;'
+                             r'\s*plural\s*=\s*(?P<plural>[^;]+?)\s*;?\s*$')
+token_pattern = regex(r'\s*(?:(?P<number>[0-9]+)|(?P<n>n)|'
+                      r'(?P<op>\|\||&&|==|!=|<=|>=|[-+*/%<>!?:()]))')
+
+# Binary C operators by precedence, loosest first
+binary_operators = [['||'], ['&&'], ['==', '!='], ['<', '>', '<=', '>='],
+                    ['+', '-'], ['*', '/', '%']]
+
+
+def _bool(expression):
+    # C logical operators give 0 or 1, Python ones give an operand
+    return '(1 if %s else 0)' % expression
+
+
+def _cdiv(a, b):
+    """Divide integers like C, truncating towards zero."""
+    quotient = abs(a) // abs(b)
+    if (a < 0) != (b < 0):
+        return -quotient
+    return quotient
+
+
+def _cmod(a, b):
+    """Return remainder of integer division like C, with the sign of a."""
+    return a - b * _cdiv(a, b)
+
+
+class _ExpressionTranslator:
+    # Recursive descent parser which translates a C plural expression
+    # into an equivalent Python expression.  Only the number n,
+    # integer constants and C operators are accepted, so the result
+    # is safe to evaluate.  The methods return the Python expression
+    # and whether it is never negative, since Python and C only
+    # divide non-negative numbers alike.
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = []
+        pos = 0
+        expression = expression.rstrip()
+        while pos < len(expression):
+            match = token_pattern.match(expression, pos)
+            if match is None:
+                self.error('unexpected character %r'
+                           % expression[pos:].lstrip()[0])
+            self.tokens.append(match.group('number') or match.group('n')
+                               or match.group('op'))
+            pos = match.end()
+        self.pos = 0
+
+    def error(self, msg):
+        raise PoError('bad-plural-forms',
+                      'Bad plural expression "%s": %s'
+                      % (self.expression, msg))
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None:
+            self.error('unexpected end of expression')
+        if expected is not None and token != expected:
+            self.error('expected "%s", got "%s"' % (expected, token))
+        self.pos += 1
+        return token
+
+    def translate(self):
+        python, _ = self.ternary()
+        if self.peek() is not None:
+            self.error('unexpected "%s"' % self.peek())
+        return python
+
+    def ternary(self):
+        condition, nonneg = self.binary(0)
+        if self.peek() != '?':
+            return condition, nonneg
+        self.take('?')
+        iftrue, iftrue_nonneg = self.ternary()
+        self.take(':')
+        iffalse, iffalse_nonneg = self.ternary()
+        return ('(%s if %s else %s)' % (iftrue, condition, iffalse),
+                iftrue_nonneg and iffalse_nonneg)
+
+    def binary(self, level):
+        if level == len(binary_operators):
+            return self.unary()
+        left, left_nonneg = self.binary(level + 1)
+        while self.peek() in binary_operators[level]:
+            op = self.take()
+            right, right_nonneg = self.binary(level + 1)
+            nonneg = left_nonneg and right_nonneg
+            if op == '||':
+                left = _bool('(%s or %s)' % (left, right))
+            elif op == '&&':
+                left = _bool('(%s and %s)' % (left, right))
+            elif op in ['/', '%'] and not nonneg:
+                function = '_cdiv' if op == '/' else '_cmod'
+                left = '%s(%s, %s)' % (function, left, right)
+            elif op == '/':
+                left = '(%s // %s)' % (left, right)
+            else:
+                # Comparisons give bools, which work as 0 and 1
+                left = '(%s %s %s)' % (left, op, right)
+            if op == '-':
+                left_nonneg = False
+            elif op in ['+', '*', '/', '%']:
+                left_nonneg = nonneg
+            else:
+                left_nonneg = True
+        return left, left_nonneg
+
+    def unary(self):
+        token = self.peek()
+        if token == '!':
+            self.take()
+            return '(not %s)' % self.unary()[0], True
+        if token in ['-', '+']:
+            self.take()
+            python, nonneg = self.unary()
+            return '(%s%s)' % (token, python), nonneg and token == '+'
+        if token == '(':
+            self.take()
+            python = self.ternary()
+            self.take(')')
+            return python
+        token = self.take()
+        if token == 'n' or token.isdigit():
+            return token, True
+        self.error('unexpected "%s"' % token)
+
+
+def translate_expression(expression):
+    """Return Python expression in n equivalent to C plural expression."""
+    return _ExpressionTranslator(expression).translate()
+
+
+class PluralForms(object):
+    """The plural forms of a catalog, as given by the Plural-Forms header.
+
+    Use :py:func:`.get_plural_forms` to get PluralForms objects, such
+    that the expression is compiled only once for all catalogs with
+    the same header.
+
+    Args:
+        nplurals (int): The number of plural forms
+        expression (str): The C expression giving the index of the plural
+            form for the number n
+
+    Attributes:
+        nplurals (int): The number of plural forms
+        expression (str): The C expression
+        function (callable): Function returning the index for one n
+        bulk (callable): Function returning list of the indices for an
+            iterable of n, which is much faster than calling function
+            for each n
+    """
+    def __init__(self, nplurals, expression):
+        self.nplurals = nplurals
+        self.expression = expression
+        python = translate_expression(expression)
+        namespace = dict(_cdiv=_cdiv, _cmod=_cmod)
+        code = ('def function(n):\n'
+                '    return int(%(expr)s)\n'
+                'def bulk(ns):\n'
+                '    return [int(%(expr)s) for n in ns]\n' % dict(expr=python))
+        exec(compile(code, '<plural expression>', 'exec'), namespace)
+        self.function = namespace['function']
+        self.bulk = namespace['bulk']
+        self._problems = {}
+
+    @classmethod
+    def from_header(cls, value):
+        """Create PluralForms from the value of a Plural-Forms header."""
+        match = plural_forms_pattern.match(value)
+        if match is None:
+            raise PoError('bad-plural-forms',
+                          'Cannot parse Plural-Forms header "%s"' % value)
+        return cls(int(match.group('nplurals')), match.group('plural'))
+
+    def __call__(self, n):
+        return self.function(n)
+
+    def find_problems(self, nmax=default_nmax):
+        """Return list of problems with the expression for n up to nmax.
+
+        Problems are indices outside range(nplurals) and plural forms
+        which are never used."""
+        if nmax in self._problems:
+            return self._problems[nmax]
+        problems = []
+        try:
+            indices = self.bulk(range(nmax + 1))
+        except ZeroDivisionError:
+            indices = []
+            problems.append('division by zero')
+        used = set(indices)
+        for index in sorted(used):
+            if not 0 <= index < self.nplurals:
+                problems.append('index %d out of range for n = %d'
+                                % (index, indices.index(index)))
+        for index in range(self.nplurals):
+            if indices and index not in used:
+                problems.append('plural form %d not used for n <= %d'
+                                % (index, nmax))
+        self._problems[nmax] = problems
+        return problems
+
+    def check_msg(self, msg):
+        """Return error message if the number of msgstrs is wrong, else None.
+        """
+        if not msg.isplural or len(msg.msgstrs) == self.nplurals:
+            return None
+        return ('%d plural forms, but the header says nplurals=%d'
+                % (len(msg.msgstrs), self.nplurals))
+
+
+_plural_forms = {}
+
+
+def get_plural_forms(value):
+    """Return the shared :py:class:`.PluralForms` of a header value."""
+    plural_forms = _plural_forms.get(value)
+    if plural_forms is None:
+        plural_forms = _plural_forms[value] = PluralForms.from_header(value)
+    return plural_forms
+
+
+def find_plural_problems(value):
+    """Return list of problems with the plural forms of a header value.
+
+    See :py:meth:`.PluralForms.find_problems`."""
+    return get_plural_forms(value).find_problems()
@@ -3,15 +3,24 @@
 
 from __future__ import print_function, unicode_literals
 from optparse import OptionParser, OptionGroup
+import hashlib
+import io
+from itertools import chain
+import json
+import math
 import os
 import re
+import time
 
 from pyg3t.gtparse import iparse
 from pyg3t.gtxml import GTXMLChecker
 from pyg3t.annotate import annotate, annotate_ref
 from pyg3t.util import (pyg3tmain, get_bytes_input, get_encoded_output, ansi,
-                        noansi, regex)
+                        noansi, regex, pool_imap, StringDevice,
+                        get_code_version, msgid_cache, PoError)
 from pyg3t.charsets import set_header_charset
+from pyg3t.plurals import get_plural_forms, find_plural_problems
+from pyg3t.ahocorasick import Automaton
 from pyg3t import __version__
 import xml.sax
 
@@ -29,6 +38,10 @@ class Trouble:
     def tostring(self):
         return self.errmsg
 
+    def todata(self):
+        """Return list of the attributes, for storing in a cache."""
+        return [self.errmsg, self.string, self.start, self.end]
+
 
 def is_translatorcredits(msgid):
     return msgid in ['translator-credits', 'translator_credits']
@@ -42,6 +55,349 @@ class PartiallyTranslatedPluralTest:
         return msgid, msgstr, warn
 
 
+class PluralFormsTest:
+    """Check plural messages against the Plural-Forms of the header."""
+    def __init__(self):
+        self.plural_forms = None
+        self.catalog_state = None
+        self.msg = None
+
+    def begin_catalog(self, header, msgs):
+        self.plural_forms = None
+        value = header.meta.get('headers', {}).get('Plural-Forms')
+        self.catalog_state = value
+        if value is None:
+            return []
+        try:
+            # The expression is checked once for all catalogs with
+            # the same header
+            problems = msgid_cache.get('plural-forms', value,
+                                       find_plural_problems)
+            self.plural_forms = get_plural_forms(value)
+        except PoError as err:
+            return [Trouble(err.args[0])]
+        return [Trouble('Plural-Forms: %s' % problem)
+                for problem in problems]
+
+    def check(self, msg, msgid, msgstr):
+        # We are called for each msgstr, but check the whole message once
+        if self.plural_forms is None or msg is self.msg:
+            return msgid, msgstr, []
+        self.msg = msg
+        errmsg = self.plural_forms.check_msg(msg)
+        if errmsg is None:
+            return msgid, msgstr, []
+        return msgid, msgstr, [Trouble(errmsg)]
+
+
+def get_language(header):
+    return header.meta.get('headers', {}).get('Language') or 'unknown'
+
+
+def get_length_ratios(msgs, min_length):
+    """Return list of log length ratios of translated msgs.
+
+    Only messages whose msgid has at least min_length characters are
+    used, since the length of short strings varies too much."""
+    return [math.log((len(msgstr) + 1.0) / (len(msgid) + 1.0))
+            for msg in msgs if msg.istranslated
+            for msgid, msgstr in zip([msg.msgid] + [msg.msgid_plural]
+                                     * (len(msg.msgstrs) - 1), msg.msgstrs)
+            if len(msgid) >= min_length]
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return 0.5 * (values[middle - 1] + values[middle])
+
+
+def get_length_baseline(ratios):
+    """Return dict of median and median absolute deviation of ratios."""
+    if not ratios:
+        return dict(median=0.0, mad=0.0, count=0)
+    center = median(ratios)
+    mad = median([abs(ratio - center) for ratio in ratios])
+    return dict(median=center, mad=mad, count=len(ratios))
+
+
+class LengthRatioTest:
+    """Find translations much shorter or longer than usual.
+
+    The logarithm of the length ratio of msgstr and msgid is compared
+    to the median and median absolute deviation (MAD) of the ratios of
+    the language.  These baselines are given per language, e.g. loaded
+    from a file, or else computed from the catalog being checked."""
+    min_length = 20  # Shorter msgids are not checked
+    min_mad = 0.05  # Avoid flagging everything in very uniform catalogs
+    threshold = 5.0  # Number of (scaled) MADs for a length to be suspicious
+    min_count = 20  # Baselines from fewer ratios are not used
+
+    def __init__(self, baselines=None):
+        if baselines is None:
+            baselines = {}
+        self.baselines = baselines
+        self.baseline = None
+        self.catalog_state = None
+
+    def needs_catalog(self, header):
+        return get_language(header) not in self.baselines
+
+    def begin_catalog(self, header, msgs):
+        baseline = self.baselines.get(get_language(header))
+        if baseline is None and msgs is not None:
+            baseline = get_length_baseline(
+                get_length_ratios(msgs, self.min_length))
+        if baseline is not None and baseline['count'] < self.min_count:
+            baseline = None
+        self.baseline = baseline
+        self.catalog_state = baseline
+        return []
+
+    def check(self, msg, msgid, msgstr):
+        if self.baseline is None or len(msgid) < self.min_length:
+            return msgid, msgstr, []
+        ratio = math.log((len(msgstr) + 1.0) / (len(msgid) + 1.0))
+        # 1.4826 * MAD estimates the standard deviation
+        scale = 1.4826 * max(self.baseline['mad'], self.min_mad)
+        deviation = (ratio - self.baseline['median']) / scale
+        if abs(deviation) <= self.threshold:
+            return msgid, msgstr, []
+        if deviation < 0:
+            what = 'short'
+        else:
+            what = 'long'
+        return msgid, msgstr, [Trouble('Translation is unusually %s: %d vs '
+                                       '%d characters'
+                                       % (what, len(msgid), len(msgstr)))]
+
+
+def scan_length_ratios(args):
+    """Return (language, ratios) of the catalog fname for new languages.
+
+    args is the tuple (fname, known_languages).  The ratios are None
+    if the language is known already, and the catalog is not read
+    beyond the header."""
+    fname, known_languages = args
+    cat = iparse(get_bytes_input(fname), obsolete=False, trailing=False)
+    language = get_language(next(cat))
+    if language in known_languages:
+        return language, None
+    return language, get_length_ratios(cat, LengthRatioTest.min_length)
+
+
+def update_length_baselines(fname, args, jobs):
+    """Return baselines from file fname, adding languages of catalogs args.
+
+    The ratios of all catalogs of a new language are used together,
+    and the baselines are saved to fname."""
+    baselines = {}
+    if os.path.exists(fname):
+        with open(fname) as fd:
+            baselines = json.load(fd)
+    known = set(baselines)
+    ratios = {}
+    for language, fileratios in pool_imap(scan_length_ratios,
+                                          [(arg, known) for arg in args],
+                                          jobs=jobs):
+        if fileratios is not None:
+            ratios.setdefault(language, []).extend(fileratios)
+    if not ratios:
+        return baselines
+    for language, languageratios in ratios.items():
+        baselines[language] = get_length_baseline(languageratios)
+    tmpname = '%s.tmp' % fname
+    with open(tmpname, 'w') as fd:
+        json.dump(baselines, fd, indent=1, sort_keys=True)
+    os.rename(tmpname, fname)
+    return baselines
+
+
+# Accelerator markers as in "_File" or "&Edit"
+accelerator_pattern = regex(r'[_&](?=\w)')
+
+
+def normalize_string(string):
+    """Return string without accelerator markers and in lower case."""
+    return accelerator_pattern.sub('', string).lower()
+
+
+class ConsistencyTest:
+    """Find messages translated differently elsewhere in the catalog.
+
+    Messages are grouped by msgctxt and msgid, ignoring accelerators
+    and case, and by msgstr.  A message gets warnings if its group of
+    msgids has several different translations, or if its msgstr
+    translates several different msgids.
+
+    The warnings depend on other messages, so the results of a message
+    are only cached with the text and line numbers of the messages
+    given in its warnings, see :py:meth:`.get_msg_state`."""
+    def __init__(self):
+        self.by_msgid = {}
+        self.by_msgstr = {}
+        self.msg = None
+
+    def needs_catalog(self, header):
+        return True
+
+    def get_keys(self, msg):
+        msgid_key = (msg.msgctxt, normalize_string(msg.msgid),
+                     normalize_string(msg.msgid_plural or ''))
+        msgstr_key = tuple(normalize_string(msgstr) for msgstr in msg.msgstrs)
+        return msgid_key, msgstr_key
+
+    def begin_catalog(self, header, msgs):
+        # Map each key to a dict of the keys of the other kind, each
+        # with the first message having them
+        by_msgid = {}
+        by_msgstr = {}
+        for msg in msgs:
+            if not msg.istranslated or is_translatorcredits(msg.msgid):
+                continue
+            msgid_key, msgstr_key = self.get_keys(msg)
+            by_msgid.setdefault(msgid_key, {}).setdefault(msgstr_key, msg)
+            # The same msgid in other contexts is fine
+            by_msgstr.setdefault(msgstr_key, {}).setdefault(msgid_key[1:],
+                                                            msg)
+        # Only groups with differences matter
+        self.by_msgid = dict((key, group) for key, group in by_msgid.items()
+                             if len(group) > 1)
+        self.by_msgstr = dict((key, group) for key, group in by_msgstr.items()
+                              if len(group) > 1)
+        return []
+
+    def get_others(self, msg):
+        """Return list of (kind, lineno, text) of the messages msg differs
+        from, where text is their msgstr or msgid."""
+        if not (self.by_msgid or self.by_msgstr):
+            return []
+        msgid_key, msgstr_key = self.get_keys(msg)
+        others = []
+        group = self.by_msgid.get(msgid_key, {})
+        for key, other in sorted(group.items(),
+                                 key=lambda item: item[1].meta['lineno']):
+            if key != msgstr_key:
+                others.append(('msgstr', other.meta['lineno'], other.msgstr))
+        group = self.by_msgstr.get(msgstr_key, {})
+        for key, other in sorted(group.items(),
+                                 key=lambda item: item[1].meta['lineno']):
+            if key != msgid_key[1:]:
+                others.append(('msgid', other.meta['lineno'], other.msgid))
+        return others
+
+    def get_msg_state(self, msg):
+        return self.get_others(msg)
+
+    def check(self, msg, msgid, msgstr):
+        # We are called for each msgstr, but check the whole message once
+        if msg is self.msg:
+            return msgid, msgstr, []
+        self.msg = msg
+        warn = []
+        for kind, lineno, text in self.get_others(msg):
+            if kind == 'msgstr':
+                warn.append(Trouble('Translated differently in line %d: %s'
+                                    % (lineno, text)))
+            else:
+                warn.append(Trouble('Same translation as for line %d: %s'
+                                    % (lineno, text)))
+        return msgid, msgstr, warn
+
+
+def load_glossary(fname):
+    """Return list of (term, translations) pairs from glossary file fname.
+
+    The glossary is either a catalog, where each translated msgid is
+    a term and the msgstr its translation, or a text file in UTF-8
+    with the term and its allowed translations separated by tabs on
+    each line.  Empty lines and lines starting with # are ignored."""
+    glossary = []
+    if fname.endswith(('.po', '.pot')):
+        for msg in iparse(get_bytes_input(fname), obsolete=False):
+            if msg.msgid and msg.istranslated:
+                glossary.append((msg.msgid, [msg.msgstr]))
+        return glossary
+
+    with io.open(fname, encoding='utf-8') as fd:
+        for line in fd:
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            tokens = [token.strip() for token in line.split('\t')]
+            tokens = [token for token in tokens if token]
+            if len(tokens) < 2:
+                raise PoError('bad-glossary', 'Glossary %s: expected term '
+                              'and translations separated by tabs: %s'
+                              % (fname, line))
+            glossary.append((tokens[0], tokens[1:]))
+    return glossary
+
+
+class GlossaryTest:
+    """Check that glossary terms in msgids are translated as prescribed.
+
+    All terms are found in one pass over the msgid by an Aho-Corasick
+    automaton, and all translations in one pass over the msgstr by
+    another.  Accelerators and case are ignored, and terms are only
+    found as whole words, while translations may be inflected."""
+    def __init__(self, glossary=None):
+        if glossary is None:
+            glossary = []
+        translations = {}
+        for term, termtranslations in glossary:
+            term = normalize_string(term)
+            translations.setdefault(term, []).extend(termtranslations)
+        self.terms = sorted(translations)
+        self.translations = [translations[term] for term in self.terms]
+        alltranslations = sorted(set(normalize_string(translation)
+                                     for term in self.terms
+                                     for translation in translations[term]))
+        translation_indices = dict((translation, i) for i, translation
+                                   in enumerate(alltranslations))
+        self.allowed = [set(translation_indices[normalize_string(t)]
+                            for t in termtranslations)
+                        for termtranslations in self.translations]
+        self.term_automaton = Automaton(self.terms)
+        self.translation_automaton = Automaton(alltranslations)
+        # Results depend on the glossary
+        data = json.dumps([self.terms, self.translations])
+        self.catalog_state = hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def find_terms(self, msgid):
+        """Return sorted list of indices of terms in msgid."""
+        text = normalize_string(msgid)
+        found = set()
+        for start, end, index in self.term_automaton.finditer(text):
+            if start > 0 and text[start - 1].isalnum():
+                continue
+            if end < len(text) and text[end].isalnum():
+                continue
+            found.add(index)
+        return sorted(found)
+
+    def check(self, msg, msgid, msgstr):
+        if not self.terms:
+            return msgid, msgstr, []
+        terms = msgid_cache.get('glossary-%s' % self.catalog_state, msgid,
+                                self.find_terms)
+        if not terms:
+            return msgid, msgstr, []
+        present = self.translation_automaton.findall(
+            normalize_string(msgstr))
+        warn = []
+        for index in terms:
+            if not self.allowed[index] & present:
+                warn.append(Trouble('Glossary: "%s" should be translated '
+                                    'as "%s"'
+                                    % (self.terms[index],
+                                       '" or "'.join(self.translations[index])
+                                       )))
+        return msgid, msgstr, warn
+
+
 class XMLTest:
     def __init__(self):
         self.checker = GTXMLChecker()
@@ -123,7 +479,8 @@ class TrailingCharTest:
         return match.group('ending'), match.group('word'), match.group('space')
 
     def check(self, msg, msgid, msgstr):
-        msgid_end, msgid_word, msgid_space = self.extract_ending(msgid)
+        msgid_end, msgid_word, msgid_space = msgid_cache.get(
+            'ending', msgid, self.extract_ending)
         msgstr_end, msgstr_word, msgstr_space = self.extract_ending(msgstr)
         if msgid_end is None or msgstr_end is None:
             return msgid, msgstr, []  # Not our job
@@ -170,7 +527,177 @@ class TrailingCharTest:
         return msgid, msgstr, warn
 
 
+# Placeholders of the format strings checked by FormatTest.  '%%' and
+# '{{' or '}}' are matched too, such that they are skipped.
+c_format_pattern = regex(
+    r'%(?:(?P<pos>[0-9]+)\$)?[-+ #0\']*'
+    r'(?P<width>\*(?:[0-9]+\$)?|[0-9]+)?'
+    r'(?:\.(?P<precision>\*(?:[0-9]+\$)?|[0-9]*))?'
+    r'(?P<length>hh|h|ll|l|L|q|j|z|Z|t)?'
+    r'(?P<conv>[diouxXeEfFgGaAcsCSpn%])')
+python_format_pattern = regex(
+    r'%(?:\((?P<name>[^)]*)\))?[-+ #0]*'
+    r'(?P<width>\*|[0-9]+)?(?:\.(?P<precision>\*|[0-9]*))?[hlL]?'
+    r'(?P<conv>[diouxXeEfFgGcrsa%])')
+python_brace_format_pattern = regex(
+    r'\{\{|\}\}|\{(?P<name>[^{}!:]*)(?:![rsa])?(?::[^{}]*)?\}')
+# Separates the argument of a replacement field from attributes/items
+field_name_separator = regex(r'[.\[]')
+
+c_types = dict([(conv, 'int') for conv in 'diouxX']
+               + [(conv, 'float') for conv in 'eEfFgGaA']
+               + [('c', 'char'), ('s', 'string'), ('C', 'wide char'),
+                  ('S', 'wide string'), ('p', 'pointer'), ('n', 'count')])
+python_types = dict([(conv, 'int') for conv in 'diouxXc']
+                    + [(conv, 'float') for conv in 'eEfFgG']
+                    + [(conv, 'string') for conv in 'rsa'])
+
+
+def parse_c_format(string):
+    """Return list of [argument, type, placeholder, start, end].
+
+    Arguments are numbered from 1.  Returns None if the string mixes
+    numbered and unnumbered placeholders."""
+    placeholders = []
+    numbered = set()
+    argno = 0
+    for match in c_format_pattern.finditer(string):
+        conv = match.group('conv')
+        if conv == '%':
+            continue
+        for star in match.group('width', 'precision'):
+            if star is not None and star.startswith('*'):
+                numbered.add(len(star) > 1)
+                argno = int(star[1:-1]) if len(star) > 1 else argno + 1
+                placeholders.append([argno, 'int', match.group(),
+                                     match.start(), match.end()])
+        pos = match.group('pos')
+        numbered.add(pos is not None)
+        argno = int(pos) if pos is not None else argno + 1
+        argtype = c_types[conv]
+        if match.group('length'):
+            argtype = '%s %s' % (match.group('length'), argtype)
+        placeholders.append([argno, argtype, match.group(),
+                             match.start(), match.end()])
+    if len(numbered) > 1:
+        return None
+    return placeholders
+
+
+def parse_python_format(string):
+    """Return list of [argument, type, placeholder, start, end].
+
+    Arguments are names or positions counted from 1.  Returns None if
+    the string mixes named and unnamed placeholders."""
+    placeholders = []
+    named = set()
+    argno = 0
+    for match in python_format_pattern.finditer(string):
+        conv = match.group('conv')
+        if conv == '%':
+            continue
+        for star in match.group('width', 'precision'):
+            if star == '*':
+                argno += 1
+                named.add(False)
+                placeholders.append([argno, 'int', match.group(),
+                                     match.start(), match.end()])
+        name = match.group('name')
+        named.add(name is not None)
+        if name is None:
+            argno += 1
+            name = argno
+        placeholders.append([name, python_types[conv], match.group(),
+                             match.start(), match.end()])
+    if len(named) > 1:
+        return None
+    return placeholders
+
+
+def parse_python_brace_format(string):
+    """Return list of [argument, None, placeholder, start, end].
+
+    Arguments are the field names, where automatically numbered fields
+    are counted from 0.  Returns None if the string mixes automatic and
+    manual numbering.  The types of the arguments are not known."""
+    placeholders = []
+    automatic = set()
+    argno = 0
+    for match in python_brace_format_pattern.finditer(string):
+        name = match.group('name')
+        if name is None:
+            continue  # '{{' or '}}'
+        # Only the argument matters, not attributes or items
+        name = field_name_separator.split(name, 1)[0]
+        automatic.add(name == '')
+        if name == '':
+            name = str(argno)
+            argno += 1
+        placeholders.append([name, None, match.group(),
+                             match.start(), match.end()])
+    if len(automatic) > 1:
+        return None
+    return placeholders
+
+
+class FormatTest:
+    """Compare placeholders of format strings in msgid and msgstr.
+
+    The format is given by the flags of the message.  In plural
+    messages, translations may leave out placeholders, e.g. because
+    the number is written as a word in the singular form."""
+    parsers = [('c-format', parse_c_format),
+               ('python-format', parse_python_format),
+               ('python-brace-format', parse_python_brace_format)]
+
+    def check(self, msg, msgid, msgstr):
+        warn = []
+        for flag, parse in self.parsers:
+            if flag in msg.flags:
+                warn.extend(self.compare(flag, parse, msg, msgid, msgstr))
+        return msgid, msgstr, warn
+
+    def compare(self, flag, parse, msg, msgid, msgstr):
+        # The msgid is the same in all translations of a template
+        msgid_placeholders = msgid_cache.get(flag, msgid, parse)
+        msgstr_placeholders = parse(msgstr)
+        if msgid_placeholders is None:
+            return []
+        if msgstr_placeholders is None:
+            return [Trouble('Translation mixes numbered and unnumbered '
+                            'placeholders (%s)' % flag)]
+
+        msgid_args = {}
+        for arg, argtype, placeholder, _, _ in msgid_placeholders:
+            msgid_args.setdefault(arg, (argtype, placeholder))
+
+        warn = []
+        found = set()
+        for arg, argtype, placeholder, start, end in msgstr_placeholders:
+            if arg in found:
+                continue
+            found.add(arg)
+            if arg not in msgid_args:
+                warn.append(Trouble('Placeholder %s not in msgid (%s)'
+                                    % (placeholder, flag), msgstr, start, end))
+            elif argtype != msgid_args[arg][0]:
+                warn.append(Trouble('Placeholder %s does not match %s '
+                                    'in msgid (%s)'
+                                    % (placeholder, msgid_args[arg][1], flag),
+                                    msgstr, start, end))
+        if not msg.isplural:
+            for arg, _, placeholder, _, _ in msgid_placeholders:
+                if arg not in found:
+                    found.add(arg)
+                    warn.append(Trouble('Placeholder %s missing in '
+                                        'translation (%s)'
+                                        % (placeholder, flag)))
+        return warn
+
+
 class AcceleratorTest:
+    rewrites = True
+
     def __init__(self, accel_key):
         self.accel_key = accel_key
 
@@ -190,6 +717,8 @@ class AcceleratorTest:
 
 
 class QuoteSubstitutionFilter:
+    rewrites = True
+
     def __init__(self, quotechar):
         self.quotechar = quotechar
 
@@ -197,13 +726,179 @@ class QuoteSubstitutionFilter:
         return msgid.replace("'", self.quotechar), msgstr, None
 
 
+class CheckCache:
+    """Results of checks stored between runs in the JSON file fname.
+
+    Each entry maps a digest of the contents of a message to the
+    contents of the message after checking (checks may rewrite the
+    strings) and the warnings.  The file also stores the code version
+    (see :py:func:`pyg3t.util.get_code_version`), and all entries are discarded
+    if it differs from the current one.
+
+    Entries added since the cache was loaded are kept separately in
+    new_entries, such that caches of several processes can be merged.
+    Only the entries read or written since the cache was loaded, whose
+    keys are kept in used_keys, are saved, such that entries of
+    messages which no longer exist do not pile up."""
+    def __init__(self, fname, version):
+        self.fname = fname
+        self.version = version
+        self.entries = {}
+        self.new_entries = {}
+        self.used_keys = set()
+        if os.path.exists(fname):
+            with open(fname) as fd:
+                data = json.load(fd)
+            if data.get('version') == version:
+                self.entries = data['entries']
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.used_keys.add(key)
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.new_entries[key] = entry
+        self.used_keys.add(key)
+
+    def pop_new_entries(self):
+        """Return and forget the new entries and the keys used.
+
+        Returns the tuple (new_entries, used_keys), which can be given
+        to :py:meth:`.update` of another cache."""
+        entries, used_keys = self.new_entries, self.used_keys
+        self.new_entries = {}
+        self.used_keys = set()
+        return entries, used_keys
+
+    def update(self, entries, used_keys=()):
+        self.entries.update(entries)
+        self.used_keys.update(entries)
+        self.used_keys.update(used_keys)
+
+    def save(self):
+        entries = dict((key, self.entries[key]) for key in self.used_keys
+                       if key in self.entries)
+        tmpname = '%s.tmp' % self.fname
+        with open(tmpname, 'w') as fd:
+            json.dump(dict(version=self.version, entries=entries), fd)
+        os.rename(tmpname, self.fname)
+
+
+# Best available clock for measuring the time spent by tests
+timer = getattr(time, 'perf_counter', time.time)
+
+
 class POABC:
-    def __init__(self, tests):
+    # How often the tests are reordered with order_by_cost
+    reorder_interval = 256
+
+    def __init__(self, tests, cache=None, order_by_cost=False,
+                 timings=False):
         self.msgcount = 0
         self.translatedcount = 0
         self.untranslatedcount = 0
         self.fuzzycount = 0
+        self.cachehits = 0
+        self.cachemisses = 0
         self.tests = tuple(tests)
+        self.testnames = [test.__class__.__name__ for test in self.tests]
+        self.cache = cache
+        self.catalog_key = None
+        self.order_by_cost = order_by_cost
+        # The tests are only timed if the timings are needed
+        self.measure = timings or order_by_cost
+        self.order = list(range(len(self.tests)))
+        self.pairs_checked = 0
+        # [calls, hits, seconds] for each test name
+        self.timings = dict((name, [0, 0, 0.0]) for name in self.testnames)
+
+    def get_stats(self):
+        """Return dict of the message counts and test timings."""
+        return dict(msgcount=self.msgcount,
+                    translatedcount=self.translatedcount,
+                    untranslatedcount=self.untranslatedcount,
+                    fuzzycount=self.fuzzycount,
+                    cachehits=self.cachehits,
+                    cachemisses=self.cachemisses,
+                    timings=self.get_timings())
+
+    def add_stats(self, stats):
+        """Add statistics from :py:meth:`.get_stats` of another POABC.
+
+        This is used to sum up statistics of checks done in parallel."""
+        for key, value in stats.items():
+            if key == 'timings':
+                self.add_timings(value)
+            else:
+                setattr(self, key, getattr(self, key) + value)
+
+    def get_timings(self):
+        """Return dict mapping test names to their timings.
+
+        The timings of each test are a dict with the number of calls,
+        the number of calls which gave warnings (hits), and the total
+        time in seconds."""
+        return dict((name, dict(calls=calls, hits=hits, time=seconds))
+                    for name, (calls, hits, seconds)
+                    in self.timings.items())
+
+    def add_timings(self, timings):
+        for name, timing in timings.items():
+            total = self.timings.setdefault(name, [0, 0, 0.0])
+            total[0] += timing['calls']
+            total[1] += timing['hits']
+            total[2] += timing['time']
+
+    def get_cost(self, index):
+        calls, _, seconds = self.timings[self.testnames[index]]
+        if calls == 0:
+            return 0.0
+        return seconds / calls
+
+    def update_order(self):
+        """Order tests by their average time so far, cheapest first.
+
+        Tests which rewrite msgid or msgstr stay in place, and the
+        other tests are only moved between them, such that all tests
+        see the same strings as before."""
+        order = []
+        segment = []
+        for index, test in enumerate(self.tests):
+            if getattr(test, 'rewrites', False):
+                order.extend(sorted(segment, key=self.get_cost))
+                order.append(index)
+                segment = []
+            else:
+                segment.append(index)
+        order.extend(sorted(segment, key=self.get_cost))
+        self.order = order
+
+    def needs_catalog(self, header):
+        """Whether any test needs all messages of the catalog up front.
+
+        Tests with a needs_catalog() method are asked with the header."""
+        return any(test.needs_catalog(header) for test in self.tests
+                   if hasattr(test, 'needs_catalog'))
+
+    def begin_catalog(self, header, msgs=None):
+        """Pass the header of a catalog to the tests before its messages.
+
+        Tests with a begin_catalog() method are given the header and
+        the list of messages, if :py:meth:`.needs_catalog` said so, and
+        return a list of Troubles with the header, which are returned.
+        Such tests keep whatever affects their results for the catalog
+        in their catalog_state attribute, or whatever affects those of
+        a message in the result of their get_msg_state(msg) method."""
+        warnings = []
+        for test in self.tests:
+            if hasattr(test, 'begin_catalog'):
+                warnings.extend(test.begin_catalog(header, msgs))
+        self.catalog_key = [getattr(test, 'catalog_state', None)
+                            for test in self.tests]
+        return warnings
 
     def add_to_stats(self, msg):
         if not msg.msgid:
@@ -219,9 +914,33 @@ class POABC:
     def check_stringpair(self, msg, msgid, msgstr):
         assert msg.msgid is not None
 
+        if not self.measure:
+            warnings = []
+            for test in self.tests:
+                msgid, msgstr, warn = test.check(msg, msgid, msgstr)
+                warnings.extend(warn)
+            return msgid, msgstr, warnings
+
+        if self.order_by_cost:
+            if self.pairs_checked % self.reorder_interval == 0:
+                self.update_order()
+            self.pairs_checked += 1
+
+        results = [None] * len(self.tests)
+        for index in self.order:
+            timing = self.timings[self.testnames[index]]
+            start = timer()
+            msgid, msgstr, warn = self.tests[index].check(msg, msgid, msgstr)
+            timing[2] += timer() - start
+            timing[0] += 1
+            if warn:
+                timing[1] += 1
+            results[index] = warn
+
+        # Warnings are given in the order of the tests, whatever the
+        # order they ran in
         warnings = []
-        for test in self.tests:
-            msgid, msgstr, warn = test.check(msg, msgid, msgstr)
+        for warn in results:
             warnings.extend(warn)
         return msgid, msgstr, warnings
 
@@ -248,6 +967,36 @@ class POABC:
             msg.msgid_plural = msgid_plural
         return warnings
 
+    def get_cache_key(self, msg):
+        msg_state = [test.get_msg_state(msg) for test in self.tests
+                     if hasattr(test, 'get_msg_state')]
+        contents = [self.testnames, self.catalog_key, msg_state, msg.msgctxt,
+                    msg.msgid, msg.msgid_plural, msg.msgstrs,
+                    sorted(msg.flags)]
+        data = json.dumps(contents, separators=(',', ':'))
+        return hashlib.sha1(data.encode('ascii')).hexdigest()
+
+    def check_msg_cached(self, msg):
+        """Check msg like :py:meth:`.check_msg`, using the cache.
+
+        Messages with the same contents as a message checked before
+        are not checked again.  Instead the results are taken from the
+        cache."""
+        key = self.get_cache_key(msg)
+        entry = self.cache.get(key)
+        if entry is None:
+            self.cachemisses += 1
+            warnings = self.check_msg(msg)
+            entry = [msg.msgid, msg.msgid_plural, list(msg.msgstrs),
+                     [warning.todata() for warning in warnings]]
+            self.cache.put(key, entry)
+            return warnings
+
+        self.cachehits += 1
+        msg.msgid, msg.msgid_plural, msgstrs, warnings = entry
+        msg.msgstrs = list(msgstrs)
+        return [Trouble(*data) for data in warnings]
+
     def check_msgs(self, msgs):
         for msg in msgs:
             self.add_to_stats(msg)
@@ -255,7 +1004,10 @@ class POABC:
                 continue
             if is_translatorcredits(msg.msgid):
                 continue
-            warnings = self.check_msg(msg)
+            if self.cache is None:
+                warnings = self.check_msg(msg)
+            else:
+                warnings = self.check_msg_cached(msg)
             if warnings:
                 yield msg, warnings
 
@@ -285,6 +1037,39 @@ def build_parser():
                       help='do not print full message')
     parser.add_option('--annotate', action='store_true',
                       help='write annotations for back-merging')
+    parser.add_option('--cache', metavar='FILE',
+                      help='store results of checks in FILE, and do not '
+                      'check messages again whose results are stored '
+                      'already.  Results not used by a run are removed '
+                      'from FILE')
+    parser.add_option('--msgid-cache', metavar='FILE',
+                      help='store the analysis of msgids in FILE.  This '
+                      'speeds up checking other translations of the same '
+                      'template')
+    parser.add_option('--length-baseline', metavar='FILE',
+                      help='use the lengths of translations per language '
+                      'stored in FILE for the length check.  Languages not '
+                      'in FILE are added from all the FILEs of that '
+                      'language.  Without this option, each catalog is its '
+                      'own baseline')
+    parser.add_option('--glossary', metavar='FILE',
+                      help='check that terms in FILE are translated as '
+                      'given there.  FILE is a catalog, or a text file '
+                      'with a term and its allowed translations on each '
+                      'line, separated by tabs.  This check is done in '
+                      'addition to the checks below')
+    parser.add_option('--timings', action='store_true',
+                      help='write the number of calls, warnings and time '
+                      'spent for each check')
+    parser.add_option('--order-by-cost', action='store_true',
+                      help='run the cheapest checks first, measuring their '
+                      'cost as the checking goes along.  All checks still '
+                      'run on every message, so this changes neither the '
+                      'warnings nor the total time much; it is meant for '
+                      'comparing checks with --timings')
+    parser.add_option('-j', '--jobs', type='int', default=1, metavar='N',
+                      help='check up to N files in parallel.  Results are '
+                      'still written in the order of the FILEs')
 
     checkopts = OptionGroup(parser, 'Checks')
     for key in sorted(poabc_checks.keys()):
@@ -295,11 +1080,24 @@ def build_parser():
 
 
 poabc_checks = {'xml': 'check xml',
+                'format': ('check placeholders of c-format, python-format '
+                           'and python-brace-format messages'),
                 'trailing': 'check trailing characters',
                 'plurals': ('find untranslated plurals of otherwise '
                             'translated messages'),
+                'pluralforms': ('check the Plural-Forms header and the '
+                                'number of plural forms of each message'),
+                'length': ('find translations much shorter or longer than '
+                           'usual for the language.  Not enabled by default'),
+                'consistency': ('find msgids translated in different ways, '
+                                'and msgstrs used for different msgids.  Not '
+                                'enabled by default'),
                 'repeat': 'find repeated words'}
 
+# Heuristic checks which need whole catalogs, so that catalogs cannot
+# be checked while they are parsed.  They are only run when asked for
+optional_checks = ['length', 'consistency']
+
 
 def format_context(trouble, use_color):
     txt = trouble.string
@@ -395,16 +1193,43 @@ def generate_po_header():
                   meta={'headers': headers})
     return msg
 
-@pyg3tmain(build_parser)
-def main(cmdparser):
-    opts, args = cmdparser.parse_args()
-    nargs = len(args)
-    if nargs == 0:
-        cmdparser.print_help()
-        cmdparser.exit()
+def get_tests(names, length_baselines=None, glossary=None):
+    """Return list of test objects from list of test names.
+
+    length_baselines are the baselines of the length test, if any, and
+    glossary is the name of the glossary file of the glossary test."""
+    testclasses = dict(plurals=PartiallyTranslatedPluralTest,
+                       xml=XMLTest,
+                       trailing=TrailingCharTest,
+                       repeat=WordRepeatTest,
+                       format=FormatTest,
+                       pluralforms=PluralFormsTest,
+                       consistency=ConsistencyTest)
 
+    tests = []
+    for name in names:
+        if name == 'length':
+            tests.append(LengthRatioTest(length_baselines))
+        elif name == 'glossary':
+            tests.append(GlossaryTest(load_glossary(glossary)))
+        else:
+            tests.append(testclasses[name]())
+
+    #if opts.filter_quote_characters:
+    #    quotechar = opts.quote_character
+    #    tests.append(QuoteSubstitutionFilter(quotechar))
+    #if opts.accel_char:
+    #    tests.append(AcceleratorTest(opts.accel_char))
+    #tests.append(LeadingCharTest())
+    return tests
+
+
+def check_file(arg, poabc, opts, multiple_files, out):
+    """Check the catalog arg, writing the output to out.
+
+    Returns the number of messages with at least one warning."""
     headerfmt = 'Line %(lineno)d'
-    if nargs > 1:
+    if multiple_files:
         headerfmt = '%(fname)s line %(lineno)d'
 
     def get_header(pad=True, **kwargs):
@@ -419,6 +1244,146 @@ def main(cmdparser):
             string = ansi.cyan(string)
         return string
 
+    fd = get_bytes_input(arg)
+    fname = fd.name
+
+    fileheader_unfinished = False
+
+    if multiple_files:
+        fileheader = fname
+        if opts.color:
+            fileheader = ansi.light_blue(fileheader)
+        if opts.annotate:
+            fileheader = annotate(fileheader)
+        print(fileheader, end='', file=out)
+        fileheader_unfinished = True
+
+    cat = iparse(fd, obsolete=False, trailing=False)
+
+    thisfilewarnings = 0
+
+    header_msg = next(cat)  # header will not be checked like messages
+    msgs = None
+    if poabc.needs_catalog(header_msg):
+        cat = msgs = list(cat)
+    header_warnings = poabc.begin_catalog(header_msg, msgs)
+    results = poabc.check_msgs(cat)
+    if header_warnings:
+        results = chain([(header_msg, header_warnings)], results)
+
+    #if opts.annotate:
+    #    set_header_charset(header_msg, 'utf-8')
+
+    for msg, warnings in results:
+        if fileheader_unfinished:
+            warn = ' [Warning]'
+            if opts.color:
+                warn = ansi.light_red(warn)
+            print(warn, file=out, end='\n\n')
+            fileheader_unfinished = False
+
+            #if opts.annotate:
+            #    header = get_header(lineno=header_msg.meta['lineno'],
+            #                        fname=fname, pad=False)
+            #    print(header, file=out)
+            #    print(header_msg.tostring(), file=out)
+
+        header = get_header(lineno=msg.meta['lineno'], fname=fname,
+                            pad=not bool(opts.quiet))
+        print(header, file=out)
+        thisfilewarnings += 1
+        annotation_prefix = ''
+        if opts.annotate:
+            annotation_prefix = annotate('')
+
+        for warning in warnings:
+            wstring = warning.tostring()
+            if opts.annotate:
+                wstring = annotate(wstring)
+            if opts.color:
+                wstring = ansi.red(wstring)
+            print(wstring, file=out)
+            if warning.string:
+                context = format_context(warning, use_color=opts.color)
+                if opts.annotate:
+                    tokens = context.split('\n')
+                    context = (annotation_prefix
+                               + ('\n' + annotation_prefix).join(tokens))
+                print(context, file=out)
+        if opts.quiet:
+            print(file=out)
+        else:
+            if opts.annotate:
+                msg.flags.add('fuzzy')
+                print(msg.tostring(), file=out)
+            else:
+                print(''.join(msg.meta['rawlines']), file=out)
+
+    if thisfilewarnings == 0 and fileheader_unfinished:
+        ok = ' [OK]'
+        if opts.color:
+            ok = ansi.light_green(ok)
+        print(ok, file=out)
+
+    return thisfilewarnings
+
+
+# State of worker processes, see init_worker()
+_worker = {}
+
+
+def init_worker(testnames, opts, multiple_files, code_version,
+                length_baselines, out=None):
+    if opts.msgid_cache:
+        msgid_cache.load(opts.msgid_cache, code_version)
+    _worker['tests'] = get_tests(testnames, length_baselines, opts.glossary)
+    _worker['opts'] = opts
+    _worker['multiple_files'] = multiple_files
+    # Without an output, as in other processes, the output is returned
+    _worker['out'] = out
+    _worker['cache'] = None
+    if opts.cache:
+        _worker['cache'] = CheckCache(opts.cache, code_version)
+
+
+def check_file_in_worker(arg):
+    """Check file with the settings given to init_worker().
+
+    Returns (output, msgwarncount, stats, cache_entries, msgid_results)
+    where output is that of the file, unless written already to the
+    output given to init_worker(), stats are the message counts of the
+    file, see :py:meth:`.POABC.get_stats`, cache_entries are the results
+    added to the cache and the keys of the results used, see
+    :py:meth:`.CheckCache.pop_new_entries`, and msgid_results are the
+    new results of the msgid analysis cache."""
+    cache = _worker['cache']
+    opts = _worker['opts']
+    poabc = POABC(_worker['tests'], cache=cache,
+                  order_by_cost=opts.order_by_cost, timings=opts.timings)
+    out = _worker['out']
+    if out is None:
+        out = StringDevice()
+    msgwarncount = check_file(arg, poabc, opts, _worker['multiple_files'],
+                              out)
+    output = out.getvalue() if _worker['out'] is None else ''
+    cache_entries = ({}, ()) if cache is None else cache.pop_new_entries()
+    return (output, msgwarncount, poabc.get_stats(), cache_entries,
+            msgid_cache.pop_new_results())
+
+
+@pyg3tmain(build_parser)
+def main(cmdparser):
+    opts, args = cmdparser.parse_args()
+    nargs = len(args)
+    if nargs == 0:
+        cmdparser.print_help()
+        cmdparser.exit()
+
+    if opts.jobs < 1:
+        cmdparser.error('Number of jobs must be positive')
+    if opts.jobs > 1 and '-' in args:
+        cmdparser.error('Cannot read standard input with --jobs')
+
     # We will not respect the original coding of the file
     out = get_encoded_output('utf-8')
 
@@ -429,112 +1394,55 @@ def main(cmdparser):
         if optiondict[test]:
             tests.append(test)
 
-    if not tests:  # No tests given.  Enable all of them
-        tests = list(sorted(poabc_checks))
-
-    testclasses = dict(plurals=PartiallyTranslatedPluralTest,
-                       xml=XMLTest,
-                       trailing=TrailingCharTest,
-                       repeat=WordRepeatTest)
-
-    # Convert test names to objects
-    tests = [testclasses[name]() for name in tests]
-
-    #if opts.filter_quote_characters:
-    #    quotechar = opts.quote_character
-    #    tests.append(QuoteSubstitutionFilter(quotechar))
-    #if opts.accel_char:
-    #    tests.append(AcceleratorTest(opts.accel_char))
-    #tests.append(LeadingCharTest())
+    if not tests:  # No tests given.  Enable all but the optional ones
+        tests = [test for test in sorted(poabc_checks)
+                 if test not in optional_checks]
+    if opts.glossary:
+        tests.append('glossary')
 
-    poabc = POABC(tests)
+    # Only used for the total statistics.  Each file is checked
+    # by a POABC of its own, possibly in another process.
+    poabc = POABC([])
 
-    warningcount = 0 # total number of warnings
     msgwarncount = 0 # number of msgs with at least one warning
 
     if opts.annotate:
         custom_header = generate_po_header()
         print(custom_header.tostring(), file=out)
 
-    for arg in args:
-        fd = get_bytes_input(arg)
-        fname = fd.name
-
-        fileheader_unfinished = False
-
-        if nargs > 1:
-            fileheader = fname
-            if opts.color:
-                fileheader = ansi.light_blue(fileheader)
-            if opts.annotate:
-                fileheader = annotate(fileheader)
-            print(fileheader, end='', file=out)
-            fileheader_unfinished = True
-
-        cat = iparse(fd, obsolete=False, trailing=False)
-
-        thisfilewarnings = 0
-
-        header_msg = next(cat)  # header will not be passed to tests
-        # Do we want to do something with header_msg?
-
-        #if opts.annotate:
-        #    set_header_charset(header_msg, 'utf-8')
-
-        for msg, warnings in poabc.check_msgs(cat):
-            if fileheader_unfinished:
-                warn = ' [Warning]'
-                if opts.color:
-                    warn = ansi.light_red(warn)
-                print(warn, file=out, end='\n\n')
-                fileheader_unfinished = False
-
-                #if opts.annotate:
-                #    header = get_header(lineno=header_msg.meta['lineno'],
-                #                        fname=fname, pad=False)
-                #    print(header, file=out)
-                #    print(header_msg.tostring(), file=out)
-
-            header = get_header(lineno=msg.meta['lineno'], fname=fname,
-                                pad=not bool(opts.quiet))
-            print(header, file=out)
-            warningcount += len(warnings)
-            msgwarncount += 1
-            thisfilewarnings += 1
-            annotation_prefix = ''
-            if opts.annotate:
-                annotation_prefix = annotate('')
-
-            for warning in warnings:
-                wstring = warning.tostring()
-                if opts.annotate:
-                    wstring = annotate(wstring)
-                if opts.color:
-                    wstring = ansi.red(wstring)
-                print(wstring, file=out)
-                if warning.string:
-                    context = format_context(warning, use_color=opts.color)
-                    if opts.annotate:
-                        tokens = context.split('\n')
-                        context = (annotation_prefix
-                                   + ('\n' + annotation_prefix).join(tokens))
-                    print(context, file=out)
-            if opts.quiet:
-                print(file=out)
-            else:
-                if opts.annotate:
-                    msg.flags.add('fuzzy')
-                    print(msg.tostring(), file=out)
-                else:
-                    print(''.join(msg.meta['rawlines']), file=out)
-
-        if thisfilewarnings == 0 and fileheader_unfinished:
-            ok = ' [OK]'
-            if opts.color:
-                ok = ansi.light_green(ok)
-            print(ok, file=out)
-
-        fileheader_unfinished = False
+    length_baselines = None
+    if opts.length_baseline and 'length' in tests:
+        if '-' in args:
+            cmdparser.error('Cannot read standard input with '
+                            '--length-baseline')
+        length_baselines = update_length_baselines(opts.length_baseline,
+                                                   args, opts.jobs)
+
+    code_version = get_code_version()
+    results = pool_imap(check_file_in_worker, args, jobs=opts.jobs,
+                        initializer=init_worker,
+                        initargs=(tests, opts, nargs > 1, code_version,
+                                  length_baselines,
+                                  out if opts.jobs == 1 else None))
+    cache_entries = {}
+    used_keys = set()
+    for output, filewarncount, stats, (new_entries, new_keys), \
+            msgid_results in results:
+        print(output, end='', file=out)
+        msgwarncount += filewarncount
+        poabc.add_stats(stats)
+        cache_entries.update(new_entries)
+        used_keys.update(new_keys)
+        msgid_cache.update(msgid_results)
+
+    if opts.cache:
+        cache = CheckCache(opts.cache, code_version)
+        cache.update(cache_entries, used_keys)
+        cache.save()
+    if opts.msgid_cache:
+        # With several jobs the results were loaded by the workers only
+        msgid_cache.load(opts.msgid_cache, code_version)
+        msgid_cache.save(opts.msgid_cache, code_version)
 
     def fancyfmt(n):
         return '%d [%d%%]' % (n, round(100 * float(n) / poabc.msgcount))
@@ -555,4 +1463,19 @@ def main(cmdparser):
     aprint('Untranslated messages: %s' % fancyfmt(poabc.untranslatedcount),
            file=out)
     aprint('Number of warnings: %d' % msgwarncount, file=out)
+    if opts.cache:
+        aprint('Cached results used: %d' % poabc.cachehits, file=out)
+        aprint('Messages checked: %d' % poabc.cachemisses, file=out)
     aprint('=' * headerwidth, file=out)
+
+    if opts.timings:
+        aprint(' Timings '.center(headerwidth, '='), file=out)
+        aprint('%-34s %8s %8s %10s' % ('Check', 'Calls', 'Hits', 'Time [s]'),
+               file=out)
+        timings = poabc.get_timings()
+        for name in sorted(timings, key=lambda name: -timings[name]['time']):
+            aprint('%-34s %8d %8d %10.4f' % (name, timings[name]['calls'],
+                                              timings[name]['hits'],
+                                              timings[name]['time']),
+                   file=out)
+        aprint('=' * headerwidth, file=out)
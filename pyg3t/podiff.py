@@ -20,11 +20,105 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from __future__ import print_function, unicode_literals
 from optparse import OptionParser
 from difflib import unified_diff
-from pyg3t.gtparse import parse
+from fnmatch import fnmatchcase
+import codecs
+import filecmp
+import io
+import os
+import sys
+try:
+    from itertools import zip_longest  # Py3
+except ImportError:
+    from itertools import izip_longest as zip_longest  # Py2
+from pyg3t.gtparse import parse, iparse
 from pyg3t import __version__
 from pyg3t.gtdifflib import FancyWDiffFormat
 from pyg3t.gtdifflib import diff as wdiff
-from pyg3t.util import pyg3tmain, get_encoded_output, get_bytes_input
+from pyg3t.popatch import bundle_header_template
+from pyg3t.util import pyg3tmain, get_encoded_output, get_bytes_input, \
+    get_bytes_output, get_checksum, PoError
+
+
+def translations_differ(old_msg, new_msg):
+    """Return whether two messages differ in a way relevant for review.
+
+    Two messages differ if their fuzzy status, their msgstrs or their
+    translator comments differ.  Changes to other parts of the message,
+    e.g. references, are not considered to be differences."""
+    return (old_msg.isfuzzy != new_msg.isfuzzy or
+            old_msg.msgstrs != new_msg.msgstrs or
+            old_msg.get_comments('# ') != new_msg.get_comments('# '))
+
+
+def align_messages(oldmsgs, newmsgs):
+    """Yield pairs (old_msg, new_msg) of messages with the same key.
+
+    Both iterables are consumed in lockstep, and only messages whose
+    counterpart has not been seen yet are kept in memory.  For catalogs
+    with the same base this means that hardly anything is kept at all.
+
+    Messages present in only one of the iterables are paired with None
+    after all others, in the order in which they appear: first those
+    only in newmsgs, then those only in oldmsgs."""
+    pending_old = {}
+    pending_new = {}
+
+    for old_msg, new_msg in zip_longest(oldmsgs, newmsgs):
+        if old_msg is not None:
+            if old_msg.key in pending_new:
+                yield old_msg, pending_new.pop(old_msg.key)
+            else:
+                pending_old[old_msg.key] = old_msg
+        if new_msg is not None:
+            if new_msg.key in pending_old:
+                yield pending_old.pop(new_msg.key), new_msg
+            else:
+                pending_new[new_msg.key] = new_msg
+
+    def bylineno(msgs):
+        return sorted(msgs, key=lambda msg: msg.meta['lineno'])
+
+    for new_msg in bylineno(pending_new.values()):
+        yield None, new_msg
+    for old_msg in bylineno(pending_old.values()):
+        yield old_msg, None
+
+
+def catalogs_differ(old_fname, new_fname, full_diff=False):
+    """Return whether the translations in two catalogs differ.
+
+    Messages are matched by key as in a relaxed diff.  The catalogs
+    differ if a message present in both differs as determined by
+    :func:`translations_differ`, or if a message is present only in the
+    new catalog.  If full_diff is True, obsolete messages are compared
+    as well, and messages present only in the old catalog also count as
+    differences.  The header is not compared.
+
+    Identical files are recognized without parsing them.  Otherwise,
+    the catalogs are parsed only until the first difference is found,
+    and messages whose raw text is unchanged are not compared further."""
+    if (old_fname != '-' and new_fname != '-'
+        and filecmp.cmp(old_fname, new_fname, shallow=False)):
+        return False
+
+    def messages(fname):
+        return iparse(get_bytes_input(fname), obsolete=full_diff,
+                      trailing=False)
+
+    for old_msg, new_msg in align_messages(messages(old_fname),
+                                           messages(new_fname)):
+        if new_msg is None:
+            if full_diff:
+                return True
+        elif old_msg is None:
+            return True
+        elif new_msg.msgid == '':
+            continue
+        elif old_msg.meta['rawlines'] == new_msg.meta['rawlines']:
+            continue
+        elif translations_differ(old_msg, new_msg):
+            return True
+    return False
 
 
 class PoDiff:
@@ -117,15 +211,9 @@ class PoDiff:
                    header)
         """
 
-        re_enc_old_msgstrs = old_msg.msgstrs
-        re_enc_old_comments = old_msg.get_comments('# ')
-
         # Check if the there is a reason to diff.
-        # NOTE: Last line says we always show header
-        if (old_msg.isfuzzy != new_msg.isfuzzy or
-            re_enc_old_msgstrs != new_msg.msgstrs or
-            re_enc_old_comments != new_msg.get_comments('# ') or
-            new_msg.msgid == ''):
+        # NOTE: We always show header
+        if translations_differ(old_msg, new_msg) or new_msg.msgid == '':
 
             if self.show_line_numbers:
                 print(self.__print_lineno(new_msg, fname), file=self.out)
@@ -218,14 +306,130 @@ class PoDiff:
         print(sep, file=self.out)
 
 
+dissimilar_base_errmsg = ('Cannot work with files with dissimilar base, '
+                          'unless the relax option (-r) or the full '
+                          'options (-f) is used.\n\nNOTE: This is not '
+                          'recommended..!\nMaking a podiff for '
+                          'proofreading should happen between files '
+                          'with similar base, to make the podiff easier '
+                          'to read.')
+
+
+def _match_components(names, globs):
+    # Whether the list of path components names matches the list of
+    # globs, where ** matches any number of components
+    if not globs:
+        return not names
+    if globs[0] == '**':
+        return any(_match_components(names[i:], globs[1:])
+                   for i in range(len(names) + 1))
+    return (bool(names) and fnmatchcase(names[0], globs[0])
+            and _match_components(names[1:], globs[1:]))
+
+
+def is_excluded(path, isdir, excludes):
+    """Whether path matches any of the gitignore-style globs excludes.
+
+    path is relative to the top directory and uses / as separator.
+    Globs ending with / only match directories.  Globs containing
+    another / match the whole path, and other globs its last component.
+    Like in .gitignore files, globs are matched one component at a
+    time, so * does not match /, while ** matches any number of
+    components."""
+    names = path.split('/')
+    for glob in excludes:
+        if glob.endswith('/'):
+            if not isdir:
+                continue
+            glob = glob.rstrip('/')
+        if '/' in glob:
+            if _match_components(names, glob.lstrip('/').split('/')):
+                return True
+        elif fnmatchcase(names[-1], glob):
+            return True
+    return False
+
+
+def find_catalogs(dirname, excludes=()):
+    """Return sorted paths of all catalogs below dirname.
+
+    The paths are relative to dirname and use / as separator.  Files
+    and directories matching any of the globs excludes are skipped, see
+    :py:func:`.is_excluded`."""
+    fnames = []
+    for root, dirs, files in os.walk(dirname):
+        prefix = os.path.relpath(root, dirname).replace(os.sep, '/') + '/'
+        if prefix == './':
+            prefix = ''
+        dirs[:] = [name for name in dirs
+                   if not is_excluded(prefix + name, True, excludes)]
+        for fname in files:
+            if fname.endswith(('.po', '.pot')) and \
+                    not is_excluded(prefix + fname, False, excludes):
+                fnames.append(prefix + fname)
+    return sorted(fnames)
+
+
+def write_bundle(old_dir, new_dir, outbytes, opts):
+    """Write a podiff bundle of the catalogs in two directory trees.
+
+    For each catalog found under both old_dir and new_dir, the podiff
+    is written after a header line identifying the catalog and the
+    checksum of its version in new_dir, which is the version that the
+    bundle should later be applied to.  Each podiff is written in the
+    encoding of its catalog.  Catalogs without differences and catalogs
+    present in only one of the trees are left out.
+
+    Returns the number of catalogs in the bundle."""
+    nfiles = 0
+    for fname in find_catalogs(new_dir):
+        old_path = os.path.join(old_dir, *fname.split('/'))
+        new_path = os.path.join(new_dir, *fname.split('/'))
+        if not os.path.isfile(old_path):
+            continue
+
+        with get_bytes_input(new_path) as fd:
+            new_data = fd.read()
+        with get_bytes_input(old_path) as fd:
+            cat_old = parse(fd)
+        new_fd = io.BytesIO(new_data)
+        new_fd.name = new_path
+        cat_new = parse(new_fd)
+
+        section = io.BytesIO()
+        out = codecs.getwriter(cat_new.encoding)(section)
+        podiff = PoDiff(out, opts.line_numbers)
+        if opts.relax or opts.full:
+            podiff.diff_catalogs_relaxed(cat_old, cat_new, opts.full)
+        else:
+            if not podiff.catalogs_have_common_base(cat_old, cat_new):
+                err = PoError('dissimilar-base', dissimilar_base_errmsg)
+                err.fname = new_path
+                raise err
+            podiff.diff_catalogs_strict(cat_old, cat_new)
+
+        if podiff.number_of_diff_chunks == 0:
+            continue
+        header = bundle_header_template % dict(fname=fname,
+                                               checksum=get_checksum(new_data))
+        outbytes.write(header.encode('utf-8'))
+        outbytes.write(section.getvalue())
+        nfiles += 1
+    return nfiles
+
+
 def __build_parser():
     """ Builds the options """
     description = ('Prints the difference between two po-FILES in pieces '
                    'of diff output that pertain to one original string. '
                    )
 
-    usage = ('%prog [OPTIONS] ORIGINAL_FILE UPDATED_FILE\n\n'
-             'Use - as file argument to use standard in')
+    usage = ('%prog [OPTIONS] ORIGINAL_FILE UPDATED_FILE\n'
+             '       %prog [OPTIONS] ORIGINAL_DIR UPDATED_DIR\n\n'
+             'Use - as file argument to use standard in.  If two '
+             'directories are given, write a bundle of the podiffs of all '
+             'catalogs found in both, which popatch --bundle can apply to '
+             'a copy of UPDATED_DIR.')
     parser = OptionParser(usage=usage, description=description,
                           version=__version__)
 
@@ -252,6 +456,10 @@ def __build_parser():
     parser.add_option('-c', '--color', action='store_true', default=False,
                       help='make a wordwise diff and use markers to highlight '
                       'it')
+    parser.add_option('-q', '--quiet', action='store_true', default=False,
+                      help='write nothing, but exit with status 1 as soon as '
+                      'a difference is found and 0 if there is none.  '
+                      'Messages are always matched as with --relax')
     return parser
 
 
@@ -265,15 +473,26 @@ def main(option_parser):  # pylint: disable-msg=R0912
     if len(args) != 2:
         option_parser.error('podiff takes exactly two arguments')
 
-    # Load files into catalogs
-    cat_old = parse(get_bytes_input(args[0]))
-    cat_new = parse(get_bytes_input(args[1]))
+    if opts.quiet:
+        sys.exit(int(catalogs_differ(args[0], args[1], opts.full)))
 
     if opts.output != '-' and opts.output in (args[0], args[1]):
         option_parser.error('The output file you have specified is the '
                             'same as one of the input files. This is not '
                             'allowed, as it may cause a loss of work.')
 
+    if os.path.isdir(args[0]) or os.path.isdir(args[1]):
+        if not (os.path.isdir(args[0]) and os.path.isdir(args[1])):
+            option_parser.error('Cannot diff a directory against a file')
+        if opts.color:
+            option_parser.error('Bundles cannot be written with --color')
+        write_bundle(args[0], args[1], get_bytes_output(opts.output), opts)
+        return
+
+    # Load files into catalogs
+    cat_old = parse(get_bytes_input(args[0]))
+    cat_new = parse(get_bytes_input(args[1]))
+
     out = get_encoded_output(cat_new.encoding, opts.output)
 
     podiff = PoDiff(out, opts.line_numbers, opts.color)
@@ -283,12 +502,6 @@ def main(option_parser):  # pylint: disable-msg=R0912
         podiff.diff_catalogs_relaxed(cat_old, cat_new, opts.full)
     else:
         if not podiff.catalogs_have_common_base(cat_old, cat_new):
-            option_parser.error('Cannot work with files with dissimilar base, '
-                                'unless the relax option (-r) or the full '
-                                'options (-f) is used.\n\nNOTE: This is not '
-                                'recommended..!\nMaking a podiff for '
-                                'proofreading should happen between files '
-                                'with similar base, to make the podiff easier '
-                                'to read.')
+            option_parser.error(dissimilar_base_errmsg)
 
         podiff.diff_catalogs_strict(cat_old, cat_new)
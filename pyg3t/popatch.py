@@ -18,10 +18,24 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 from __future__ import print_function, unicode_literals
+from itertools import chain
 from optparse import OptionParser
+import io
+import os
+import shutil
+import sys
+import tempfile
 from pyg3t import gtparse, __version__
 from pyg3t.util import pyg3tmain, get_bytes_input, get_bytes_output, \
-    get_encoded_output, PoError
+    get_encoded_output, get_checksum, pool_imap, PoError, regex
+
+
+# A bundle is a concatenation of podiffs of several files.  Each podiff is
+# preceded by a line identifying the file and the checksum of that file
+# as it was when the bundle was made.  No line of a podiff starts with '#'.
+bundle_header_template = '#### pyg3t-bundle: %(fname)s sha256:%(checksum)s\n'
+bundle_header_pattern = regex(r'#### pyg3t-bundle: (?P<fname>.+) '
+                              r'sha256:(?P<checksum>[0-9a-f]{64})$')
 
 
 def split_diff_as_bytes(fd):
@@ -53,6 +67,35 @@ def split_diff_as_bytes(fd):
     return old, new
 
 
+def split_bundle_as_bytes(fd):
+    """Split a podiff bundle into its sections.
+
+    Return a list of tuples (fname, checksum, lines), where fname is the
+    path of the file relative to the root of the bundle, checksum the
+    expected checksum of that file, and lines the podiff of the file
+    as a list of bytes."""
+    sections = []
+    lines = None
+    for lineno, line in enumerate(fd):
+        if line.startswith(b'#'):
+            match = bundle_header_pattern.match(line.decode('utf-8').rstrip())
+            if match is None:
+                raise PoError('bad-bundle-syntax',
+                              'Unrecognized bundle header\n'
+                              'in file "%s", line %d:\n%s'
+                              % (gtparse.getfilename(fd), lineno, line))
+            lines = []
+            sections.append((match.group('fname'), match.group('checksum'),
+                             lines))
+        elif lines is None:
+            raise PoError('bad-bundle-syntax',
+                          'File "%s" is not a podiff bundle'
+                          % gtparse.getfilename(fd))
+        else:
+            lines.append(line)
+    return sections
+
+
 class PoPatch:
     """PoPatch contains methods for patching a podiff into a pofile or to
     out the new or old versions of the content in a podiff."""
@@ -60,30 +103,30 @@ class PoPatch:
     def __init__(self):
         pass
 
-    def iterpatch(self, incat, diff_file):
-        """ Patch the original file with the diff
+    def iterpatch(self, inmsgs, diff_file):
+        """ Patch the original messages with the diff
+
+        Only the new version of the messages in the diff is kept in
+        memory.  The original messages are consumed one at a time, so
+        they should preferably be an iterator as returned by
+        gtparse.iparse().
 
         Arguments:
-        incat          File object to the original file
-        diff_file      File object to the diff file
-        out            Output file"""
+        inmsgs         Iterable of the messages of the original file
+        diff_file      File object to the diff file"""
 
         old, new = split_diff_as_bytes(diff_file)
         new_diff_cat = gtparse.parse(iter(new))
         new_diff_cat_dict = new_diff_cat.dict()
-        new_diff_cat_keys = new_diff_cat_dict.keys()
 
-        for msg in incat:
-            if msg.key in new_diff_cat_keys:
-                yield new_diff_cat_dict[msg.key]
-            else:
+        for msg in inmsgs:
+            if msg.is_obsolete:
                 yield msg
+            else:
+                yield new_diff_cat_dict.get(msg.key, msg)
 
-        for msg in incat.obsoletes:
-            yield msg
-
-    def writepatch(self, incat, diff_file, out):
-        for msg in self.iterpatch(incat, diff_file):
+    def writepatch(self, inmsgs, diff_file, out):
+        for msg in self.iterpatch(inmsgs, diff_file):
             print(msg.rawstring(), file=out)
 
     # XXX untested
@@ -91,6 +134,77 @@ class PoPatch:
     #    return Catalog(self.iterpatch(incat, diff_file))
 
 
+def patch_file_atomically(fname, checksum, diff_lines):
+    """Patch the catalog fname in place with the podiff in diff_lines.
+
+    The file is refused with a PoError if its checksum does not equal
+    checksum.  The patched catalog is written to a temporary file in the
+    same directory, which then replaces the original."""
+    with get_bytes_input(fname) as fd:
+        data = fd.read()
+    if get_checksum(data) != checksum:
+        raise PoError('bundle-checksum-mismatch',
+                      'File has changed since the bundle was made')
+
+    inmsgs = gtparse.iparse(io.BytesIO(data), trailing=False)
+    header = next(inmsgs)
+
+    dirname, basename = os.path.split(os.path.abspath(fname))
+    tmpfd, tmpname = tempfile.mkstemp(prefix='.%s.' % basename,
+                                      suffix='.tmp', dir=dirname)
+    os.close(tmpfd)
+    renamed = False
+    try:
+        with get_encoded_output(header.meta['encoding'], tmpname) as out:
+            PoPatch().writepatch(chain([header], inmsgs), diff_lines, out)
+        shutil.copymode(fname, tmpname)
+        os.rename(tmpname, fname)
+        renamed = True
+    finally:
+        if not renamed:
+            os.remove(tmpname)
+
+
+def get_bundle_path(dirname, fname):
+    """Return the path of the file fname of a bundle below dirname.
+
+    Names which are absolute, have empty components or .., or which
+    lead outside dirname, for instance through symbolic links, are
+    refused with a PoError, since bundles must not touch other files."""
+    parts = fname.split('/')
+    if os.path.isabs(fname) or any(part in ('', '.', '..') for part in parts):
+        raise PoError('bad-bundle-path', 'Bad file name in bundle')
+    root = os.path.realpath(dirname)
+    path = os.path.join(dirname, *parts)
+    if not os.path.realpath(path).startswith(os.path.join(root, '')):
+        raise PoError('bad-bundle-path', 'File is outside %s' % dirname)
+    return path
+
+
+def _apply_bundle_section(task):
+    # Module level function such that it can be sent to worker processes.
+    # Refused files are reported rather than raised, since the other
+    # files should still be patched.
+    dirname, fname, checksum, diff_lines = task
+    try:
+        path = get_bundle_path(dirname, fname)
+        patch_file_atomically(path, checksum, diff_lines)
+    except PoError as err:
+        return fname, err.get_errmsg()
+    return fname, None
+
+
+def apply_bundle(sections, dirname, jobs=1):
+    """Apply bundle sections to the catalogs below dirname.
+
+    Return an iterator over pairs (fname, errmsg) in the order of the
+    sections, where errmsg is None if the file was patched.  With more
+    than one job, the files are patched in a pool of worker processes."""
+    tasks = [(dirname, fname, checksum, lines)
+             for fname, checksum, lines in sections]
+    return pool_imap(_apply_bundle_section, tasks, jobs=jobs)
+
+
 def __build_parser():
     """ Build the command line parser """
     description = ('Patches a podiff into the original po file or shows '
@@ -98,7 +212,8 @@ def __build_parser():
                    'the podiff.\n'
                    )
     usage = ('%prog [OPTION...] POFILE DIFFFILE\n'
-             '       %prog [OPTION...] --new|--old DIFFFILE\n\n'
+             '       %prog [OPTION...] --new|--old DIFFFILE\n'
+             '       %prog [OPTION...] --bundle BUNDLE [DIRECTORY]\n\n'
              'Use - as file argument to use standard in')
     parser = OptionParser(usage=usage, description=description,
                           version=__version__)
@@ -109,6 +224,14 @@ def __build_parser():
                       help='Do not patch, but show new version of podiff')
     parser.add_option('-m', '--old', action='store_false', dest='new',
                       help='Do not patch, but show old version of podiff')
+    parser.add_option('-b', '--bundle', action='store_true',
+                      help='patch the catalogs below DIRECTORY in place '
+                      'with a bundle as written by podiff for two '
+                      'directories.  Catalogs which have changed since '
+                      'the bundle was made are not patched.  DIRECTORY '
+                      'defaults to the current directory')
+    parser.add_option('-j', '--jobs', type='int', default=1, metavar='N',
+                      help='with --bundle, patch up to N files in parallel')
     return parser
 
 
@@ -118,6 +241,28 @@ def main(option_parser):
 
     opts, args = option_parser.parse_args()
 
+    if opts.jobs < 1:
+        option_parser.error('Number of jobs must be positive')
+
+    if opts.bundle:
+        if opts.new is not None:
+            option_parser.error('--bundle cannot be combined with -m or -n')
+        if len(args) not in (1, 2):
+            option_parser.error('with --bundle popatch takes one or two '
+                                'arguments')
+        dirname = args[1] if len(args) == 2 else os.curdir
+        sections = split_bundle_as_bytes(get_bytes_input(args[0]))
+        out = get_encoded_output('utf-8', opts.output)
+        nrefused = 0
+        for fname, errmsg in apply_bundle(sections, dirname, opts.jobs):
+            if errmsg is None:
+                print('patched: %s' % fname, file=out)
+            else:
+                nrefused += 1
+                print('refused: %s: %s' % (fname, errmsg.rstrip()),
+                      file=out)
+        sys.exit(int(nrefused > 0))
+
     # Display version of podiff mode
     if opts.new is not None:
         if len(args) != 1:
@@ -136,10 +281,12 @@ def main(option_parser):
                                 'arguments')
 
         incat_file = get_bytes_input(args[0])
-        incat = gtparse.parse(incat_file)
+        inmsgs = gtparse.iparse(incat_file, trailing=False)
+        header = next(inmsgs)
 
         diff_file = get_bytes_input(args[1])
-        outcat_file = get_encoded_output(incat.encoding, opts.output)
+        outcat_file = get_encoded_output(header.meta['encoding'],
+                                         opts.output)
 
         popatch = PoPatch()
-        popatch.writepatch(incat, diff_file, outcat_file)
+        popatch.writepatch(chain([header], inmsgs), diff_file, outcat_file)
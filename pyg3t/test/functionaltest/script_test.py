@@ -4,8 +4,11 @@
 
 from __future__ import unicode_literals
 
+import json
 import subprocess
 import os
+import shutil
+import tempfile
 
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
 FILE='testpofile.da.po'
@@ -85,6 +88,37 @@ def test_gtcat():
     assert stdout == expected
 
 
+def test_gtcheck():
+    """Functional test for gtcheck
+
+    The messages reported by the xml and options checks of gtcheck
+    should be the same as those reported by gtxml and gtcheckargs.
+    """
+    return_code, stdout, stderr = run_command(['gtcheck', '--quiet', FILE])
+    assert return_code == 1
+    assert stderr == b''
+
+    reported = {b'xml': set(), b'options': set()}
+    for line in stdout.split(b'\n'):
+        if line.startswith(b'Line '):
+            lineno = int(line.split()[1])
+        elif line.startswith(b'['):
+            name = line[1:line.index(b']')]
+            reported.setdefault(name, set()).add(lineno)
+
+    _, gtxml_stdout, _ = run_command(['gtxml', FILE])
+    gtxml_lines = set(int(line.split()[2].rstrip(b':'))
+                      for line in gtxml_stdout.split(b'\n')
+                      if line.startswith(FILE.encode('ascii') + b' line '))
+    _, args_stdout, _ = run_command(['gtcheckargs', FILE])
+    args_lines = set(int(line.split()[1].rstrip(b':'))
+                     for line in args_stdout.split(b'\n')
+                     if line.startswith(b'Line '))
+    assert gtxml_lines
+    assert reported[b'xml'] == gtxml_lines
+    assert reported[b'options'] == args_lines
+
+
 def test_gtcheckargs():
     """Functional test for gtcheckargs"""
     with open(prepend_path('gtcheckargs_expected_output'), 'rb') as file_:
@@ -92,6 +126,42 @@ def test_gtcheckargs():
     standardtest(['gtcheckargs', FILE], expected, return_code=1)
 
 
+def test_gtcluster():
+    """Functional test for gtcluster"""
+    return_code, stdout, stderr = run_command(['gtcluster', '--min-length',
+                                               '5', FILE, 'old.po', 'new.po'])
+    assert return_code == 0
+    assert stderr == b''
+    assert stdout.split(b'\n')[-2].startswith(b'Found ')
+
+
+def test_gtcluster_languages():
+    """Test that catalogs of different languages are clustered apart"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fnames = []
+        for language, msgstr in [('da', 'Slet den valgte fil'),
+                                 ('de', 'Datei entfernen')]:
+            fname = os.path.join(tmpdir, '%s.po' % language)
+            with open(fname, 'wb') as file_:
+                file_.write(('msgid ""\nmsgstr ""\n'
+                             '"Content-Type: text/plain; charset=UTF-8\\n"\n'
+                             '"Language: %s\\n"\n\n'
+                             'msgid "Delete the selected file"\n'
+                             'msgstr "%s"\n\n'
+                             'msgid "Delete the selected files"\n'
+                             'msgstr "%s"\n'
+                             % (language, msgstr, msgstr)).encode('utf-8'))
+            fnames.append(fname)
+        return_code, stdout, stderr = run_command(['gtcluster'] + fnames)
+        assert return_code == 0
+        assert stderr == b''
+        assert stdout == (b'Found 0 clusters with different translations '
+                          b'among 4 msgids.\n')
+    finally:
+        shutil.rmtree(tmpdir)
+
+
 def test_gtcompare():
     """Functional test for gtcompare"""
     with open(prepend_path('gtcompare_expected_output'), 'rb') as file_:
@@ -106,6 +176,69 @@ def test_gtgrep():
     standardtest(['gtgrep', '-i', 'hello', '-s', 'hej', FILE], expected)
 
 
+def test_gtgrep_index():
+    """Functional test for gtgrep with a trigram index"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for args in [['-i', 'hello', '-s', 'hej'], ['-n', 'bulb'],
+                     ['-C', '--comment', 'fuzzy'], ['-G', 'nowhere']]:
+            _, expected, _ = run_command(['gtgrep'] + args + [FILE])
+            for i in range(2):
+                standardtest(['gtgrep', '--index', tmpdir] + args + [FILE],
+                             expected)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_gtgrep_pattern_file():
+    """Functional test for gtgrep with a file of patterns"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fname = os.path.join(tmpdir, 'patterns.txt')
+        with open(fname, 'wb') as file_:
+            file_.write(b'bulb\nhej\n')
+        _, output, _ = run_command(['gtgrep', '-f', fname, FILE])
+        _, expected, _ = run_command(['gtgrep', 'bulb|hej', FILE])
+        output = b''.join(line for line in output.splitlines(True)
+                          if not line.startswith(b'Patterns: '))
+        assert output == expected
+        _, output, _ = run_command(['gtgrep', '-C', '-f', fname, FILE])
+        _, expected, _ = run_command(['gtgrep', '-C', 'bulb|hej', FILE])
+        assert output == expected
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_gtgrep_count():
+    """Test the counts of gtgrep in several files, which have no total"""
+    return_code, output, _ = run_command(['gtgrep', '-C', 'bulb', FILE,
+                                          FILE])
+    assert return_code == 0
+    assert output == ('%s:2\n%s:2\n' % (FILE, FILE)).encode('utf-8')
+
+def test_gtgrep_recursive():
+    """Functional test for gtgrep searching directories in parallel"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for dirname in ['a', 'b']:
+            os.mkdir(os.path.join(tmpdir, dirname))
+            shutil.copy(prepend_path(FILE),
+                        os.path.join(tmpdir, dirname, 'da.po'))
+        _, expected, _ = run_command(['gtgrep', '-n', 'bulb', FILE])
+        for args in [[], ['-j', '2'], ['-j', '2', '--unordered']]:
+            _, output, _ = run_command(['gtgrep', '-r', '-C', 'bulb',
+                                        tmpdir, '--exclude', 'b'] + args)
+            lines = output.splitlines()
+            assert lines[0].endswith(b'da.po:2')
+            assert lines[1:] == [b'Total: 2']
+            _, output, _ = run_command(['gtgrep', '-r', '-n', 'bulb',
+                                        tmpdir] + args)
+            # Both files have the same matches, with file names
+            assert output.count(b'da.po:') == 2 * expected.count(b'Line ')
+    finally:
+        shutil.rmtree(tmpdir)
+
+
 def test_gtmerge():
     """Functional test for gtmerge"""
     with open(prepend_path('gtmerge_expected_output'), 'rb') as file_:
@@ -120,6 +253,38 @@ def test_gtprevmsgdiff():
     standardtest(['gtprevmsgdiff', FILE], expected)
 
 
+def test_gttm():
+    """Functional test for gttm"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        database = os.path.join(tmpdir, 'tm.db')
+        return_code, stdout, stderr = run_command(['gttm', '--add',
+                                                   database, FILE])
+        assert return_code == 0
+        assert stderr == b''
+        assert stdout.endswith(b'added 13 messages\n')
+        _, expected, _ = run_command(['gtcat', FILE])
+        return_code, stdout, stderr = run_command(['gttm', database, FILE])
+        assert return_code == 0
+        assert stderr == b''
+        assert stdout.count(b'msgid ') == expected.count(b'msgid ')
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_gtunfuzzy():
+    """Functional test for gtunfuzzy
+
+    No fuzzy message of the test file has a trivial change, so the
+    catalog is written like gtcat writes it."""
+    _, expected, _ = run_command(['gtcat', FILE])
+    return_code, stdout, stderr = run_command(['gtunfuzzy', '--rules',
+                                               'whitespace,markup', FILE])
+    assert return_code == 0
+    assert stdout == expected
+    assert stderr.startswith(b'Unfuzzied 0 of ')
+
+
 def test_gtwdiff():
     """Functional test for gtwdiff"""
     with open(prepend_path('gtwdiff_expected_output'), 'rb') as file_:
@@ -160,6 +325,25 @@ def test_gtwdiff():
     assert from_stdout['unchanged'] == from_expected['unchanged']
 
 
+def test_gtwdiff_catalogs():
+    """Functional test for gtwdiff with two catalogs
+
+    The word-wise diff of two catalogs should cover the same messages
+    as podiff does.
+    """
+    return_code, stdout, stderr = run_command(['gtwdiff', 'old.po', 'new.po'])
+    assert return_code == 0
+    assert stderr == b''
+
+    _, podiff_stdout, _ = run_command(['podiff', '-r', 'old.po', 'new.po'])
+    podiff_count = sum(1 for line in podiff_stdout.split(b'\n')
+                       if line.startswith(b'--- Line '))
+    gtwdiff_count = sum(1 for line in stdout.split(b'\n')
+                        if line.startswith(b'msgid '))
+    assert podiff_count > 0
+    assert gtwdiff_count == podiff_count
+
+
 def test_gtxml():
     """Functional test for gtxml"""
     with open(prepend_path('gtxml_expected_output'), 'rb') as file_:
@@ -173,6 +357,136 @@ def test_poabc():
     standardtest(['poabc', FILE], expected)
 
 
+def test_poabc_jobs():
+    """Functional test for poabc with several files checked in parallel"""
+    files = [FILE, 'old.po', 'new.po', 'test.iso-8859-1.da.po']
+    serial = run_command(['poabc'] + files)
+    parallel = run_command(['poabc', '--jobs', '3'] + files)
+    assert serial[2] == b''
+    assert parallel == serial
+
+
+def test_poabc_timings():
+    """Functional test for poabc with timings and tests ordered by cost"""
+    _, expected, _ = run_command(['poabc', FILE])
+    return_code, stdout, stderr = run_command(
+        ['poabc', '--timings', '--order-by-cost', FILE])
+    assert return_code == 0
+    assert stderr == b''
+    # The normal output comes first and is unchanged
+    assert stdout.startswith(expected)
+    lines = stdout[len(expected):].split(b'\n')
+    names = set(line.split()[0] for line in lines[2:-2])
+    assert names.issuperset([b'PartiallyTranslatedPluralTest', b'XMLTest',
+                             b'TrailingCharTest', b'WordRepeatTest',
+                             b'FormatTest', b'PluralFormsTest'])
+    calls = set(line.split()[1] for line in lines[2:-2])
+    assert len(calls) == 1
+
+
+def test_poabc_cache():
+    """Functional test for poabc with a cache of check results"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        cache = os.path.join(tmpdir, 'cache.json')
+        _, expected, _ = run_command(['poabc', FILE])
+        stats = []
+        for _ in range(2):
+            return_code, stdout, stderr = run_command(
+                ['poabc', '--cache', cache, FILE])
+            assert return_code == 0
+            assert stderr == b''
+            lines = stdout.split(b'\n')
+            stats.append((lines[-4].split(b': ')[1],
+                          lines[-3].split(b': ')[1]))
+            # Apart from the cache statistics the output is the same
+            assert b'\n'.join(lines[:-4] + lines[-2:]) == expected
+        # All messages checked in the first run come from the cache
+        # in the second
+        assert stats[0][0] == stats[1][1] == b'0'
+        assert stats[0][1] == stats[1][0] != b'0'
+
+        # Results of messages which are gone are removed from the cache
+        with open(cache) as fd:
+            nentries = len(json.load(fd)['entries'])
+        fname = os.path.join(tmpdir, 'da.po')
+        with open(fname, 'wb') as file_:
+            file_.write((CONSISTENCY_CATALOG % '').encode('utf-8'))
+        run_command(['poabc', '--cache', cache, fname])
+        with open(cache) as fd:
+            assert len(json.load(fd)['entries']) == 2 < nentries
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+CONSISTENCY_CATALOG = '''msgid ""
+msgstr ""
+"Content-Type: text/plain; charset=UTF-8\\n"
+%s
+msgid "Open file"
+msgstr "Åbn fil"
+
+msgid "Load file"
+msgstr "Åbn fil"
+'''
+
+
+def test_poabc_optional_checks():
+    """Test that the catalog-wide checks only run when asked for"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fname = os.path.join(tmpdir, 'da.po')
+        with open(fname, 'wb') as file_:
+            file_.write((CONSISTENCY_CATALOG % '').encode('utf-8'))
+        _, output, _ = run_command(['poabc', fname])
+        assert b'Same translation' not in output
+        _, output, _ = run_command(['poabc', '--consistency', fname])
+        assert b'Same translation' in output
+    finally:
+        shutil.rmtree(tmpdir)
+
+def test_poabc_cache_consistency():
+    """Test that cached consistency warnings follow the other messages"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        cache = os.path.join(tmpdir, 'cache.json')
+        fname = os.path.join(tmpdir, 'da.po')
+        for extra, msgid in [('', 'Open file'), ('', 'Open a file'),
+                             ('\nmsgid "New"\nmsgstr "Ny"\n',
+                              'Open a file')]:
+            catalog = CONSISTENCY_CATALOG % extra
+            with open(fname, 'wb') as file_:
+                file_.write(catalog.replace('Open file',
+                                            msgid).encode('utf-8'))
+            _, expected, _ = run_command(['poabc', '--consistency', fname])
+            _, output, _ = run_command(['poabc', '--consistency',
+                                        '--cache', cache, fname])
+            assert ('Same translation as for line %d: %s'
+                    % (5 + extra.count('\n'), msgid)).encode('utf-8') \
+                in output
+            # Apart from the cache statistics the output is the same
+            lines = output.split(b'\n')
+            assert b'\n'.join(lines[:-4] + lines[-2:]) == expected
+    finally:
+        shutil.rmtree(tmpdir)
+
+def test_poabc_msgid_cache():
+    """Functional test for poabc with a cache of msgid analysis"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        cache = os.path.join(tmpdir, 'msgids.json')
+        _, expected, _ = run_command(['poabc', FILE])
+        for jobs in ['1', '2', '1']:
+            return_code, stdout, stderr = run_command(
+                ['poabc', '--msgid-cache', cache, '--jobs', jobs, FILE])
+            assert return_code == 0
+            assert stderr == b''
+            assert stdout == expected
+            assert os.path.exists(cache)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
 def test_podiff():
     """Functional test for podiff"""
     with open(prepend_path('podiff_expected_output'), 'rb') as file_:
@@ -180,6 +494,15 @@ def test_podiff():
     standardtest(['podiff', '--relax', 'old.po', 'new.po'], expected)
 
 
+def test_podiff_quiet():
+    """Functional test for podiff --quiet"""
+    assert run_command(['podiff', '-q', 'old.po', 'new.po']) == (1, b'', b'')
+    assert run_command(['podiff', '-q', 'new.po', 'new.po']) == (0, b'', b'')
+    # Only the header differs between these
+    assert run_command(['podiff', '-q', 'new.po',
+                        'new_same_header.po']) == (0, b'', b'')
+
+
 def test_popatch():
     """Functional test for popatch"""
     return_code, stdout, stderr = run_command(
@@ -217,6 +540,71 @@ def test_popatch():
         assert line1 == line2 + b'\n'
 
 
+def test_popatch_bundle():
+    """Functional test for podiff bundles applied with popatch --bundle"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for dirname in ['old', 'new', 'target']:
+            os.makedirs(os.path.join(tmpdir, dirname, 'sub'))
+        shutil.copy(prepend_path('old.po'),
+                    os.path.join(tmpdir, 'old', 'sub', 'a.po'))
+        for dirname in ['new', 'target']:
+            shutil.copy(prepend_path('new.po'),
+                        os.path.join(tmpdir, dirname, 'sub', 'a.po'))
+        bundle = os.path.join(tmpdir, 'bundle')
+
+        return_code, stdout, stderr = run_command(
+            ['podiff', '-r', '-o', bundle, os.path.join(tmpdir, 'old'),
+             os.path.join(tmpdir, 'new')])
+        assert return_code == 0
+        assert stderr == b''
+
+        return_code, stdout, stderr = run_command(
+            ['popatch', '-j', '2', '--bundle', bundle,
+             os.path.join(tmpdir, 'target')])
+        assert return_code == 0
+        assert stderr == b''
+        assert stdout == b'patched: sub/a.po\n'
+
+        # The bundle should have the same effect as an ordinary podiff
+        with open(os.path.join(tmpdir, 'podiff'), 'wb') as file_:
+            file_.write(run_command(['podiff', '-r', 'old.po', 'new.po'])[1])
+        _, expected, _ = run_command(['popatch', 'new.po',
+                                      os.path.join(tmpdir, 'podiff')])
+        target = os.path.join(tmpdir, 'target', 'sub', 'a.po')
+        with open(target, 'rb') as file_:
+            assert file_.read() == expected
+
+        # The target has now changed, so the bundle must be refused
+        return_code, stdout, stderr = run_command(
+            ['popatch', '--bundle', bundle, os.path.join(tmpdir, 'target')])
+        assert return_code == 1
+        assert stdout.startswith(b'refused: sub/a.po')
+        with open(target, 'rb') as file_:
+            assert file_.read() == expected
+
+        # Files outside the target directory are never patched
+        os.makedirs(os.path.join(tmpdir, 'evil'))
+        shutil.copy(prepend_path('new.po'),
+                    os.path.join(tmpdir, 'evil', 'a.po'))
+        with open(bundle, 'rb') as file_:
+            data = file_.read()
+        for fname in [b'../evil/a.po', b'sub/../../evil/a.po',
+                      os.path.join(tmpdir, 'evil', 'a.po').encode('utf-8')]:
+            with open(bundle, 'wb') as file_:
+                file_.write(data.replace(b'sub/a.po', fname))
+            return_code, stdout, stderr = run_command(
+                ['popatch', '--bundle', bundle,
+                 os.path.join(tmpdir, 'old')])
+            assert return_code == 1
+            assert stdout.startswith(b'refused: ' + fname)
+        with open(os.path.join(tmpdir, 'evil', 'a.po'), 'rb') as file_:
+            with open(prepend_path('new.po'), 'rb') as orig:
+                assert file_.read() == orig.read()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
 def test_poselect():
     """Functional test for poselect"""
     with open(prepend_path('poselect_expected_output'), 'rb') as file_:
@@ -0,0 +1,34 @@
+# -*- encoding: utf-8 -*-
+"""Unit tests for the ahocorasick module"""
+
+from __future__ import unicode_literals
+
+from common import stdin_fix
+# Make sure there is a stdin with a buffer attribute during import
+with stdin_fix():
+    from pyg3t.ahocorasick import Automaton
+
+
+def naive_matches(patterns, text):
+    """Return sorted list of matches found by trying every position"""
+    return sorted((start, start + len(pattern), index)
+                  for index, pattern in enumerate(patterns) if pattern
+                  for start in range(len(text) - len(pattern) + 1)
+                  if text.startswith(pattern, start))
+
+
+def test_finditer():
+    """Test that all overlapping matches are found"""
+    patterns = ['he', 'she', 'his', 'hers', '', 'e', 'blå', 'åb']
+    automaton = Automaton(patterns)
+    for text in ['ushers', 'she sells his shells', 'blåbær', '', 'xyz']:
+        assert (sorted(automaton.finditer(text))
+                == naive_matches(patterns, text))
+    assert automaton.findall('ushers') == set([0, 1, 3, 5])
+
+
+def test_finditer_range():
+    """Test that only matches within text[pos:endpos] are found"""
+    automaton = Automaton(['he', 'she'])
+    assert list(automaton.finditer('ushers', 2)) == [(2, 4, 0)]
+    assert list(automaton.finditer('ushers', 0, 3)) == []
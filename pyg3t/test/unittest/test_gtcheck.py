@@ -0,0 +1,21 @@
+# -*- encoding: utf-8 -*-
+"""Unit tests for the gtcheck module"""
+
+from __future__ import unicode_literals
+
+from common import stdin_fix
+# Make sure there is a stdin with a buffer attribute during import
+with stdin_fix():
+    from pyg3t.gtcheck import XMLCheck
+    from pyg3t.message import Message
+
+
+def test_xml_check_plural():
+    """Test that the context of xml errors is the msgstr with the error"""
+    msg = Message('<b>%d</b> file', ['<b>%d</b> fil', '<b>%d</b filer'],
+                  msgid_plural='<b>%d</b> files')
+    troubles = XMLCheck().check(msg)
+    assert len(troubles) == 1
+    assert troubles[0].string == '<b>%d</b filer'
+    assert troubles[0].errmsg.startswith('Invalid xml')
+    assert XMLCheck().check(Message('<b>file</b>', ['<b>fil</b>'])) == []
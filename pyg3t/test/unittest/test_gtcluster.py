@@ -0,0 +1,42 @@
+# -*- encoding: utf-8 -*-
+"""Unit tests for the gtcluster module"""
+
+from __future__ import unicode_literals
+
+from common import stdin_fix
+# Make sure there is a stdin with a buffer attribute during import
+with stdin_fix():
+    from pyg3t.gtcluster import (MinHasher, find_clusters, get_shingles,
+                                 jaccard, quote)
+
+
+def test_signature():
+    """Test that MinHash signatures estimate the Jaccard similarity"""
+    hasher = MinHasher(256)
+    shingles1 = get_shingles('Delete the selected file from the disk')
+    shingles2 = get_shingles('Delete the selected files from disk')
+    sig1 = hasher.signature(shingles1)
+    sig2 = hasher.signature(shingles2)
+    assert len(sig1) == 256
+    estimate = sum(h1 == h2 for h1, h2 in zip(sig1, sig2)) / 256.0
+    assert abs(estimate - jaccard(shingles1, shingles2)) < 0.1
+    assert hasher.signature(shingles1) == sig1
+
+
+def test_find_clusters():
+    """Test clustering of near-duplicate strings"""
+    strings = ['Delete file',
+               'Open a new window',
+               'Delete the file',
+               'Print document',
+               '_Delete File',
+               'Open new windows',
+               'x']
+    clusters = sorted(sorted(cluster) for cluster in find_clusters(strings))
+    assert clusters == [[0, 2, 4], [1, 5]]
+
+
+def test_quote():
+    """Test that strings are written on a single line"""
+    assert quote('Delete\\nfile') == '"Delete\\nfile"'
+    assert quote('Delete\nfile\r') == '"Delete\\nfile\\r"'
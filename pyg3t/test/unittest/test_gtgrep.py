@@ -0,0 +1,240 @@
+# -*- encoding: utf-8 -*-
+"""Unit tests for the gtgrep module"""
+
+from __future__ import unicode_literals
+
+import io
+import os
+import re
+import shutil
+import tempfile
+
+from common import stdin_fix
+# Make sure there is a stdin with a buffer attribute during import
+with stdin_fix():
+    from pyg3t.gtgrep import (AndOp, MultiSearchOp, NotOp, OrOp,
+                              PatternSet, SearchOp, TrigramIndex,
+                              decode_indices, encode_indices,
+                              find_candidate_chunks, get_required_literals,
+                              get_trigrams, is_simple_pattern,
+                              iparse_prefiltered, strip_accel)
+    from pyg3t.message import Message
+    from pyg3t.podiff import find_catalogs, is_excluded
+    from pyg3t.util import regex
+
+
+CATALOG = '''msgid ""
+msgstr ""
+"Content-Type: text/plain; charset=UTF-8\\n"
+
+#: a.c:1
+msgid "Open file"
+msgstr "Åbn fil"
+
+# Comment separated from its message
+
+msgid ""
+"Save the "
+"file"
+msgstr "Gem filen"
+
+#~ msgid "Close "
+#~ "window"
+#~ msgstr "Luk vindue"
+'''
+
+
+def test_is_simple_pattern():
+    """Test which patterns can be used to prefilter raw text"""
+    assert is_simple_pattern('file')
+    assert is_simple_pattern(r'fil[^e]\.\$')
+    assert not is_simple_pattern('^file')
+    assert not is_simple_pattern('file$')
+    assert not is_simple_pattern('(?<=a)file')
+
+
+def test_find_candidate_chunks():
+    """Test that chunks are whole messages matching across lines"""
+    chunks = find_candidate_chunks(CATALOG, [regex('the file')])
+    assert len(chunks) == 1
+    start, end = chunks[0]
+    assert CATALOG[start:].startswith('# Comment separated')
+    assert CATALOG[start:end].rstrip().endswith('msgstr "Gem filen"')
+    assert len(find_candidate_chunks(CATALOG, [regex('close window')])) == 0
+    assert len(find_candidate_chunks(CATALOG, [regex('Close window')])) == 1
+    assert len(find_candidate_chunks(CATALOG, [regex('fil'),
+                                               regex('Gem')])) == 1
+
+
+def test_iparse_prefiltered():
+    """Test that prefiltered parsing gives the same messages"""
+    fd = io.BytesIO(CATALOG.encode('utf-8'))
+    msgs = iparse_prefiltered(fd, [regex('fil')])
+    assert [msg.msgid for msg in msgs] == ['', 'Open file', 'Save the file']
+    assert [msg.meta['lineno'] for msg in msgs] == [1, 6, 11]
+    assert msgs[2].comments == ['# Comment separated from its message\n']
+
+
+class CountingOp:
+    """Op which counts how often it is called"""
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def __call__(self, msg):
+        self.calls += 1
+        return self.result
+
+
+def test_short_circuit():
+    """Test that logical ops stop as soon as the result is known"""
+    ops = [CountingOp(False), CountingOp(True)]
+    assert not AndOp(ops)(None)
+    assert OrOp(list(reversed(ops)))(None)
+    assert NotOp(ops[0])(None)
+    assert ops[0].calls == 2
+    assert ops[1].calls == 1
+
+
+def test_highlight():
+    """Test that searching leaves messages alone until highlighting"""
+    msg = Message('Open file', ['Åbn fil', 'Åbn filer'],
+                  msgid_plural='Open files')
+    op = OrOp([SearchOp('msgid', regex('fil')),
+               SearchOp('msgstrs', regex('fil'), multiple=True),
+               NotOp(SearchOp('msgctxt', regex('fil')))])
+    assert op(msg)
+    assert msg.msgid == 'Open file'
+    op.highlight(msg, lambda text: '<%s>' % text)
+    assert msg.msgid == 'Open <fil>e'
+    assert msg.msgstrs == ['Åbn <fil>', 'Åbn <fil>er']
+    assert msg.msgctxt is None
+
+
+def test_strip_accel():
+    """Test stripping of accelerator keys and the offsets of characters"""
+    assert strip_accel('Open', '_') == ('Open', None)
+    assert strip_accel('_Open', '_') == ('Open', [1, 2, 3, 4, 5])
+    assert strip_accel('O__p_', '_') == ('O_p', [0, 2, 3, 5])
+
+
+def test_accel():
+    """Test matching and highlighting ignoring accelerator keys"""
+    msg = Message('_Save f_ile', ['_Gem __fil'])
+    op = SearchOp('msgid', regex(r'Save \w+'), accel='_')
+    assert op(msg)
+    assert not SearchOp('msgid', regex('f_ile'), accel='_')(msg)
+    msgstr_op = SearchOp('msgstrs', regex('m _f'), multiple=True, accel='_')
+    assert msgstr_op(msg)
+    assert msg.meta['stripped'][('msgstrs', '_')] == ['Gem _fil']
+    op.highlight(msg, lambda text: '<%s>' % text)
+    assert msg.msgid == '_<Save f_ile>'
+    msgstr_op.highlight(msg, lambda text: '<%s>' % text)
+    assert msg.msgstrs == ['_Ge<m __f>il']
+
+
+def test_pattern_set():
+    """Test which patterns of a pattern set match"""
+    patternset = PatternSet(['file', 'Window', r'op(en)+ \w+', '[0-9]+'],
+                            re.IGNORECASE)
+    # The last regex has no literal to find first
+    assert not patternset.can_prefilter
+    assert patternset.find('Open the FILE') == set([0, 2])
+    assert patternset.find('A window') == set([1])
+    assert patternset.find('2 windows') == set([1, 3])
+    assert patternset.find('Opn fil') == set()
+    assert PatternSet(['Window'], 0).find('A window') == set()
+    # Literals are compared like by the regexes, not by full case folding
+    patternset = PatternSet(['strasse', 'file'], re.IGNORECASE)
+    assert patternset.find('Straße') == set()
+    assert patternset.find('\ufb01le here') == set()
+    assert patternset.find('STRASSE') == set([0])
+    assert patternset.search('Straße strasse').start() == 7
+
+    patternset = PatternSet(['file', r'op(en)+ \w+'], re.IGNORECASE)
+    assert patternset.can_prefilter
+    match = patternset.search('Please OPEN the file', 2)
+    assert (match.start(), match.end()) == (7, 9)
+    assert patternset.search('Please OPEN the file', 9).start() == 16
+    assert patternset.search('Please OPEN the file', 0, 8) is None
+    assert len(find_candidate_chunks(CATALOG, [patternset])) == 2
+
+
+def test_multi_search():
+    """Test that the matching patterns of messages are stored"""
+    op = MultiSearchOp(PatternSet(['fil', 'Gem', 'xyz'], re.IGNORECASE))
+    msg = Message('Save the file', ['Gem filen'])
+    assert op(msg)
+    assert msg.meta['patterns'] == [0, 1]
+    op.highlight(msg, lambda text: '<%s>' % text)
+    assert msg.msgid == 'Save the <fil>e'
+    assert msg.msgstrs == ['<Gem> <fil>en']
+    assert not op(Message('Open', ['Åbn']))
+
+
+def test_get_required_literals():
+    """Test extraction of the literals which all matches contain"""
+    assert get_required_literals(regex('file')) == ['file']
+    assert get_required_literals(regex(r'op(en)+ \w+ files?')) == \
+        ['op', 'en', ' ', ' file']
+    assert get_required_literals(regex('(a|b)c*')) == []
+
+
+def test_encode_indices():
+    """Test the encoding of posting lists"""
+    assert encode_indices([2, 3, 10]) == '2 1 7'
+    assert decode_indices('2 1 7') == [2, 3, 10]
+
+
+def test_trigram_index():
+    """Test that the index finds the chunks having trigrams"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fname = os.path.join(tmpdir, 'test.po')
+        with open(fname, 'wb') as fd:
+            fd.write(CATALOG.encode('utf-8'))
+        index = TrigramIndex(os.path.join(tmpdir, 'index'))
+        index.update([fname])
+        # Trigrams are case-folded and found across continuation lines
+        chunks = index.get_chunks(fname, get_trigrams('THE FILE'))
+        assert len(chunks) == 1
+        assert CATALOG[chunks[0][0]:].startswith('# Comment separated')
+        assert len(index.get_chunks(fname, get_trigrams('file'))) == 2
+        assert index.get_chunks(fname, get_trigrams('nowhere')) == []
+        assert index.get_chunks(os.path.join(tmpdir, 'other.po'),
+                                get_trigrams('file')) is None
+        index.close()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_is_excluded():
+    """Test matching of gitignore-style excludes"""
+    assert is_excluded('po/old.po', False, ['old.po'])
+    assert is_excluded('po/old.po', False, ['*.po'])
+    assert not is_excluded('po/old.po', False, ['/old.po'])
+    assert is_excluded('po/old.po', False, ['/po/old.po'])
+    assert is_excluded('po/build', True, ['build/'])
+    assert not is_excluded('po/build', False, ['build/'])
+    # Wildcards do not match across directories, except **
+    assert is_excluded('po/old.po', False, ['po/*.po'])
+    assert not is_excluded('po/sub/old.po', False, ['po/*.po'])
+    assert is_excluded('po/sub/old.po', False, ['po/**/*.po'])
+    assert is_excluded('po/old.po', False, ['**/old.po'])
+
+
+def test_find_catalogs():
+    """Test that excluded directories are not searched"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for path in ['a.po', 'b.pot', 'c.txt', 'sub/d.po', 'build/e.po']:
+            fname = os.path.join(tmpdir, *path.split('/'))
+            if not os.path.isdir(os.path.dirname(fname)):
+                os.makedirs(os.path.dirname(fname))
+            open(fname, 'w').close()
+        assert find_catalogs(tmpdir) == ['a.po', 'b.pot', 'build/e.po',
+                                         'sub/d.po']
+        assert find_catalogs(tmpdir, ['build/', '*.pot']) == ['a.po',
+                                                               'sub/d.po']
+    finally:
+        shutil.rmtree(tmpdir)
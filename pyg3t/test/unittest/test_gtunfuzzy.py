@@ -0,0 +1,56 @@
+# -*- encoding: utf-8 -*-
+"""Unit tests for the gtunfuzzy module"""
+
+from __future__ import unicode_literals
+
+from common import stdin_fix
+# Make sure there is a stdin with a buffer attribute during import
+with stdin_fix():
+    from pyg3t.gtunfuzzy import classify_change, classify_msg, unfuzzy
+    from pyg3t.message import Message
+
+
+ALL_RULES = ['whitespace', 'punctuation', 'markup', 'case']
+
+
+def test_classify_change():
+    """Test the smallest sets of rules making changes trivial"""
+    assert classify_change('Open file', 'Open file', [], 5) == ()
+    assert classify_change('Open  file ', 'Open file',
+                           ALL_RULES, 5) == ('whitespace',)
+    # Each tag is several tokens
+    assert classify_change('Open <b>file</b>', 'Open file',
+                           ALL_RULES, 10) == ('markup',)
+    assert classify_change('Open <b>file</b>.', 'Open  file',
+                           ALL_RULES, 10) == ('markup', 'punctuation',
+                                              'whitespace')
+    assert classify_change('Open file', 'Open File', ALL_RULES, 5) == ('case',)
+    # Rules which are not enabled
+    assert classify_change('Open file', 'Open File', ['whitespace'], 5) is None
+    # Real changes
+    assert classify_change('Open file', 'Close file', ALL_RULES, 5) is None
+    # Too many changes
+    assert classify_change('a b c d', 'a  b  c  d', ALL_RULES, 2) is None
+
+
+def test_classify_msg():
+    """Test classification and unfuzzying of messages"""
+    msg = Message('Open file', ['Åbn fil'], flags=['fuzzy', 'c-format'],
+                  previous_msgid='Open  file')
+    assert classify_msg(msg, ['whitespace'], 5) == ('whitespace',)
+    unfuzzy(msg)
+    assert msg.flags == set(['c-format'])
+    assert not msg.has_previous_msgid
+    assert classify_msg(msg, ['whitespace'], 5) is None
+
+    # Changed context is never trivial
+    msg = Message('Open file', ['Åbn fil'], msgctxt='menu', flags=['fuzzy'],
+                  previous_msgctxt='button', previous_msgid='Open file')
+    assert classify_msg(msg, ALL_RULES, 5) is None
+
+    msg = Message('%d file', ['%d fil', '%d filer'], msgid_plural='%d files',
+                  flags=['fuzzy'], previous_msgid='%d file',
+                  previous_msgid_plural='%d <i>files</i>')
+    assert classify_msg(msg, ALL_RULES, 10) == ('markup',)
+    msg.previous_msgid_plural = None
+    assert classify_msg(msg, ALL_RULES, 10) is None
@@ -0,0 +1,82 @@
+# -*- encoding: utf-8 -*-
+"""Unit tests for the gtxml module"""
+
+from __future__ import unicode_literals
+import xml.sax
+
+from common import stdin_fix
+# Make sure there is a stdin with a buffer attribute during import
+with stdin_fix():
+    from pyg3t.gtxml import GTXMLChecker, XMLElementSet, scan_xml_elements
+
+
+STRINGS = [
+    'plain text',
+    '<b>bold</b> and <i>italic</i>',
+    '<link linkend="foo">bar</link> <br/>',
+    "<a href='x' title=\"y\" >z</a>",
+    '<guimenu>File</guimenu>&gt;<guimenuitem>Quit</guimenuitem>',
+    '&amp; &lt; &quot; &apos; &#65; &#x263a;',
+    '<xml:lang xml:lang="da"/>',
+    'bæ <b>blå</b> bø',
+    # Not well-formed
+    '<b>bold</i>',
+    '<b>bold',
+    'bold</b>',
+    '</xml><xml>',
+    'a < b',
+    'R&D',
+    '&nbsp;',
+    '&#0;',
+    '&#xd800;',
+    'a ]]> b',
+    '<a x="1" x="2"/>',
+    '<a x="1"y="2"/>',
+    '<a x=1/>',
+    '</a x="1">',
+    '<b >x</b>',
+    'bell \x07',
+    # Well-formed, but not understood by the scanner
+    '<!-- comment -->',
+    '<![CDATA[ <b> ]]>',
+    '<blå>x</blå>',
+    '<a x="&amp;"/>',
+]
+
+
+def sax_elements(string):
+    """Return set of elements in string as found by sax, or None"""
+    elements = XMLElementSet()
+    xmlstring = ''.join(['<xml>', string, '</xml>']).encode('utf8')
+    try:
+        xml.sax.parseString(xmlstring, elements)
+    except xml.sax.SAXParseException:
+        return None
+    return set(elements.elements[1:])
+
+
+def test_scanner_agrees_with_sax():
+    """Test that the scanner only decides strings the way sax does"""
+    decided = 0
+    for string in STRINGS:
+        elements = scan_xml_elements(string)
+        if elements is not None:
+            assert elements == sax_elements(string), string
+            decided += 1
+    assert decided == 8
+
+
+def test_checker_errors():
+    """Test that errors still come from sax"""
+    checker = GTXMLChecker()
+    for string in STRINGS:
+        expected = sax_elements(string)
+        if expected is None:
+            try:
+                checker.parse_xml_elements(string)
+            except xml.sax.SAXParseException as err:
+                assert err.getColumnNumber() >= len('<xml>')
+            else:
+                assert False, string
+        else:
+            assert checker.parse_xml_elements(string) == expected
@@ -0,0 +1,62 @@
+# -*- encoding: utf-8 -*-
+"""Unit tests for the merkle module"""
+
+from __future__ import unicode_literals
+import io
+
+from common import stdin_fix
+# Make sure there is a stdin with a buffer attribute during import
+with stdin_fix():
+    from pyg3t.message import Message
+    from pyg3t.merkle import MerkleTree, key_digest
+
+
+def make_msgs():
+    """Make a list of messages"""
+    return [Message('msgid %d' % i, 'msgstr %d' % i,
+                    comments=['#: file.c:%d\n' % i])
+            for i in range(100)]
+
+
+def test_fingerprint():
+    """Test that fingerprints depend on contents, but not metadata"""
+    msg = Message('hello', 'hej', flags=['fuzzy', 'c-format'],
+                  meta={'lineno': 42})
+    copy = msg.copy()
+    copy.meta['lineno'] = 17
+    assert copy.fingerprint() == msg.fingerprint()
+    copy.flags = set(['c-format'])
+    assert copy.fingerprint() != msg.fingerprint()
+    copy = msg.copy()
+    copy.msgctxt = ''
+    assert copy.fingerprint() != msg.fingerprint()
+
+
+def test_diff():
+    """Test comparison of trees"""
+    msgs1 = make_msgs()
+    msgs2 = make_msgs()
+    tree1 = MerkleTree.from_messages(msgs1, depth=4)
+    assert tree1.diff(MerkleTree.from_messages(msgs2, depth=4)) == set()
+
+    msgs2[10].msgstrs[0] = 'changed'
+    del msgs2[20]
+    msgs2.insert(0, Message('new', 'ny'))
+    tree2 = MerkleTree.from_messages(msgs2, depth=4)
+    assert tree1.root != tree2.root
+    expected = set(key_digest(msg.key) for msg in
+                   [msgs1[10], msgs1[20], msgs2[0]])
+    assert tree1.diff(tree2) == expected
+    assert tree2.diff(tree1) == expected
+
+
+def test_dump_load():
+    """Test that a tree survives saving and loading"""
+    tree = MerkleTree.from_messages(make_msgs(), depth=3)
+    fd = io.StringIO()
+    tree.dump(fd)
+    fd.seek(0)
+    loaded = MerkleTree.load(fd)
+    assert loaded.depth == 3
+    assert loaded.levels == tree.levels
+    assert loaded.diff(tree) == set()
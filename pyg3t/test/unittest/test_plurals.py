@@ -0,0 +1,70 @@
+# -*- encoding: utf-8 -*-
+"""Unit tests for the plurals module"""
+
+from __future__ import unicode_literals
+
+from common import stdin_fix
+# Make sure there is a stdin with a buffer attribute during import
+with stdin_fix():
+    from pyg3t.message import Message
+    from pyg3t.plurals import PluralForms, get_plural_forms
+    from pyg3t.util import PoError
+
+
+POLISH = ('nplurals=3; plural=(n==1 ? 0 : n%10>=2 && n%10<=4 && '
+          '(n%100<10 || n%100>=20) ? 1 : 2);')
+
+
+def test_evaluate():
+    """Test evaluation of plural expressions"""
+    plural_forms = get_plural_forms(POLISH)
+    assert plural_forms.nplurals == 3
+    assert get_plural_forms(POLISH) is plural_forms
+    ns = [0, 1, 2, 4, 5, 12, 22, 25, 101, 102]
+    expected = [2, 0, 1, 1, 2, 2, 1, 2, 2, 1]
+    assert [plural_forms(n) for n in ns] == expected
+    assert plural_forms.bulk(ns) == expected
+    # C logical operators give 0 or 1
+    assert PluralForms(3, 'n || 2')(5) == 1
+    assert PluralForms(3, '!n + (n && 2)')(0) == 1
+    assert PluralForms(3, '10 / 4 - 2')(0) == 0
+    # C division truncates towards zero, also of negative numbers
+    plural_forms = PluralForms(3, '(n-5)/2 == -1 ? 1 : (n-5)%3 == -1 ? 2 : 0')
+    expected = [0, 2, 1, 1, 2, 0, 0]
+    assert [plural_forms(n) for n in range(7)] == expected
+    assert plural_forms.bulk(range(7)) == expected
+    assert PluralForms(2, '-n / 2 + 1')(3) == 0
+
+
+def test_problems():
+    """Test finding of unused and out of range plural forms"""
+    assert get_plural_forms(POLISH).find_problems(nmax=1000) == []
+    problems = PluralForms(3, 'n != 1').find_problems(nmax=1000)
+    assert problems == ['plural form 2 not used for n <= 1000']
+    problems = PluralForms(2, 'n % 3').find_problems(nmax=1000)
+    assert problems == ['index 2 out of range for n = 2']
+    assert PluralForms(2, 'n / 0').find_problems() == ['division by zero']
+
+
+def test_bad_expressions():
+    """Test that only C plural expressions are accepted"""
+    for value in ['nplurals=2; plural=n +;',
+                  'nplurals=2; plural=__import__("os");',
+                  'nplurals=2; plural=(n != 1;',
+                  'plural=n;']:
+        try:
+            get_plural_forms(value)
+        except PoError as err:
+            assert err.errtype == 'bad-plural-forms'
+        else:
+            assert False, value
+
+
+def test_check_msg():
+    """Test checking the number of plural forms of messages"""
+    plural_forms = get_plural_forms(POLISH)
+    msg = Message('file', ['plik', 'pliki'], msgid_plural='files')
+    assert plural_forms.check_msg(msg) is not None
+    msg.msgstrs.append('plików')
+    assert plural_forms.check_msg(msg) is None
+    assert plural_forms.check_msg(Message('file', 'plik')) is None
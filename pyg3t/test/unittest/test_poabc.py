@@ -0,0 +1,135 @@
+# -*- encoding: utf-8 -*-
+"""Unit tests for the poabc module"""
+
+from __future__ import unicode_literals
+
+from common import stdin_fix
+# Make sure there is a stdin with a buffer attribute during import
+with stdin_fix():
+    from pyg3t.message import Message
+    from pyg3t.poabc import (FormatTest, parse_c_format, parse_python_format,
+                             parse_python_brace_format, LengthRatioTest,
+                             get_length_baseline, get_length_ratios,
+                             ConsistencyTest, GlossaryTest)
+
+
+def args(placeholders):
+    """Return list of (argument, type) of parsed placeholders"""
+    return [(arg, argtype) for arg, argtype, _, _, _ in placeholders]
+
+
+def test_parse_c_format():
+    """Test parsing of c-format strings"""
+    assert args(parse_c_format('%d%% of %s')) == [(1, 'int'), (2, 'string')]
+    assert args(parse_c_format('%2$s %1$ld')) == [(2, 'string'),
+                                                  (1, 'l int')]
+    assert args(parse_c_format('%*d')) == [(1, 'int'), (2, 'int')]
+    assert parse_c_format('%2$s %d') is None
+
+
+def test_parse_python_format():
+    """Test parsing of python-format and python-brace-format strings"""
+    assert args(parse_python_format('%(n)d %(name)r')) == [('n', 'int'),
+                                                          ('name', 'string')]
+    assert args(parse_python_format('%s %.2f')) == [(1, 'string'),
+                                                    (2, 'float')]
+    assert args(parse_python_brace_format('{} {{x}} {}')) == [('0', None),
+                                                              ('1', None)]
+    assert args(parse_python_brace_format('{a.b} {c[0]!r:>3}')) == [
+        ('a', None), ('c', None)]
+    assert parse_python_brace_format('{} {0}') is None
+
+
+def check(msgid, msgstr, flag, msgid_plural=None):
+    """Return list of warnings from FormatTest"""
+    msg = Message(msgid, msgstr, msgid_plural=msgid_plural, flags=[flag])
+    _, _, warn = FormatTest().check(msg, msg.msgid, msg.msgstr)
+    return [trouble.errmsg for trouble in warn]
+
+
+def test_format_test():
+    """Test the comparison of placeholders"""
+    assert check('%d files in %s', '%2$s: %1$d filer', 'c-format') == []
+    assert check('%d files', '%s filer', 'c-format') == [
+        'Placeholder %s does not match %d in msgid (c-format)']
+    assert check('%d files', 'filer', 'c-format') == [
+        'Placeholder %d missing in translation (c-format)']
+    assert check('%d file', ['en fil', '%d filer'], 'c-format',
+                 msgid_plural='%d files') == []
+    assert check('%(n)d', '%(m)d', 'python-format') == [
+        'Placeholder %(m)d not in msgid (python-format)',
+        'Placeholder %(n)d missing in translation (python-format)']
+    assert check('{name}', '{name}', 'python-brace-format') == []
+    assert check('%d', '%s', 'no-c-format') == []
+
+
+def test_length_ratio_test():
+    """Test finding translations of unusual length"""
+    header = Message('', 'Language: da\\n',
+                     meta={'headers': {'Language': 'da'}})
+    msgs = [Message('This is message number %d of many' % i,
+                    'Dette er meddelelse nummer %d af mange' % i)
+            for i in range(30)]
+    msgs.append(Message('This message is truncated in the translation',
+                        'Denne'))
+    test = LengthRatioTest()
+    assert test.needs_catalog(header)
+    test.begin_catalog(header, msgs)
+    warnings = []
+    for msg in msgs:
+        warnings.extend(test.check(msg, msg.msgid, msg.msgstr)[2])
+    assert [warning.errmsg for warning in warnings] == [
+        'Translation is unusually short: 44 vs 5 characters']
+
+    # With a stored baseline, the messages are not needed
+    baselines = {'da': get_length_baseline(get_length_ratios(msgs, 20))}
+    test = LengthRatioTest(baselines)
+    assert not test.needs_catalog(header)
+    test.begin_catalog(header, None)
+    assert test.check(msgs[-1], msgs[-1].msgid, msgs[-1].msgstr)[2]
+    assert not test.check(msgs[0], msgs[0].msgid, msgs[0].msgstr)[2]
+
+
+def test_consistency_test():
+    """Test finding inconsistent translations in a catalog"""
+    msgs = [Message('_Open', '_Åbn'),
+            Message('Open', 'Åben'),
+            Message('open', 'åben', msgctxt='adjective'),
+            Message('Close', 'Luk'),
+            Message('Shut', 'L_uk'),
+            Message('_Quit', 'A_fslut'),
+            Message('Quit', 'Afslut')]
+    for lineno, msg in enumerate(msgs):
+        msg.meta['lineno'] = lineno
+    test = ConsistencyTest()
+    header = Message('', 'Language: da\\n')
+    assert test.needs_catalog(header)
+    test.begin_catalog(header, msgs)
+    warnings = []
+    for msg in msgs:
+        warn = test.check(msg, msg.msgid, msg.msgstr)[2]
+        warnings.append([trouble.errmsg for trouble in warn])
+    assert warnings == [['Translated differently in line 1: Åben'],
+                        ['Translated differently in line 0: _Åbn'],
+                        [],
+                        ['Same translation as for line 4: Shut'],
+                        ['Same translation as for line 3: Close'],
+                        [],
+                        []]
+
+
+def test_glossary_test():
+    """Test checking of glossary terms"""
+    test = GlossaryTest([('file', ['fil']), ('folder', ['mappe', 'katalog']),
+                         ('Folder', ['bibliotek'])])
+
+    def check(msgid, msgstr):
+        return [trouble.errmsg for trouble in test.check(None, msgid,
+                                                         msgstr)[2]]
+
+    assert check('Open _File', 'Åbn _fil') == []
+    assert check('Open folder', 'Åbn kataloget') == []
+    assert check('Delete folder', 'Slet biblioteket') == []
+    assert check('Profile', 'Profil') == []
+    assert check('Delete file', 'Slet dokument') == [
+        'Glossary: "file" should be translated as "fil"']
@@ -0,0 +1,104 @@
+# -*- encoding: utf-8 -*-
+"""Unit tests for the tm module"""
+
+from __future__ import unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+
+from common import stdin_fix
+# Make sure there is a stdin with a buffer attribute during import
+with stdin_fix():
+    from pyg3t.gtdifflib import bounded_edit_distance
+    from pyg3t.tm import TranslationMemory, get_trigrams
+
+
+CATALOG = '''msgid ""
+msgstr ""
+"Content-Type: text/plain; charset=UTF-8\\n"
+"Language: da\\n"
+
+msgid "Delete the selected file"
+msgstr "Slet den valgte fil"
+
+msgid "Open a new window"
+msgstr "Åbn et nyt vindue"
+
+#, fuzzy
+msgid "Print the document"
+msgstr "Udskriv dokumentet"
+
+msgid "%d file"
+msgid_plural "%d files"
+msgstr[0] "%d fil"
+msgstr[1] "%d filer"
+'''
+
+
+def test_get_trigrams():
+    """Test the trigrams of strings"""
+    assert get_trigrams('abcd') == set(['abc', 'bcd'])
+    assert get_trigrams('ab') == set(['ab'])
+
+
+def test_bounded_edit_distance():
+    """Test that distances above the bound are not computed"""
+    assert bounded_edit_distance('kitten', 'sitting', 3) == 3
+    assert bounded_edit_distance('kitten', 'sitting', 2) is None
+    assert bounded_edit_distance('', 'abc', 3) == 3
+    assert bounded_edit_distance('abc', 'abc', 0) == 0
+    assert bounded_edit_distance(['a', 'b'], ['b'], 1) == 1
+
+
+def test_lookup():
+    """Test adding a catalog and looking up similar msgids"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        tm = TranslationMemory(os.path.join(tmpdir, 'tm.db'))
+        assert tm.add_catalog(io.BytesIO(CATALOG.encode('utf-8'))) == 3
+        # Messages are only added once
+        assert tm.add_catalog(io.BytesIO(CATALOG.encode('utf-8'))) == 0
+
+        suggestions = tm.lookup('Delete the selected files', 'da')
+        assert len(suggestions) == 1
+        assert suggestions[0].msgid == 'Delete the selected file'
+        assert suggestions[0].msgstrs == ['Slet den valgte fil']
+        assert suggestions[0].distance == 1
+
+        assert tm.lookup('Delete the selected files', 'de') == []
+        assert tm.lookup('Something else entirely', 'da') == []
+        # Fuzzy messages are not added
+        assert tm.lookup('Print the document', 'da') == []
+        plural = tm.lookup('%d files', 'da')[0]
+        assert plural.msgstrs == ['%d fil', '%d filer']
+        tm.close()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_lookup_languages():
+    """Test that only entries in the language looked up are found"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        tm = TranslationMemory(os.path.join(tmpdir, 'tm.db'))
+        tm.add_catalog(io.BytesIO(CATALOG.encode('utf-8')))
+        # More entries of another language than are fetched at a time
+        msgs = ''.join('msgid "Delete the selected file %d"\n'
+                       'msgstr "Datei %d entfernen"\n\n' % (i, i)
+                       for i in range(250))
+        catalog = CATALOG.replace('Language: da', 'Language: de') + msgs
+        assert tm.add_catalog(io.BytesIO(catalog.encode('utf-8'))) == 253
+
+        suggestions = tm.lookup('Delete the selected files', 'da', limit=5)
+        assert [suggestion.msgstrs for suggestion in suggestions] \
+            == [['Slet den valgte fil']]
+        suggestions = tm.lookup('Delete the selected file 123', 'de',
+                                limit=3)
+        assert [suggestion.msgstrs for suggestion in suggestions] \
+            == [['Datei 123 entfernen'], ['Datei 12 entfernen'],
+                ['Datei 13 entfernen']]
+        tm.close()
+    finally:
+        shutil.rmtree(tmpdir)
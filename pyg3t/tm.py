@@ -0,0 +1,261 @@
+from __future__ import print_function, unicode_literals
+import json
+import sqlite3
+
+from pyg3t.gtdifflib import bounded_edit_distance
+from pyg3t.gtparse import iparse
+from pyg3t.util import PoError
+
+
+# Default minimum similarity (one minus the edit distance relative to
+# the length of the longer msgid) of suggestions
+default_min_similarity = 0.7
+
+_schema = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    language TEXT NOT NULL,
+    msgctxt TEXT NOT NULL,
+    msgid TEXT NOT NULL,
+    msgstrs TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    UNIQUE (language, msgctxt, msgid, msgstrs));
+CREATE TABLE IF NOT EXISTS postings (
+    language TEXT NOT NULL,
+    trigram TEXT NOT NULL,
+    entry INTEGER NOT NULL,
+    PRIMARY KEY (language, trigram, entry)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS trigram_counts (
+    language TEXT NOT NULL,
+    trigram TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (language, trigram)) WITHOUT ROWID;
+"""
+
+# Number of candidate entries fetched from the database at a time
+_batch_size = 100
+
+
+def get_trigrams(string):
+    """Return set of character trigrams of string.
+
+    Strings shorter than three characters are their own trigram."""
+    if len(string) < 3:
+        return set([string])
+    return set(string[i:i + 3] for i in range(len(string) - 2))
+
+
+class Suggestion(object):
+    """A translation suggested by the translation memory.
+
+    Attributes:
+        msgid (str): The msgid in the translation memory
+        msgstrs (list): Its translations
+        msgctxt (str or None): Its context
+        distance (int): Edit distance to the msgid looked up
+        similarity (float): One minus the distance relative to the length
+            of the longer msgid
+    """
+    def __init__(self, msgctxt, msgid, msgstrs, distance, similarity):
+        self.msgctxt = msgctxt
+        self.msgid = msgid
+        self.msgstrs = msgstrs
+        self.distance = distance
+        self.similarity = similarity
+
+
+class TranslationMemory(object):
+    """Translations of all catalogs ever added, stored in sqlite.
+
+    Each entry is a translated msgid with its msgctxt, msgstrs and
+    language.  An inverted index from the character trigrams of the
+    msgids to the entries, kept separately for each language, is used
+    to find entries similar to a msgid without comparing it to every
+    entry.
+
+    Args:
+        fname (str): The database file, which is created if necessary
+    """
+    def __init__(self, fname):
+        self.fname = fname
+        try:
+            self.db = sqlite3.connect(fname)
+            self.db.executescript(_schema)
+        except sqlite3.DatabaseError as err:
+            raise PoError('bad-tm', 'Cannot open translation memory %s: %s'
+                          % (fname, err))
+
+    def close(self):
+        self.db.close()
+
+    def add_msg(self, language, msg, postings):
+        """Add translated msg, appending its postings to postings.
+
+        Returns whether the message was new."""
+        cursor = self.db.execute(
+            'INSERT OR IGNORE INTO entries '
+            '(language, msgctxt, msgid, msgstrs, length) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (language, msg.msgctxt or '', msg.msgid,
+             json.dumps(msg.msgstrs), len(msg.msgid)))
+        if cursor.rowcount == 0:
+            return False
+        postings.extend((language, trigram, cursor.lastrowid)
+                        for trigram in get_trigrams(msg.msgid))
+        return True
+
+    def add_catalog(self, fd, language=None):
+        """Add translated messages of the catalog read from fd.
+
+        The language is taken from the header unless given.  Returns
+        the number of new entries."""
+        cat = iparse(fd, obsolete=False, trailing=False)
+        header = next(cat)
+        if language is None:
+            language = header.meta.get('headers', {}).get('Language')
+        if not language:
+            raise PoError('no-language', 'No language given and no Language '
+                          'header in %s' % getattr(fd, 'name', 'catalog'))
+        added = 0
+        postings = []
+        for msg in cat:
+            if msg.msgid and msg.istranslated:
+                added += self.add_msg(language, msg, postings)
+        # Inserting in index order is much faster
+        postings.sort()
+        self.db.executemany('INSERT INTO postings (language, trigram, entry) '
+                            'VALUES (?, ?, ?)', postings)
+        counts = {}
+        for _, trigram, _ in postings:
+            counts[trigram] = counts.get(trigram, 0) + 1
+        self.db.executemany('INSERT OR IGNORE INTO trigram_counts '
+                            '(language, trigram, count) VALUES (?, ?, 0)',
+                            [(language, trigram) for trigram in counts])
+        self.db.executemany('UPDATE trigram_counts SET count = count + ? '
+                            'WHERE language = ? AND trigram = ?',
+                            [(count, language, trigram)
+                             for trigram, count in counts.items()])
+        self.db.commit()
+        return added
+
+    def get_counts(self, trigrams, language):
+        """Return dict of the number of entries having each trigram.
+
+        Only entries in language are counted, and trigrams which no
+        such entry has are left out."""
+        return dict(self._select('SELECT trigram, count FROM trigram_counts '
+                                 'WHERE language = ? AND trigram IN (%s)',
+                                 trigrams, (language,)))
+
+    def get_candidates(self, trigrams, counts, bound, language):
+        """Return sorted list of (missing, entry) of possible matches.
+
+        An edit removes at most three trigrams, so entries within bound
+        edits of a msgid lack at most 3 * bound of its trigrams.  missing
+        is the number of trigrams an entry lacks.  Only entries in
+        language are considered."""
+        minshared = len(trigrams) - 3 * bound
+        # The entries must also have one of any 3 * bound + 1 of the
+        # trigrams.  If the postings of the rarest ones are short, we
+        # count the trigrams of those entries only, else we let sqlite
+        # count the trigrams of all entries in the postings.
+        rarest = sorted(counts, key=lambda trigram: (counts[trigram],
+                                                     trigram))
+        prefix = rarest[:3 * bound + 1]
+        if 8 * sum(counts[trigram] for trigram in prefix) \
+                < sum(counts.values()):
+            entries = sorted(set(entry for entry, in self._select(
+                'SELECT entry FROM postings '
+                'WHERE language = ? AND trigram IN (%s)', prefix,
+                (language,))))
+            candidates = [
+                (len(trigrams - get_trigrams(othermsgid)), entry)
+                for entry, othermsgid in self._select(
+                    'SELECT id, msgid FROM entries WHERE id IN (%s)',
+                    entries)]
+        else:
+            shared = {}
+            for entry, count in self._select(
+                    'SELECT entry, COUNT(*) FROM postings '
+                    'WHERE language = ? AND trigram IN (%s) GROUP BY entry',
+                    rarest, (language,)):
+                shared[entry] = shared.get(entry, 0) + count
+            candidates = [(len(trigrams) - count, entry)
+                          for entry, count in shared.items()]
+        return sorted(candidate for candidate in candidates
+                      if len(trigrams) - candidate[0] >= minshared)
+
+    def _select(self, query, values, params=()):
+        # Run query with values in chunks, since the number of sqlite
+        # variables is limited.  params are the values of the
+        # variables before the chunk.
+        values = list(values)
+        for start in range(0, len(values), 500):
+            chunk = values[start:start + 500]
+            for row in self.db.execute(query % ','.join('?' * len(chunk)),
+                                       list(params) + chunk):
+                yield row
+
+    def _get_entries(self, candidates, minlength, maxlength):
+        # Yield (missing, entry, msgctxt, msgid, msgstrs) for the
+        # candidates with msgids of the given lengths, in the order of
+        # the candidates.  The entries are fetched in batches, and only
+        # as far as they are consumed.
+        for start in range(0, len(candidates), _batch_size):
+            batch = candidates[start:start + _batch_size]
+            rows = dict((row[0], row[1:]) for row in self.db.execute(
+                'SELECT id, msgctxt, msgid, msgstrs FROM entries '
+                'WHERE length BETWEEN ? AND ? AND id IN (%s)'
+                % ','.join('?' * len(batch)),
+                [minlength, maxlength] + [entry for _, entry in batch]))
+            for missing, entry in batch:
+                if entry in rows:
+                    yield (missing, entry) + rows[entry]
+
+    def lookup(self, msgid, language, limit=1,
+               min_similarity=default_min_similarity):
+        """Return list of the best suggestions for msgid in language.
+
+        Suggestions are sorted by edit distance, and only those with
+        at least min_similarity are returned."""
+        maxdistance = int(len(msgid) * (1.0 - min_similarity))
+        trigrams = get_trigrams(msgid)
+        counts = self.get_counts(trigrams, language)
+        # Most lookups either find close matches or none, so first
+        # search with small bounds, whose candidates are few
+        bounds = sorted(set([maxdistance // 4, maxdistance // 2,
+                             maxdistance]))
+        for bound in bounds:
+            results = self._lookup(msgid, trigrams, counts, language, limit,
+                                   bound)
+            if len(results) >= limit:
+                break
+        return [suggestion for _, _, suggestion in results]
+
+    def _lookup(self, msgid, trigrams, counts, language, limit, bound):
+        # Compare the candidates sharing most trigrams first, so the
+        # bound on the distance soon becomes the distance of the
+        # limit'th best result, and stop when no other candidate can
+        # be as close
+        results = []
+        candidates = self.get_candidates(trigrams, counts, bound, language)
+        for missing, entry, msgctxt, othermsgid, msgstrs in \
+                self._get_entries(candidates, len(msgid) - bound,
+                                  len(msgid) + bound):
+            if missing > 3 * bound:
+                break
+            distance = bounded_edit_distance(msgid, othermsgid, bound)
+            if distance is None:
+                continue
+            similarity = 1.0 - float(distance) / max(len(msgid),
+                                                     len(othermsgid), 1)
+            results.append((distance, entry,
+                            Suggestion(msgctxt or None, othermsgid,
+                                       json.loads(msgstrs), distance,
+                                       similarity)))
+            if len(results) >= limit:
+                results.sort(key=lambda result: result[:2])
+                del results[limit:]
+                bound = results[-1][0]
+        results.sort(key=lambda result: result[:2])
+        return results
@@ -1,7 +1,11 @@
 from __future__ import print_function, unicode_literals
 from codecs import lookup, StreamReaderWriter
+import hashlib
 import io
+import json
 import locale
+import multiprocessing
+import os
 import re
 import sys
 
@@ -75,6 +79,17 @@ class NullDevice:
         pass
 
 
+class StringDevice:
+    def __init__(self):
+        self.tokens = []
+
+    def write(self, txt):
+        self.tokens.append(txt)
+
+    def getvalue(self):
+        return ''.join(self.tokens)
+
+
 def get_bytes_output(name='-'):
     if name == '-':
         return _bytes_stdout
@@ -105,6 +120,91 @@ def get_encoded_output(encoding, name='-', errors='strict'):
             raise PoError('open-encoded-output', str(err))
 
 
+def get_checksum(data):
+    """Return the hexadecimal SHA-256 digest of the bytes data."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_code_version():
+    """Return digest of the source code of all loaded pyg3t modules.
+
+    Results computed by one version of the code and stored in a file
+    are not valid for another."""
+    sha = hashlib.sha1()
+    for name in sorted(sys.modules):
+        module = sys.modules[name]
+        if not name.startswith('pyg3t.') or module is None:
+            continue
+        fname = getattr(module, '__file__', None)
+        if fname is None:
+            continue
+        with open(fname, 'rb') as fd:
+            sha.update(fd.read())
+    return sha.hexdigest()
+
+
+class AnalysisCache:
+    """Results of analysing strings, by kind of analysis and string.
+
+    Catalogs of all languages translated from one template have the
+    same msgids, so the analysis of each msgid needs to be done only
+    once per process.  Results of kinds marked persistent must be
+    JSON serializable (tuples come back as lists) and can be stored
+    in a file with :py:meth:`.save` and used again by :py:meth:`.load`.
+
+    Persistent results added since the cache was loaded are also kept
+    in new_results, such that caches of several processes can be
+    merged."""
+    def __init__(self):
+        self.results = {}
+        self.new_results = {}
+        self.persistent = set()
+
+    def get(self, kind, string, function, persistent=True):
+        """Return function(string), computing it only the first time."""
+        results = self.results.setdefault(kind, {})
+        try:
+            return results[string]
+        except KeyError:
+            pass
+        result = results[string] = function(string)
+        if persistent:
+            self.persistent.add(kind)
+            self.new_results.setdefault(kind, {})[string] = result
+        return result
+
+    def pop_new_results(self):
+        results = self.new_results
+        self.new_results = {}
+        return results
+
+    def update(self, results):
+        for kind, kindresults in results.items():
+            self.persistent.add(kind)
+            self.results.setdefault(kind, {}).update(kindresults)
+
+    def load(self, fname, version):
+        """Add results from fname if it exists and has the same version."""
+        if not os.path.exists(fname):
+            return
+        with open(fname) as fd:
+            data = json.load(fd)
+        if data.get('version') == version:
+            self.update(data['results'])
+
+    def save(self, fname, version):
+        results = dict((kind, self.results[kind])
+                       for kind in self.persistent)
+        tmpname = '%s.tmp' % fname
+        with open(tmpname, 'w') as fd:
+            json.dump(dict(version=version, results=results), fd)
+        os.rename(tmpname, fname)
+
+
+# Results of analysing msgids, shared by all checks in the process
+msgid_cache = AnalysisCache()
+
+
 def _srw(fd, encoding, errors='strict'):
     info = lookup(encoding)
     srw = StreamReaderWriter(fd, info.streamreader, info.streamwriter,
@@ -141,6 +241,53 @@ class PoError(Exception):
         return msg
 
 
+class _PoolTask:
+    # Wrapper which passes PoErrors back to the calling process as data.
+    # Exceptions are not generally picklable, and PoErrors in particular
+    # lose their message.
+    def __init__(self, function):
+        self.function = function
+
+    def __call__(self, arg):
+        try:
+            return True, self.function(arg)
+        except PoError as err:
+            return False, (err.errtype, err.get_errmsg(), err.exitcode)
+
+
+def pool_imap(function, args, jobs=1, initializer=None, initargs=(),
+              ordered=True):
+    """Yield function(arg) for each arg in args using jobs processes.
+
+    The function must be defined at module level so it can be sent to
+    the worker processes.  If initializer is given, each worker calls
+    initializer(*initargs) when it starts.  Results are yielded in the
+    order of args as soon as they are available, or in the order they
+    complete if ordered is False.  A PoError raised by function is
+    raised again, with the same message, in the calling process.
+
+    With only one job, everything happens in the calling process."""
+    if jobs == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for arg in args:
+            yield function(arg)
+        return
+
+    pool = multiprocessing.Pool(jobs, initializer, initargs)
+    try:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for success, result in imap(_PoolTask(function), args):
+            if not success:
+                errtype, errmsg, exitcode = result
+                err = PoError(errtype, errmsg)
+                err.exitcode = exitcode
+                raise err
+            yield result
+    finally:
+        pool.terminate()
+
+
 def pyg3tmain(build_parser):
     """Decorator for pyg3t main functions.
 
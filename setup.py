@@ -14,11 +14,15 @@ tools for working with GNU gettext translation files."""
 
 packages = ['pyg3t']
 scriptnames = ['gtcat',
+               'gtcheck',
                'gtcheckargs',
+               'gtcluster',
                'gtcompare',
                'gtgrep',
                'gtmerge',
                'gtprevmsgdiff',
+               'gttm',
+               'gtunfuzzy',
                'gtwdiff',
                'gtxml',
                'poabc',